@@ -1,6 +1,22 @@
 from flask import Flask, render_template, request, redirect, jsonify, session
-import json, os, hashlib
-from datetime import date
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+import gc, os, hashlib, time
+from datetime import date, timedelta
+from functools import wraps
+from urllib.parse import urlencode
+
+import metrics
+from catalog import CatalogAssets
+from fragments import MAX_BYTES as FRAGMENT_MAX_BYTES, FragmentCache
+from live import MAX_STREAMS as LIVE_MAX_STREAMS, POLL_INTERVAL as LIVE_POLL_INTERVAL, LiveHub
+from metrics import Instrumented, span
+from profiling import Profiler
+from storage import CHANGES_LIMIT, entry_day, open_store
+from totals import DailyTotals
+from core import Nutrition, day_key
+from report import MAX_DAYS as REPORT_MAX_DAYS, ReportCache
+from search import DEFAULT_LIMIT as SEARCH_LIMIT, SearchIndex
 
 
 # =========================
@@ -12,13 +28,15 @@ import os
 
 app.secret_key = os.environ.get("SECRET_KEY", "dev-key")
 
+# API 回應不跳脫中文、不縮排
+app.json.ensure_ascii = False
+app.json.compact = True
+
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR = os.path.join(BASE_DIR, "data")
+DATA_DIR = os.environ.get("DATA_DIR") or os.path.join(BASE_DIR, "data")
 LOG_DIR = os.path.join(DATA_DIR, "logs")
-
-os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(LOG_DIR, exist_ok=True)
+JINJA_CACHE_DIR = os.environ.get("JINJA_CACHE_DIR") or os.path.join(DATA_DIR, "jinja_cache")
 
 # =========================
 # 常數
@@ -29,62 +47,135 @@ DAILY_PROTEIN_TARGET = 130
 DAILY_CARBS_TARGET = 350
 DAILY_FAT_TARGET = 70
 
-FOOD_FILE = os.path.join(DATA_DIR, "foods.json")
-CUSTOM_MEAL_FILE = os.path.join(DATA_DIR, "custom_meals.json")
-USER_FILE = os.path.join(DATA_DIR, "users.json")
+store = Instrumented(open_store(
+    os.environ.get("STORAGE"),
+    DATA_DIR,
+    group_commit=os.environ.get("GROUP_COMMIT") == "1",
+), "storage")
+daily_totals = Instrumented(DailyTotals(store), "aggregation")
+core = Nutrition(store, daily_totals)
+reports = Instrumented(ReportCache(store), "aggregation")
+food_search = SearchIndex(store)
+catalog_assets = CatalogAssets(store)
+fragments = FragmentCache(
+    store, int(os.environ.get("FRAGMENT_CACHE_BYTES", FRAGMENT_MAX_BYTES))
+)
+live = LiveHub(
+    core,
+    interval=float(os.environ.get("LIVE_POLL_INTERVAL", LIVE_POLL_INTERVAL)),
+    max_streams=int(os.environ.get("LIVE_MAX_STREAMS", LIVE_MAX_STREAMS)),
+)
+
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+metrics.init_app(app)
+
+Profiler(
+    os.environ.get("PROFILE_DIR") or os.path.join(DATA_DIR, "profiles"),
+    admin_token=ADMIN_TOKEN,
+    sample_rate=float(os.environ.get("PROFILE_SAMPLE_RATE", 0)),
+    min_ms=float(os.environ.get("PROFILE_MIN_MS", 200)),
+    keep=int(os.environ.get("PROFILE_KEEP", 50)),
+).init_app(app, lambda: is_admin())
 
 
 # =========================
 # 工具
 # =========================
 
-def load_json(path):
-    if not os.path.exists(path):
-        return {}
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+def hash_pwd(pwd):
+    return hashlib.sha256(pwd.encode()).hexdigest()
 
 
-def save_json(path, data):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def is_admin():
+    token = request.headers.get("X-Admin-Token")
+    return bool(ADMIN_TOKEN) and token == ADMIN_TOKEN
 
 
-def hash_pwd(pwd):
-    return hashlib.sha256(pwd.encode()).hexdigest()
+def current_user():
+    return session.get("user")
 
 
-def get_log_file():
-    user = session.get("user")
-    return os.path.join(LOG_DIR, f"{user}.json")
+def api_login_required(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if "user" not in session:
+            return jsonify({"error": "login required"}), 401
+        return view(*args, **kwargs)
+    return wrapper
 
 
-# =========================
-# 計算營養
-# =========================
+def json_body():
+    # 請求 body 的 JSON 物件；不是 JSON、或是陣列 / 字串等其他型別時回傳 None
+    data = request.get_json(silent=True)
+    return data if isinstance(data, dict) else None
 
-def calc_total(logs, foods):
-    total = {"kcal": 0, "protein": 0, "carbs": 0, "fat": 0}
 
-    for item in logs:
-        if "grams" in item:
-            nutr = foods.get(item["food"])
-            if not nutr:
-                continue
+BAD_BODY = {"ok": False, "error": "請求內容必須是 JSON 物件"}
+
+
+def day_etag(user, day, kind):
+    # 依紀錄 / 目錄版本產生 ETag，不必讀出資料就能判斷 304
+    raw = f"{kind}|{user}|{day}|{store.version(user)}|{store.catalog_version()}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def not_modified(etag):
+    if etag in request.if_none_match:
+        resp = app.response_class(status=304)
+        resp.set_etag(etag)
+        return resp
+    return None
+
+
+def with_etag(resp, etag):
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "private, no-cache"
+    return resp
+
+
+def written(user, days, versions):
+    # 每次紀錄寫入後：作廢首頁片段，並通知本行程的 SSE 連線
+    fragments.written(user, days, versions)
+    live.notify(user)
 
-            f = item["grams"] / 100
-            total["kcal"] += nutr["kcal"] * f
-            total["protein"] += nutr["protein"] * f
-            total["carbs"] += nutr["carbs"] * f
-            total["fat"] += nutr["fat"] * f
-        else:
-            total["kcal"] += item.get("kcal", 0)
-            total["protein"] += item.get("protein", 0)
-            total["carbs"] += item.get("carbs", 0)
-            total["fat"] += item.get("fat", 0)
 
-    return total
+def add_entry(user, day, entry):
+    versions = core.add(user, day, entry)
+    written(user, [day], versions)
+    return entry["id"]
+
+
+def delete_entry(user, day, index):
+    versions = core.delete(user, day, index)
+    written(user, [day], versions)
+
+
+def delete_entry_id(user, eid):
+    # 找不到（已刪除）時回傳 False，重送同一個請求不會出錯
+    versions = core.delete_id(user, eid)
+    if versions is None:
+        return False
+    written(user, [entry_day(eid)], versions)
+    return True
+
+
+def render_day_panel(user, day, logs=None, total=None):
+    if logs is None:
+        logs = core.day(user, day)
+        total = core.daily_total(user, day)
+
+    with span("template"):
+        return render_template(
+            "_day_panel.html",
+            logs=logs,
+            total=total,
+
+            kcal_target=DAILY_KCAL_TARGET,
+            protein_target=DAILY_PROTEIN_TARGET,
+            carbs_target=DAILY_CARBS_TARGET,
+            fat_target=DAILY_FAT_TARGET
+        )
 
 
 # =========================
@@ -93,19 +184,15 @@ def calc_total(logs, foods):
 
 @app.route("/register", methods=["GET", "POST"])
 def register():
-    users = load_json(USER_FILE)
 
     if request.method == "POST":
         user = request.form["username"].strip()
         pwd = request.form["password"]
 
-        if user in users:
+        if not store.add_user(user, hash_pwd(pwd)):
             return "帳號已存在"
 
-        users[user] = {"password": hash_pwd(pwd)}
-        save_json(USER_FILE, users)
-
-        save_json(os.path.join(LOG_DIR, f"{user}.json"), {})
+        store.create(user)
         return redirect("/login")
 
     return render_template("register.html")
@@ -117,13 +204,13 @@ def register():
 
 @app.route("/login", methods=["GET", "POST"])
 def login():
-    users = load_json(USER_FILE)
 
     if request.method == "POST":
         user = request.form["username"]
         pwd = hash_pwd(request.form["password"])
+        info = store.get_user(user)
 
-        if user not in users or users[user]["password"] != pwd:
+        if info is None or info["password"] != pwd:
             return "帳號或密碼錯誤"
 
         session["user"] = user
@@ -148,11 +235,7 @@ def index():
     if "user" not in session:
         return redirect("/login")
 
-    foods = load_json(FOOD_FILE)
-    customs = load_json(CUSTOM_MEAL_FILE)
-
-    log_file = get_log_file()
-    logs = load_json(log_file)
+    user = current_user()
 
     today = (
         request.form.get("date")
@@ -167,39 +250,87 @@ def index():
         meal = request.form.get("meal", "")
         grams = request.form.get("grams", "100")
 
-        if not food or food not in foods:
-            return redirect(f"/?date={today}&error=請選擇有效食物")
-
         if not grams.isdigit():
             grams = "100"
 
-        logs.setdefault(today, []).append({
-            "meal": meal,
-            "food": food,
-            "grams": int(grams)
-        })
+        try:
+            today = day_key(today)
+            add_entry(user, today, core.food_entry(meal, food, grams))
+        except ValueError as e:
+            return redirect("/?" + urlencode({"date": today, "error": str(e)}))
 
-        save_json(log_file, logs)
         return redirect(f"/?date={today}")
 
-    day_logs = logs.get(today, [])
-    total = calc_total(day_logs, foods)
-
-    return render_template(
-        "index.html",
-        today=today,
-        foods=list(foods.keys()),
-        customs=customs,
-        brands=list(customs.keys()),
-        logs=day_logs,
-        total=total,
-        error=request.args.get("error"),
-
-        kcal_target=DAILY_KCAL_TARGET,
-        protein_target=DAILY_PROTEIN_TARGET,
-        carbs_target=DAILY_CARBS_TARGET,
-        fat_target=DAILY_FAT_TARGET
-    )
+    # 當日清單與總營養沒有變動時直接用快取的 HTML
+    panel = fragments.render(user, today, lambda: render_day_panel(user, today))
+
+    with span("template"):
+        html = render_template(
+            "index.html",
+            today=today,
+            catalog_urls=catalog_assets.urls(),
+            day_panel=Markup(panel),
+            error=request.args.get("error")
+        )
+
+    return html
+
+
+# =========================
+# 目錄靜態文件
+# =========================
+
+@app.route("/catalog/<filename>", methods=["GET"])
+def catalog_file(filename):
+
+    doc = catalog_assets.find(filename)
+    if doc is None:
+        return jsonify({"error": "not found"}), 404
+
+    body, encoding = doc.body(request.headers.get("Accept-Encoding", ""))
+
+    resp = app.response_class(body, mimetype="application/json")
+    if encoding:
+        resp.headers["Content-Encoding"] = encoding
+    resp.headers["Vary"] = "Accept-Encoding"
+    resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    resp.set_etag(doc.digest)
+    return resp
+
+
+# =========================
+# Service worker
+# =========================
+#
+# 從根目錄提供 static/service-worker.js，scope 才能涵蓋整個網站。
+# 檔案中的 __SW_VERSION__ 換成內容雜湊：程式一改，瀏覽器就會安裝新版，
+# 新版的快取名稱跟著改變，舊快取在 activate 時刪除。
+
+SW_FILE = os.path.join(BASE_DIR, "static", "service-worker.js")
+_service_worker = {}
+
+
+def service_worker_source():
+    mtime = os.stat(SW_FILE).st_mtime_ns
+    if _service_worker.get("mtime") != mtime:
+        with open(SW_FILE, "r", encoding="utf-8") as f:
+            source = f.read()
+        version = hashlib.sha1(source.encode()).hexdigest()[:12]
+        _service_worker.update(
+            mtime=mtime, version=version, body=source.replace("__SW_VERSION__", version)
+        )
+    return _service_worker["body"], _service_worker["version"]
+
+
+@app.route("/service-worker.js", methods=["GET"])
+def service_worker():
+
+    body, version = service_worker_source()
+
+    resp = app.response_class(body, mimetype="application/javascript")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.set_etag(version)
+    return resp.make_conditional(request)
 
 
 # =========================
@@ -207,55 +338,473 @@ def index():
 # =========================
 
 @app.route("/add_custom", methods=["POST"])
+@api_login_required
 def add_custom():
 
-    data = request.json
-    customs = load_json(CUSTOM_MEAL_FILE)
+    data = json_body()
+    if data is None:
+        return jsonify(BAD_BODY), 400
+    day = data.get("date")
+    user = current_user()
 
-    log_file = get_log_file()
-    logs = load_json(log_file)
+    if not day or not data.get("meal_type") or not data.get("brand") or not data.get("meal"):
+        return jsonify({"ok": False, "error": "缺少欄位：date / meal_type / brand / meal"}), 400
 
-    info = customs[data["brand"]][data["meal"]]
-    ratio = float(data.get("ratio", 1))
-    day = data["date"]
+    try:
+        day = day_key(day)
+        entry = core.custom_entry(
+            data["meal_type"], data["brand"], data["meal"], data.get("ratio", 1)
+        )
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
 
-    logs.setdefault(day, []).append({
-        "meal": data["meal_type"],
-        "brand": data["brand"],
-        "food": data["meal"],
-        "kcal": info["kcal"] * ratio,
-        "protein": info["protein"] * ratio,
-        "carbs": info["carbs"] * ratio,
-        "fat": info["fat"] * ratio
-    })
+    eid = add_entry(user, day, entry)
 
-    save_json(log_file, logs)
-    return jsonify({"ok": True})
+    return jsonify({"ok": True, "id": eid, "total": core.daily_total(user, day)})
 
 
 # =========================
-# 刪除
+# 刪除 / 修改
 # =========================
+#
+# 以紀錄 id 刪除 / 修改：id 開頭即為日期，直接定位到該日，不受清單順序影響；
+# 重複刪除同一個 id 回傳 deleted: false。舊的 {"date", "index"} 仍可使用。
 
 @app.route("/delete", methods=["POST"])
+@app.route("/api/delete", methods=["POST"])
+@api_login_required
 def delete_log():
 
-    data = request.json
-    day = data["date"]
-    index = int(data["index"])
+    data = json_body()
+    if data is None:
+        return jsonify(BAD_BODY), 400
+    user = current_user()
+
+    if data.get("id"):
+        eid = str(data["id"])
+        deleted = delete_entry_id(user, eid)
+        day = entry_day(eid) or data.get("date")
+        return jsonify({"ok": True, "deleted": deleted, "total": core.daily_total(user, day)})
+
+    day = data.get("date")
+    try:
+        index = int(data["index"])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"ok": False, "error": "需要 id，或 date 與 index"}), 400
+    if not day:
+        return jsonify({"ok": False, "error": "需要 id，或 date 與 index"}), 400
+    try:
+        day = day_key(day)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    delete_entry(user, day, index)
+    return jsonify({"ok": True, "total": core.daily_total(user, day)})
+
+
+@app.route("/api/entries/<eid>", methods=["DELETE"])
+@api_login_required
+def api_delete_entry(eid):
+
+    user = current_user()
+    deleted = delete_entry_id(user, eid)
+
+    day = entry_day(eid)
+    total = core.daily_total(user, day) if day else None
+    return jsonify({"ok": True, "deleted": deleted, "total": total})
+
+
+@app.route("/api/entries/<eid>", methods=["PATCH"])
+@api_login_required
+def api_edit_entry(eid):
+
+    data = json_body()
+    if data is None:
+        return jsonify(BAD_BODY), 400
+    if "date" in data:
+        return jsonify({"ok": False, "error": "不能修改日期，請刪除後重新新增"}), 400
+
+    user = current_user()
+    old = core.find(user, eid)
+    if old is None:
+        return jsonify({"ok": False, "error": "找不到這筆紀錄"}), 404
+
+    try:
+        entry = core.edited_entry(old, data)
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    versions = core.edit(user, eid, entry)
+    if versions is None:
+        # 讀取後被其他請求刪除
+        return jsonify({"ok": False, "error": "找不到這筆紀錄"}), 404
+
+    day = entry_day(eid)
+    entry = dict(entry, id=eid)
+    written(user, [day], versions)
+
+    return jsonify({
+        "ok": True,
+        "entry": store.food_table().display(entry),
+        "total": core.daily_total(user, day),
+    })
+
+
+# =========================
+# JSON API
+# =========================
+
+@app.route("/api/logs/<day>", methods=["GET"])
+@api_login_required
+def api_logs(day):
+
+    user = current_user()
+    etag = day_etag(user, day, "logs")
+
+    return not_modified(etag) or with_etag(
+        jsonify(core.day(user, day)), etag
+    )
+
+
+@app.route("/api/daily_total/<day>", methods=["GET"])
+@api_login_required
+def api_daily_total(day):
+
+    user = current_user()
+    etag = day_etag(user, day, "total")
+
+    return not_modified(etag) or with_etag(
+        jsonify(core.daily_total(user, day)), etag
+    )
 
-    log_file = get_log_file()
-    logs = load_json(log_file)
 
-    if day in logs and 0 <= index < len(logs[day]):
-        logs[day].pop(index)
+# GET /api/range?start=YYYY-MM-DD&end=YYYY-MM-DD[&panel=1]
+# 一段日期（含頭尾，最多 RANGE_MAX_DAYS 天）的紀錄與總量，只讀一次儲存；
+# panel=1 時另附各日渲染好的首頁右側 HTML，首頁切換日期時直接替換，不必重新載入。
 
-    save_json(log_file, logs)
+RANGE_MAX_DAYS = 31
+
+
+@app.route("/api/range", methods=["GET"])
+@api_login_required
+def api_range():
+
+    try:
+        start = date.fromisoformat(request.args.get("start", ""))
+        end = date.fromisoformat(request.args.get("end", ""))
+    except ValueError:
+        return jsonify({"ok": False, "error": "日期格式應為 YYYY-MM-DD"}), 400
+
+    n = (end - start).days + 1
+    if n < 1 or n > RANGE_MAX_DAYS:
+        return jsonify({"ok": False, "error": f"範圍需為 1 到 {RANGE_MAX_DAYS} 天"}), 400
+
+    panel = request.args.get("panel") == "1"
+    user = current_user()
+    etag = day_etag(user, f"{start}..{end}", "range-panel" if panel else "range")
+    resp = not_modified(etag)
+    if resp:
+        return resp
+
+    days = [str(start + timedelta(days=i)) for i in range(n)]
+    version, logs, totals = core.range(user, days)
+
+    out = {}
+    for day in days:
+        out[day] = {"logs": logs[day], "total": totals[day]}
+        if panel:
+            out[day]["html"] = fragments.render(
+                user, day,
+                lambda: render_day_panel(user, day, logs[day], totals[day]),
+                version=version,
+            )
+
+    return with_etag(jsonify({"start": days[0], "end": days[-1], "days": out}), etag)
+
+
+@app.route("/api/add_food", methods=["POST"])
+@api_login_required
+def api_add_food():
+
+    data = json_body()
+    if data is None:
+        return jsonify(BAD_BODY), 400
+    day = data.get("date") or str(date.today())
+    item = data.get("item") or {}
+    if not isinstance(item, dict):
+        return jsonify({"ok": False, "error": "item 必須是物件"}), 400
+
+    try:
+        day = day_key(day)
+        entry = core.food_entry(item.get("meal", ""), item.get("food"), item.get("grams", 100))
+    except ValueError as e:
+        return jsonify({"ok": False, "error": str(e)}), 400
+
+    user = current_user()
+    eid = add_entry(user, day, entry)
+
+    return jsonify({"ok": True, "id": eid, "total": core.daily_total(user, day)})
+
+
+@app.route("/api/foods/search", methods=["GET"])
+@api_login_required
+def api_food_search():
+
+    q = request.args.get("q", "")
+    limit = request.args.get("limit", SEARCH_LIMIT, type=int)
+
+    return jsonify({"q": q, "results": food_search.search(q, limit)})
+
+
+# =========================
+# 批次新增
+# =========================
+#
+# POST /api/batch  {"entries": [...]}，每筆可以是：
+#   一般食物  {"date", "meal", "food", "grams"}
+#   自訂餐點  {"date", "meal", "brand", "food", "ratio"}
+#   刪除      {"op": "delete", "id"}
+# 先全部驗證，合法的新增在同一次儲存交易內寫入，之後再處理刪除；不合法的逐筆回報於 errors。
+#
+# 新增可帶用戶端產生的 "id"（格式同 storage.new_entry_id，日期需相符）：
+# 該 id 已存在時略過並列於 duplicates，離線佇列重送同一批不會重複新增。
+# 刪除以 id 進行，已不存在的 id 列於 missing，同樣可以安全重送。
+# 已被刪除過的 id（可能是另一台裝置刪的）也列於 duplicates：刪除優先，不會被重送的新增復活。
+
+BATCH_MAX_ENTRIES = 1000
+
+
+@app.route("/api/batch", methods=["POST"])
+@api_login_required
+def api_batch():
+
+    data = json_body()
+    if data is None:
+        return jsonify(BAD_BODY), 400
+    entries = data.get("entries")
+
+    if not isinstance(entries, list):
+        return jsonify({"ok": False, "error": "entries 必須是陣列"}), 400
+    if len(entries) > BATCH_MAX_ENTRIES:
+        return jsonify({"ok": False, "error": f"一次最多 {BATCH_MAX_ENTRIES} 筆"}), 413
+
+    items = []
+    indexes = []
+    deletes = []
+    errors = []
+
+    for i, item in enumerate(entries):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError("格式錯誤")
+
+            if item.get("op") == "delete":
+                if entry_day(item.get("id")) is None:
+                    raise ValueError("id 格式錯誤")
+                deletes.append((i, item["id"]))
+                continue
+
+            day = day_key(item.get("date"))
+
+            if item.get("brand"):
+                entry = core.custom_entry(
+                    item.get("meal", ""), item["brand"], item.get("food"), item.get("ratio", 1)
+                )
+            else:
+                entry = core.food_entry(item.get("meal", ""), item.get("food"), item.get("grams", 100))
+
+            if item.get("id") is not None:
+                # 只接受 storage.new_entry_id 的格式，id 會原樣出現在頁面上
+                eid_day = entry_day(item["id"])
+                if eid_day is None:
+                    raise ValueError("id 格式錯誤")
+                if eid_day != day:
+                    raise ValueError("id 與日期不符")
+                entry["id"] = item["id"]
+
+        except ValueError as e:
+            errors.append({"index": i, "error": str(e)})
+            continue
+
+        items.append((day, entry))
+        indexes.append(i)
+
+    user = current_user()
+
+    # 帶 id 的新增：一次讀出相關日期，略過已存在（先前已同步）或已刪除的紀錄
+    duplicates = []
+    given = {day for day, entry in items if "id" in entry}
+    if given:
+        existing = {
+            e.get("id") for entries in store.get_days(user, sorted(given)).values() for e in entries
+        }
+        existing |= store.tombstones(user, [entry["id"] for _, entry in items if "id" in entry])
+        kept = []
+        for i, (day, entry) in zip(indexes, items):
+            eid = entry.get("id")
+            if eid is not None and eid in existing:
+                duplicates.append(i)
+                continue
+            existing.add(eid)
+            kept.append((day, entry))
+        items = kept
+
+    if items:
+        versions = core.add_many(user, items)
+        written(user, {day for day, _ in items}, versions)
+
+    missing = [i for i, eid in deletes if not delete_entry_id(user, eid)]
+
+    days = sorted({day for day, _ in items} | {entry_day(eid) for _, eid in deletes})
+    return jsonify({
+        "ok": True,
+        "added": len(items),
+        "ids": [entry["id"] for _, entry in items],
+        "deleted": len(deletes) - len(missing),
+        "duplicates": duplicates,
+        "missing": missing,
+        "errors": errors,
+        "totals": core.daily_totals(user, days),
+    })
+
+
+# =========================
+# 同步
+# =========================
+#
+# GET /api/sync?since=<cursor>[&limit=]
+# 回傳 cursor 之後的變更（{"seq", "op": "put" | "del", "id", "date", "entry"}），
+# 用戶端依序套用後記下新的 cursor；more 為 true 時用新 cursor 繼續取。
+# 第一次同步（since=0）或 cursor 太舊時回傳 reset: true 與整份紀錄。
+# 寫入仍走 /api/batch、PATCH / DELETE /api/entries/<id>；衝突規則見 storage.py「變更紀錄」。
+
+@app.route("/api/sync", methods=["GET"])
+@api_login_required
+def api_sync():
+
+    since = request.args.get("since", 0, type=int)
+    limit = min(max(request.args.get("limit", CHANGES_LIMIT, type=int), 1), CHANGES_LIMIT)
+
+    return jsonify(core.changes(current_user(), since, limit))
+
+
+# GET /api/events  （text/event-stream）
+# 同一使用者在其他裝置 / 分頁寫入時推送變更與受影響日期的總量，見 live.py。
+
+@app.route("/api/events", methods=["GET"])
+@api_login_required
+def api_events():
+
+    if live.full():
+        return jsonify({"ok": False, "error": "too many streams"}), 503
+
+    last_id = request.headers.get("Last-Event-ID", type=int)
+    resp = app.response_class(
+        live.stream(current_user(), last_id), mimetype="text/event-stream"
+    )
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+
+# =========================
+# 報表
+# =========================
+
+@app.route("/api/report", methods=["GET"])
+@api_login_required
+def api_report():
+
+    try:
+        end = date.fromisoformat(request.args.get("to") or str(date.today()))
+        start = date.fromisoformat(
+            request.args.get("from") or str(end - timedelta(days=29))
+        )
+    except ValueError:
+        return jsonify({"error": "日期格式應為 YYYY-MM-DD"}), 400
+
+    if start > end or (end - start).days >= REPORT_MAX_DAYS:
+        return jsonify({"error": "日期區間無效"}), 400
+
+    return jsonify(reports.report(current_user(), start, end, {
+        "kcal": DAILY_KCAL_TARGET,
+        "protein": DAILY_PROTEIN_TARGET,
+        "carbs": DAILY_CARBS_TARGET,
+        "fat": DAILY_FAT_TARGET,
+    }))
+
+
+# =========================
+# 管理：目錄快取
+# =========================
+
+@app.route("/admin/catalogs", methods=["GET"])
+def catalog_stats():
+    if not is_admin():
+        return jsonify({"error": "forbidden"}), 403
+    return jsonify(store.catalog_stats())
+
+
+@app.route("/admin/caches", methods=["GET"])
+def cache_stats():
+    if not is_admin():
+        return jsonify({"error": "forbidden"}), 403
+    return jsonify({
+        "daily_totals": daily_totals.stats(),
+        "fragments": fragments.stats(),
+        "live": live.stats(),
+    })
+
+
+@app.route("/admin/catalogs/reload", methods=["POST"])
+def catalog_reload():
+    if not is_admin():
+        return jsonify({"error": "forbidden"}), 403
+    store.reload_catalogs()
     return jsonify({"ok": True})
 
 
 # =========================
+# App factory / 預熱
+# =========================
+#
+# gunicorn.conf.py 以 preload 呼叫 create_app()：在 master 裡預先編譯模板、
+# 載入目錄與搜尋索引，再 gc.freeze()，之後 fork 出的 worker 共用這些頁面
+# （copy-on-write），第一個請求不必再付冷啟動成本。
+# 模板 bytecode 另存於 JINJA_CACHE_DIR，重新部署後也不必重新編譯。
+# WARM_UP=0 可關閉預熱（量測對照用）。
+
+def warm_up():
+    started = time.perf_counter()
+
+    for name in app.jinja_env.list_templates(extensions=["html"]):
+        app.jinja_env.get_template(name)
+
+    store.food_table()
+    store.customs()
+    catalog_assets.documents()
+    food_search.get()
+
+    # 預熱不是真正的請求，不計入 /metrics（否則每個 worker 都會帶著一份）
+    metrics.registry.clear()
+    return time.perf_counter() - started
+
+
+def create_app(warm=None):
+    os.makedirs(LOG_DIR, exist_ok=True)
+    os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+    app.jinja_env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR)
+
+    if warm is None:
+        warm = os.environ.get("WARM_UP", "1") != "0"
+    if warm:
+        app.config["WARM_UP_SECONDS"] = warm_up()
+        # 預載的物件移到永久代，之後的 GC 不會寫到這些共享頁面
+        gc.freeze()
+
+    return app
+
 
 if __name__ == "__main__":
-    app.run()
+    create_app().run()
 
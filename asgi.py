@@ -0,0 +1,240 @@
+import asyncio, json, os, sys
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app as flask_app, create_app, current_user, live
+
+
+# =========================
+# ASGI 入口（選用）
+# =========================
+#
+#   pip install uvicorn
+#   uvicorn asgi:app --workers 2 --host 127.0.0.1 --port 8000 --timeout-graceful-shutdown 10
+#
+# 路由仍是 app.py 的 Flask app，不另寫一份：
+# - 連線由 event loop 持有：request body 先非同步讀完，回應也由 event loop 送出，
+#   慢速的行動網路用戶端、閒置的 keep-alive 連線都不佔執行緒
+# - Flask 的處理（含 store 的 open / json.load / json.dump、SQLite 查詢）
+#   丟到固定大小的執行緒池（ASGI_THREADS），同時最多這麼多個請求在讀寫儲存
+# - GET /api/events 在 event loop 上直接以 live.astream() 串流，
+#   數千條 SSE 連線只是 coroutine，不會用掉執行緒池
+#
+# 啟動時（lifespan）執行 create_app()：建立目錄、預熱。
+# 關閉時 uvicorn 會等 SSE 連線結束（最長 live.MAX_STREAM_SECONDS），故指定 graceful 上限；
+# 用戶端會以 Last-Event-ID 重連，不會漏掉變更。
+# 與 gunicorn sync / gthread worker 的比較：python -m bench.asgi。
+
+THREADS = int(os.environ.get("ASGI_THREADS", 16))
+MAX_BODY = int(os.environ.get("ASGI_MAX_BODY", 16 * 1024 * 1024))
+
+
+def wsgi_environ(scope, body):
+    # 依 PEP 3333 由 ASGI scope 組出 WSGI environ；路徑以 latin-1 表示 UTF-8 位元組
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": "HTTP/" + scope.get("http_version", "1.1"),
+        "REMOTE_ADDR": client[0],
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": _Input(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+
+    for name, value in scope["headers"]:
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+            continue
+        if name == "CONTENT_LENGTH":
+            continue
+        key = "HTTP_" + name
+        if key in environ:
+            value = environ[key] + ("; " if key == "HTTP_COOKIE" else ",") + value
+        environ[key] = value
+
+    return environ
+
+
+class _Input:
+    # wsgi.input：body 已完整讀入
+
+    def __init__(self, body):
+        self._body = body
+        self._pos = 0
+
+    def read(self, size=-1):
+        end = len(self._body) if size is None or size < 0 else self._pos + size
+        chunk = self._body[self._pos:end]
+        self._pos += len(chunk)
+        return chunk
+
+    def readline(self, size=-1):
+        end = self._body.find(b"\n", self._pos) + 1 or len(self._body)
+        if size is not None and size >= 0:
+            end = min(end, self._pos + size)
+        chunk = self._body[self._pos:end]
+        self._pos += len(chunk)
+        return chunk
+
+    def __iter__(self):
+        while True:
+            line = self.readline()
+            if not line:
+                return
+            yield line
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+class RequestTooLarge(Exception):
+    pass
+
+
+class AsgiApp:
+
+    def __init__(self, wsgi, threads=THREADS, max_body=MAX_BODY):
+        self.wsgi = wsgi
+        self.max_body = max_body
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix="asgi")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self._lifespan(receive, send)
+        if scope["type"] != "http":
+            return
+
+        try:
+            body = await self._read_body(receive)
+        except RequestTooLarge:
+            return await self._json(send, 413, {"ok": False, "error": "request too large"})
+        except ClientDisconnected:
+            return
+
+        environ = wsgi_environ(scope, body)
+        if scope["path"] == "/api/events" and scope["method"] == "GET":
+            return await self._events(environ, receive, send)
+
+        loop = asyncio.get_running_loop()
+        status, headers, chunks = await loop.run_in_executor(self.executor, self._call, environ)
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"".join(chunks)})
+
+    # ---------- WSGI ----------
+
+    def _call(self, environ):
+        # 在執行緒池中執行 Flask，連 body 一起取完，event loop 只負責送出
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = [
+                (k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers
+            ]
+
+        result = self.wsgi(environ, start_response)
+        try:
+            chunks = list(result)
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return started["status"], started["headers"], chunks
+
+    async def _read_body(self, receive):
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                # 上傳到一半就斷線：不處理不完整的請求
+                raise ClientDisconnected()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > self.max_body:
+                raise RequestTooLarge()
+            chunks.append(chunk)
+            if not message.get("more_body"):
+                break
+        return b"".join(chunks)
+
+    async def _json(self, send, status, data):
+        body = json.dumps(data).encode()
+        await send({"type": "http.response.start", "status": status, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+    # ---------- SSE ----------
+
+    async def _events(self, environ, receive, send):
+        # 與 app.api_events 相同的檢查；只解 session cookie，不讀 store，直接在 event loop 上做
+        with flask_app.request_context(environ):
+            user = current_user()
+        if user is None:
+            return await self._json(send, 401, {"error": "login required"})
+        if live.full():
+            return await self._json(send, 503, {"ok": False, "error": "too many streams"})
+
+        try:
+            last_id = int(environ.get("HTTP_LAST_EVENT_ID", ""))
+        except ValueError:
+            last_id = None
+
+        await send({"type": "http.response.start", "status": 200, "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no"),
+        ]})
+
+        stream = live.astream(user, last_id, self.executor)
+
+        async def pump():
+            async for message in stream:
+                await send({"type": "http.response.body", "body": message.encode(), "more_body": True})
+
+        async def disconnected():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        # 用戶端斷線或串流到期，先結束的一方取消另一方
+        tasks = [asyncio.ensure_future(pump()), asyncio.ensure_future(disconnected())]
+        try:
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await stream.aclose()
+
+        if tasks[0] in done and tasks[0].exception() is None:
+            await send({"type": "http.response.body", "body": b""})
+
+    # ---------- lifespan ----------
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(self.executor, create_app)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+app = AsgiApp(flask_app)
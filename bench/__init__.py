@@ -0,0 +1,7 @@
+# =========================
+# 效能基準測試
+# =========================
+#
+#   python -m bench.gen_data --out /tmp/bench-data --users 20 --years 3
+#   python -m bench.run --data /tmp/bench-data
+#   python -m bench.compare bench/results/a.json bench/results/b.json
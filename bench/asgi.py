@@ -0,0 +1,224 @@
+import argparse, http.client, json, os, secrets, shutil, signal, socket, subprocess, sys
+import tempfile, threading, time, urllib.parse
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULT_DIR = os.path.join(BASE_DIR, "bench", "results")
+
+sys.path.insert(0, BASE_DIR)
+
+from bench.boot import free_port, session_cookie
+from bench.run import git_commit, history_days, summarize
+
+
+# =========================
+# gunicorn sync / gthread 與 ASGI（asgi.py + uvicorn）比較
+# =========================
+#
+#   python -m bench.asgi --data /tmp/bench-data --workers 4 --held 500
+#
+# 三種伺服器，行程數相同：
+#   sync      gunicorn，THREADS=1（sync worker，每個 worker 一次一個請求）
+#   gthread   gunicorn，THREADS=8（gunicorn.conf.py 預設）
+# gunicorn 的 SSE 上限是每個 worker THREADS // 2 條（見 gunicorn.conf.py），其餘回 503；
+# asgi 不設限。
+#   asgi      uvicorn asgi:app，每個行程 ASGI_THREADS 條執行緒處理 Flask / 儲存
+#
+# 每種伺服器量兩段：
+#   baseline  --clients 個用戶端持續送 GET /?date= 與 GET /api/range，--duration 秒
+#   held      先開 --held 條長連線（一半 SSE /api/events、一半只送出一半標頭的慢速連線，
+#             模擬行動網路），連線保持開啟時再跑一次 baseline 的負載
+# 記錄成功建立的 SSE 數、延遲百分位、rps 與逾時（--timeout 秒）錯誤數。
+#
+# 需要 uvicorn（pip install uvicorn）；沒有安裝時略過 asgi。
+
+SERVERS = ("sync", "gthread", "asgi")
+
+
+def wait_ready(port, proc, deadline=60):
+    end = time.time() + deadline
+    while time.time() < end:
+        if proc.poll() is not None:
+            raise RuntimeError("伺服器沒有啟動")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/login")
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("伺服器沒有在時限內就緒")
+
+
+def start(name, port, data_dir, workers, threads, secret, held):
+    env = dict(os.environ, DATA_DIR=data_dir, SECRET_KEY=secret)
+    env.pop("LIVE_MAX_STREAMS", None)
+
+    if name == "asgi":
+        env["ASGI_THREADS"] = str(threads)
+        env["LIVE_MAX_STREAMS"] = str(held + 10)
+        cmd = [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1",
+               "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+               "--backlog", "4096", "--timeout-graceful-shutdown", "2"]
+    else:
+        env.update(BIND=f"127.0.0.1:{port}", WEB_CONCURRENCY=str(workers),
+                   THREADS="1" if name == "sync" else str(threads))
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+               "--backlog", "4096", "--graceful-timeout", "2"]
+
+    proc = subprocess.Popen(cmd, cwd=BASE_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_ready(port, proc)
+    return proc
+
+
+def open_held(port, cookie, count, timeout):
+    # 一半 SSE、一半慢速連線；回傳 (sockets, 在 timeout 內收到 200 的 SSE 數)
+    socks, streams = [], 0
+    sse = (
+        "GET /api/events HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+        f"Cookie: session={cookie}\r\nAccept: text/event-stream\r\n\r\n"
+    ).encode()
+    slow = b"GET / HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+
+    for i in range(count):
+        s = socket.create_connection(("127.0.0.1", port))
+        s.sendall(sse if i % 2 == 0 else slow)
+        socks.append((i % 2 == 0, s))
+
+    deadline = time.time() + timeout
+    for is_sse, s in socks:
+        if not is_sse:
+            continue
+        s.settimeout(max(deadline - time.time(), 0.01))
+        try:
+            if s.recv(64).startswith(b"HTTP/1.1 200"):
+                streams += 1
+        except OSError:
+            pass
+    return [s for _, s in socks], streams
+
+
+def run_load(port, cookie, paths, clients, duration, timeout):
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop = time.time() + duration
+
+    def client(i):
+        n = i
+        while time.time() < stop:
+            path = paths[n % len(paths)]
+            n += clients
+            t = time.perf_counter()
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+                conn.request("GET", path, headers={"Cookie": f"session={cookie}"})
+                resp = conn.getresponse()
+                resp.read()
+                conn.close()
+                ok = resp.status == 200
+            except OSError:
+                ok = False
+            with lock:
+                if ok:
+                    latencies.append(time.perf_counter() - t)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return summarize(latencies, duration, errors[0])
+
+
+def run_server(name, data_dir, user, args):
+    port = free_port()
+    secret = secrets.token_hex(16)
+    proc = start(name, port, data_dir, args.workers, args.threads, secret, args.held)
+    cookie = session_cookie(secret, user)
+
+    days = history_days(data_dir, user)[-14:]
+    paths = [f"/?date={d}" for d in days] + [
+        "/api/range?" + urllib.parse.urlencode({"start": days[0], "end": days[-1]})
+    ]
+
+    try:
+        baseline = run_load(port, cookie, paths, args.clients, args.duration, args.timeout)
+        socks, streams = open_held(port, cookie, args.held, args.timeout)
+        try:
+            held = run_load(port, cookie, paths, args.clients, args.duration, args.timeout)
+        finally:
+            for s in socks:
+                s.close()
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    held["sse_open"] = streams
+    return {"baseline": baseline, "held": held}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="gunicorn 與 ASGI 在大量長連線下的比較")
+    parser.add_argument("--data", required=True, help="bench.gen_data 產生的目錄")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8, help="gthread 與 asgi 每個行程的執行緒數")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--held", type=int, default=500, help="長連線數（SSE + 慢速各半）")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--timeout", type=float, default=5)
+    parser.add_argument("--servers", default=",".join(SERVERS))
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    servers = args.servers.split(",")
+    try:
+        import uvicorn  # noqa: F401
+    except ImportError:
+        if "asgi" in servers:
+            print("uvicorn 未安裝，略過 asgi")
+            servers.remove("asgi")
+
+    with open(os.path.join(args.data, "users.json"), "r", encoding="utf-8") as f:
+        user = sorted(json.load(f))[0]
+
+    work_dir = tempfile.mkdtemp(prefix="fitness-asgi-")
+    results = {}
+    try:
+        for name in servers:
+            data_dir = os.path.join(work_dir, name)
+            shutil.copytree(args.data, data_dir)
+            results[name] = run_server(name, data_dir, user, args)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    commit = git_commit()
+    out = args.out or os.path.join(
+        RESULT_DIR, f"asgi-{datetime.now():%Y%m%d-%H%M%S}-{commit}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({
+            "meta": {"commit": commit, "workers": args.workers, "threads": args.threads,
+                     "clients": args.clients, "held": args.held, "duration": args.duration,
+                     "data": os.path.abspath(args.data)},
+            "servers": results,
+        }, f, ensure_ascii=False, indent=2)
+
+    keys = ["rps", "p50_ms", "p99_ms", "errors"]
+    print(f"{'':<10}" + "".join(f"{phase + ' ' + k:>18}" for phase in ("baseline", "held") for k in keys)
+          + f"{'sse_open':>10}")
+    for name, r in results.items():
+        print(f"{name:<10}" + "".join(f"{r[phase][k]:>18}" for phase in ("baseline", "held") for k in keys)
+              + f"{r['held']['sse_open']:>10}")
+    print(f"-> {out}")
+
+
+if __name__ == "__main__":
+    main()
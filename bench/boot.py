@@ -0,0 +1,191 @@
+import argparse, json, os, re, secrets, shutil, signal, socket, subprocess, sys, tempfile
+import threading, time, urllib.request
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULT_DIR = os.path.join(BASE_DIR, "bench", "results")
+
+sys.path.insert(0, BASE_DIR)
+
+from bench.run import git_commit, percentile
+
+
+# =========================
+# gunicorn 啟動 / 第一個請求量測
+# =========================
+#
+#   python -m bench.boot --data /tmp/bench-data --workers 4
+#
+# 依序以三種設定啟動 gunicorn -c gunicorn.conf.py：
+#   cold      PRELOAD=0 WARM_UP=0   每個 worker 自己 import，第一個請求才編譯模板、載入目錄
+#   warm      PRELOAD=0 WARM_UP=1   每個 worker 自己 import 並預熱
+#   preload   PRELOAD=1 WARM_UP=1   master 預熱 + gc.freeze 後再 fork（預設）
+# 每種設定量測：全部 worker 就緒的時間、各 worker 就緒耗時、各 worker 第一個 GET /
+# 的延遲、之後穩定狀態的 GET / p50，以及各 worker 的 PSS / 私有髒頁（Linux）。
+# 每次都使用全新的 Jinja bytecode 快取目錄，量到的是最差情況。
+
+VARIANTS = {
+    "cold": {"PRELOAD": "0", "WARM_UP": "0"},
+    "warm": {"PRELOAD": "0", "WARM_UP": "1"},
+    "preload": {"PRELOAD": "1", "WARM_UP": "1"},
+}
+
+READY_RE = re.compile(r"\[boot\] worker (\d+) ready in ([\d.]+) ms")
+FIRST_RE = re.compile(r"\[boot\] worker (\d+) first request \S+ \S+ in ([\d.]+) ms")
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def session_cookie(secret, user):
+    from flask import Flask
+    from flask.sessions import SecureCookieSessionInterface
+
+    app = Flask("bench")
+    app.secret_key = secret
+    return SecureCookieSessionInterface().get_signing_serializer(app).dumps({"user": user})
+
+
+def get(url, cookie):
+    req = urllib.request.Request(url, headers={"Cookie": f"session={cookie}"})
+    t = time.perf_counter()
+    with urllib.request.urlopen(req) as resp:
+        resp.read()
+    return time.perf_counter() - t
+
+
+def smaps(pid):
+    # PSS：共享頁面依共用行程數均分；Private_Dirty：只屬於該行程、被寫過的頁面
+    out = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("Pss", "Private_Dirty"):
+                    out[key] = int(rest.split()[0]) / 1024
+    except OSError:
+        pass
+    return out
+
+
+def mean(values):
+    return sum(values) / len(values) if values else 0.0
+
+
+def run_variant(name, env_extra, data_dir, workers, user, requests):
+    port = free_port()
+    secret = secrets.token_hex(16)
+    cache_dir = tempfile.mkdtemp(prefix="fitness-jinja-")
+
+    env = dict(os.environ, **env_extra,
+               DATA_DIR=data_dir, JINJA_CACHE_DIR=cache_dir, SECRET_KEY=secret,
+               BIND=f"127.0.0.1:{port}", WEB_CONCURRENCY=str(workers))
+
+    lines = []
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--error-logfile", "-"],
+        cwd=BASE_DIR, env=env, stderr=subprocess.PIPE, text=True,
+    )
+    threading.Thread(target=lambda: lines.extend(proc.stderr), daemon=True).start()
+
+    def matches(pattern):
+        return {int(m.group(1)): float(m.group(2)) for m in map(pattern.search, list(lines)) if m}
+
+    try:
+        deadline = time.time() + 60
+        while len(matches(READY_RE)) < workers:
+            if proc.poll() is not None or time.time() > deadline:
+                raise RuntimeError(f"{name}: gunicorn 沒有啟動\n" + "".join(lines[-20:]))
+            time.sleep(0.01)
+        all_ready = time.perf_counter() - started
+
+        url = f"http://127.0.0.1:{port}/"
+        cookie = session_cookie(secret, user)
+
+        # 同時送出多個請求，讓每個 worker 都接到第一個 GET /
+        barrier = threading.Barrier(workers * 4)
+
+        def first():
+            barrier.wait()
+            get(url, cookie)
+
+        ts = [threading.Thread(target=first) for _ in range(workers * 4)]
+        for t in ts:
+            t.start()
+        for t in ts:
+            t.join()
+        time.sleep(0.2)
+
+        steady = sorted(get(url, cookie) for _ in range(requests))
+        ready = matches(READY_RE)
+        first_ms = matches(FIRST_RE)
+        memory = {pid: smaps(pid) for pid in ready}
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    return {
+        "all_workers_ready_ms": round(all_ready * 1000, 1),
+        "worker_ready_ms_mean": round(mean(list(ready.values())), 1),
+        "worker_ready_ms_max": round(max(ready.values()), 1),
+        "first_request_ms_mean": round(mean(list(first_ms.values())), 1),
+        "first_request_ms_max": round(max(first_ms.values(), default=0), 1),
+        "first_request_workers": len(first_ms),
+        "steady_p50_ms": round(percentile(steady, 50) * 1000, 2),
+        "worker_pss_mb_mean": round(mean([m.get("Pss", 0) for m in memory.values()]), 1),
+        "worker_private_dirty_mb_mean": round(
+            mean([m.get("Private_Dirty", 0) for m in memory.values()]), 1
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="gunicorn 啟動與第一個請求量測")
+    parser.add_argument("--data", required=True, help="bench.gen_data 產生的目錄")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=50, help="穩定狀態的 GET / 次數")
+    parser.add_argument("--variants", default=",".join(VARIANTS))
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    with open(os.path.join(args.data, "users.json"), "r", encoding="utf-8") as f:
+        user = sorted(json.load(f))[0]
+
+    work_dir = tempfile.mkdtemp(prefix="fitness-boot-")
+    results = {}
+    try:
+        for name in args.variants.split(","):
+            # 每種設定都從同一份原始資料開始
+            data_dir = os.path.join(work_dir, name)
+            shutil.copytree(args.data, data_dir)
+            results[name] = run_variant(
+                name, VARIANTS[name], data_dir, args.workers, user, args.requests
+            )
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    commit = git_commit()
+    out = args.out or os.path.join(
+        RESULT_DIR, f"boot-{datetime.now():%Y%m%d-%H%M%S}-{commit}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({
+            "meta": {"commit": commit, "workers": args.workers, "data": os.path.abspath(args.data)},
+            "variants": results,
+        }, f, ensure_ascii=False, indent=2)
+
+    keys = list(next(iter(results.values())))
+    print(f"{'':<30}" + "".join(f"{name:>12}" for name in results))
+    for key in keys:
+        print(f"{key:<30}" + "".join(f"{r[key]:>12}" for r in results.values()))
+    print(f"-> {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import argparse, json
+
+
+# =========================
+# 比較兩次基準測試結果
+# =========================
+#
+#   python -m bench.compare before.json after.json
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms", "rps")
+
+
+def load(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def delta(a, b):
+    if not a:
+        return "   n/a"
+    return f"{(b - a) / a * 100:+6.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較兩次基準測試結果")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    before, after = load(args.before), load(args.after)
+    print(f"{before['meta']['commit']} -> {after['meta']['commit']}")
+
+    header = "".join(f"{m:>22}" for m in METRICS)
+    print(f"{'route':<24}{header}")
+
+    for name, b in after["routes"].items():
+        a = before["routes"].get(name)
+        if a is None:
+            print(f"{name:<24}  (new)")
+            continue
+        cells = "".join(
+            f"{a[m]:>8.2f}->{b[m]:<8.2f}{delta(a[m], b[m])}" for m in METRICS
+        )
+        print(f"{name:<24}{cells}")
+
+
+if __name__ == "__main__":
+    main()
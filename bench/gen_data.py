@@ -0,0 +1,137 @@
+import argparse, hashlib, json, os, random, shutil, sys
+from datetime import date, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DATA = os.path.join(BASE_DIR, "data")
+
+sys.path.insert(0, BASE_DIR)
+
+from storage import JsonStore
+
+PASSWORD = "bench"
+MEALS = ["早餐", "午餐", "晚餐", "點心"]
+
+
+# =========================
+# 產生合成 data/ 目錄
+# =========================
+#
+# 以現有的 foods.json / custom_meals.json 為種子放大目錄，
+# 再替每位使用者產生 M 年、每天數筆的紀錄（克數制與自訂餐點混合），
+# 格式與 data/ 完全相同，可直接以 DATA_DIR 指給 app.py。
+
+def load(name):
+    with open(os.path.join(SRC_DATA, name), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def scale_foods(foods, target, rng):
+    out = dict(foods)
+    base = list(foods.items())
+    i = 0
+    while len(out) < target:
+        name, nutr = base[i % len(base)]
+        i += 1
+        k = rng.uniform(0.8, 1.2)
+        out[f"{name} #{i}"] = {key: round(v * k, 1) for key, v in nutr.items()}
+    return out
+
+
+def scale_customs(customs, target, rng):
+    out = {b: dict(m) for b, m in customs.items()}
+    base = [(b, m, n) for b, meals in customs.items() for m, n in meals.items()]
+    count = len(base)
+    i = 0
+    while count < target:
+        brand, meal, nutr = base[i % len(base)]
+        i += 1
+        k = rng.uniform(0.8, 1.2)
+        out.setdefault(f"{brand} {i // 200}", {})[f"{meal} #{i}"] = {
+            key: round(v * k, 1) for key, v in nutr.items()
+        }
+        count += 1
+    return out
+
+
+def gen_logs(foods, customs, years, per_day, rng, end=None):
+    end = end or date.today()
+    start = end - timedelta(days=int(365 * years))
+    food_names = list(foods)
+    custom_items = [(b, m, n) for b, meals in customs.items() for m, n in meals.items()]
+
+    logs = {}
+    day = start
+    while day <= end:
+        entries = []
+        for _ in range(max(1, int(rng.gauss(per_day, 2)))):
+            meal = rng.choice(MEALS)
+            if rng.random() < 0.6:
+                entries.append({
+                    "meal": meal,
+                    "food": rng.choice(food_names),
+                    "grams": rng.choice([50, 100, 150, 200, 250]),
+                })
+            else:
+                brand, name, nutr = rng.choice(custom_items)
+                ratio = rng.choice([0.5, 1, 1, 1, 1.5])
+                entries.append({
+                    "meal": meal,
+                    "brand": brand,
+                    "food": name,
+                    **{k: nutr[k] * ratio for k in ("kcal", "protein", "carbs", "fat")},
+                })
+        logs[str(day)] = entries
+        day += timedelta(days=1)
+    return logs
+
+
+def generate(out, users=10, years=2, per_day=8, foods=0, customs=0, seed=0):
+    rng = random.Random(seed)
+
+    food_cat = load("foods.json")
+    custom_cat = load("custom_meals.json")
+    if foods:
+        food_cat = scale_foods(food_cat, foods, rng)
+    if customs:
+        custom_cat = scale_customs(custom_cat, customs, rng)
+
+    shutil.rmtree(out, ignore_errors=True)
+    os.makedirs(os.path.join(out, "logs"))
+
+    def dump(name, data, indent=None):
+        with open(os.path.join(out, name), "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+
+    dump("foods.json", food_cat)
+    dump("custom_meals.json", custom_cat)
+
+    pwd = hashlib.sha256(PASSWORD.encode()).hexdigest()
+    names = [f"bench{i:04d}" for i in range(users)]
+    dump("users.json", {n: {"password": pwd} for n in names}, indent=2)
+
+    # 直接寫成 JsonStore 的月份分割格式
+    store = JsonStore(out)
+    for name in names:
+        store.import_logs(name, gen_logs(food_cat, custom_cat, years, per_day, rng))
+
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="產生合成 data/ 目錄")
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--per-day", type=int, default=8)
+    parser.add_argument("--foods", type=int, default=0, help="把 foods.json 放大到 N 筆")
+    parser.add_argument("--customs", type=int, default=0, help="把自訂餐點放大到 N 筆")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    names = generate(args.out, args.users, args.years, args.per_day,
+                     args.foods, args.customs, args.seed)
+    print(f"{len(names)} 位使用者 -> {args.out}（密碼：{PASSWORD}）")
+
+
+if __name__ == "__main__":
+    main()
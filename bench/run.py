@@ -0,0 +1,366 @@
+import argparse, http.cookiejar, json, multiprocessing, os, random, resource, shutil
+import subprocess, sys, tempfile, time, urllib.parse, urllib.request
+from datetime import date, datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULT_DIR = os.path.join(BASE_DIR, "bench", "results")
+
+sys.path.insert(0, BASE_DIR)
+
+from bench.gen_data import PASSWORD
+
+
+# =========================
+# 路由基準測試
+# =========================
+#
+#   python -m bench.run --data /tmp/bench-data                      # test client，單一行程
+#   python -m bench.run --data /tmp/bench-data --procs 4 --duration 10
+#   python -m bench.run --data /tmp/bench-data --url http://127.0.0.1:8000
+#
+# --data 會先複製到暫存目錄再測，原始資料不會被改動（--url 模式除外，
+# 該模式直接打正在執行的伺服器）。
+# 結果寫成 JSON（預設 bench/results/<時間>-<commit>.json），可用 bench.compare 比較。
+
+
+# =========================
+# 用戶端
+# =========================
+
+class FlaskClient:
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def get(self, path):
+        return self.client.get(path).status_code
+
+    def post_form(self, path, data):
+        return self.client.post(path, data=data).status_code
+
+    def post_json(self, path, data):
+        return self.client.post(path, json=data).status_code
+
+
+class HttpClient:
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+        jar = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(jar), _NoRedirect()
+        )
+
+    def _send(self, req):
+        try:
+            with self.opener.open(req) as resp:
+                resp.read()
+                return resp.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+    def get(self, path):
+        return self._send(urllib.request.Request(self.base_url + path))
+
+    def post_form(self, path, data):
+        body = urllib.parse.urlencode(data).encode()
+        return self._send(urllib.request.Request(self.base_url + path, data=body))
+
+    def post_json(self, path, data):
+        body = json.dumps(data).encode()
+        return self._send(urllib.request.Request(
+            self.base_url + path, data=body, headers={"Content-Type": "application/json"}
+        ))
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+# =========================
+# 情境
+# =========================
+
+def quote(path):
+    return urllib.parse.quote(path, safe="/?=&")
+
+
+def make_scenarios(foods, customs, days, rng):
+    food_names = list(foods)
+    custom_items = [(b, m) for b, meals in customs.items() for m in meals]
+    search_terms = [n[:2] for n in food_names[:200]] or ["雞"]
+
+    def day():
+        return rng.choice(days)
+
+    def index(c):
+        return c.get(quote(f"/?date={day()}"))
+
+    def add_food(c):
+        return c.post_form("/", {
+            "date": day(), "meal": "午餐", "food": rng.choice(food_names), "grams": "150"
+        })
+
+    def add_custom(c):
+        brand, meal = rng.choice(custom_items)
+        return c.post_json("/add_custom", {
+            "brand": brand, "meal": meal, "ratio": "1", "date": day(), "meal_type": "晚餐"
+        })
+
+    def delete(c):
+        return c.post_json("/delete", {"date": day(), "index": 0})
+
+    def api_logs(c):
+        return c.get(f"/api/logs/{day()}")
+
+    def api_total(c):
+        return c.get(f"/api/daily_total/{day()}")
+
+    def api_report(c):
+        end = date.fromisoformat(day())
+        return c.get(f"/api/report?from={end - timedelta(days=29)}&to={end}")
+
+    def search(c):
+        return c.get(quote(f"/api/foods/search?q={rng.choice(search_terms)}"))
+
+    return {
+        "GET /": index,
+        "POST /": add_food,
+        "POST /add_custom": add_custom,
+        "POST /delete": delete,
+        "GET /api/logs": api_logs,
+        "GET /api/daily_total": api_total,
+        "GET /api/report": api_report,
+        "GET /api/foods/search": search,
+    }
+
+
+def load_catalogs(data_dir):
+    def load(name):
+        with open(os.path.join(data_dir, name), "r", encoding="utf-8") as f:
+            return json.load(f)
+    return load("foods.json"), load("custom_meals.json"), load("users.json")
+
+
+def history_days(data_dir, user):
+    from storage import JsonStore
+    return sorted(JsonStore(data_dir).load(user)) or [str(date.today())]
+
+
+# =========================
+# 執行
+# =========================
+
+def peak_rss_mb():
+    # Linux 的 ru_maxrss 單位是 KB，macOS 是 bytes
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(latencies, elapsed, errors):
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        "rps": round(len(values) / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def make_clients(data_dir, users, url):
+    if url:
+        clients = [HttpClient(url) for _ in users]
+    else:
+        os.environ["DATA_DIR"] = data_dir
+        import app as fitness_app
+        clients = [FlaskClient(fitness_app.app) for _ in users]
+
+    for client, user in zip(clients, users):
+        client.post_form("/login", {"username": user, "password": PASSWORD})
+    return clients
+
+
+def run_sequential(data_dir, users, url, requests, seed):
+    foods, customs, _ = load_catalogs(data_dir)
+    clients = make_clients(data_dir, users, url)
+    rng = random.Random(seed)
+
+    results = {}
+    for name, fn in make_scenarios(foods, customs, history_days(data_dir, users[0]), rng).items():
+        latencies = []
+        errors = 0
+        start = time.perf_counter()
+        for i in range(requests):
+            client = clients[i % len(clients)]
+            t = time.perf_counter()
+            status = fn(client)
+            latencies.append(time.perf_counter() - t)
+            if status >= 400:
+                errors += 1
+        results[name] = summarize(latencies, time.perf_counter() - start, errors)
+        results[name]["peak_rss_mb"] = round(peak_rss_mb(), 1)
+
+    return results
+
+
+def bench_calc_total(data_dir, users, requests, seed):
+    from storage import JsonStore
+    from totals import calc_total
+
+    store = JsonStore(data_dir)
+    table = store.food_table()
+    logs = store.load(users[0])
+
+    rng = random.Random(seed)
+    days = list(logs)
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(requests):
+        day_logs = logs[rng.choice(days)]
+        t = time.perf_counter()
+        calc_total(day_logs, table)
+        latencies.append(time.perf_counter() - t)
+
+    result = summarize(latencies, time.perf_counter() - start, 0)
+    result["peak_rss_mb"] = round(peak_rss_mb(), 1)
+    return result
+
+
+def _load_worker(args):
+    data_dir, users, url, duration, seed = args
+    foods, customs, _ = load_catalogs(data_dir)
+    clients = make_clients(data_dir, users, url)
+    rng = random.Random(seed)
+    scenarios = list(make_scenarios(foods, customs, history_days(data_dir, users[0]), rng).items())
+
+    latencies = {name: [] for name, _ in scenarios}
+    errors = {name: 0 for name, _ in scenarios}
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        name, fn = rng.choice(scenarios)
+        client = rng.choice(clients)
+        t = time.perf_counter()
+        status = fn(client)
+        latencies[name].append(time.perf_counter() - t)
+        if status >= 400:
+            errors[name] += 1
+
+    return latencies, errors, peak_rss_mb()
+
+
+def run_load(data_dir, users, url, procs, duration, seed):
+    jobs = [
+        (data_dir, users[i::procs] or users, url, duration, seed + i)
+        for i in range(procs)
+    ]
+
+    with multiprocessing.get_context("spawn").Pool(procs) as pool:
+        parts = pool.map(_load_worker, jobs)
+
+    # 各情境在量測期間交錯執行，rps 以量測秒數計算（不含行程啟動）
+    elapsed = duration
+
+    results = {}
+    for name in parts[0][0]:
+        latencies = [v for p in parts for v in p[0][name]]
+        errors = sum(p[1][name] for p in parts)
+        results[name] = summarize(latencies, elapsed, errors)
+
+    total = [v for p in parts for lat in p[0].values() for v in lat]
+    results["ALL"] = summarize(total, elapsed, sum(sum(p[1].values()) for p in parts))
+    results["ALL"]["peak_rss_mb"] = round(max(p[2] for p in parts), 1)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flask 路由基準測試")
+    parser.add_argument("--data", required=True, help="bench.gen_data 產生的目錄")
+    parser.add_argument("--users", type=int, default=4, help="使用幾位使用者")
+    parser.add_argument("--requests", type=int, default=200, help="單一行程模式每個路由的請求數")
+    parser.add_argument("--procs", type=int, default=0, help="多行程負載產生器的行程數")
+    parser.add_argument("--duration", type=float, default=10, help="多行程模式的秒數")
+    parser.add_argument("--url", default=None, help="改打正在執行的伺服器")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    _, _, user_db = load_catalogs(args.data)
+    users = sorted(user_db)[:args.users]
+
+    work_dir = None
+    data_dir = args.data
+    if not args.url:
+        work_dir = tempfile.mkdtemp(prefix="fitness-bench-")
+        data_dir = os.path.join(work_dir, "data")
+        shutil.copytree(args.data, data_dir)
+
+    try:
+        if args.procs:
+            routes = run_load(data_dir, users, args.url, args.procs, args.duration, args.seed)
+            mode = "load"
+        else:
+            routes = run_sequential(data_dir, users, args.url, args.requests, args.seed)
+            routes["calc_total()"] = bench_calc_total(data_dir, users, args.requests, args.seed)
+            mode = "sequential"
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    commit = git_commit()
+    result = {
+        "meta": {
+            "commit": commit,
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "mode": mode,
+            "target": args.url or "test_client",
+            "data": os.path.abspath(args.data),
+            "users": len(users),
+            "requests": args.requests,
+            "procs": args.procs,
+            "duration": args.duration,
+            "storage": os.environ.get("STORAGE") or "json",
+        },
+        "routes": routes,
+    }
+
+    out = args.out or os.path.join(
+        RESULT_DIR, f"{datetime.now():%Y%m%d-%H%M%S}-{commit}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print(f"{'route':<24}{'n':>7}{'p50':>10}{'p95':>10}{'p99':>10}{'rps':>10}{'rss MB':>9}")
+    for name, r in routes.items():
+        print(f"{name:<24}{r['requests']:>7}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}"
+              f"{r['p99_ms']:>10.2f}{r['rps']:>10.1f}{r.get('peak_rss_mb', ''):>9}")
+    print(f"-> {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+import gzip, hashlib, json, os, threading
+from array import array
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# =========================
+# 食物 / 自訂餐點目錄快取
+# =========================
+#
+# foods.json 與 custom_meals.json 幾乎不會變動，解析結果常駐在行程記憶體中。
+# 每次取用只做一次 os.stat()，以 (mtime_ns, size) 驗證；任何行程
+# （包含其他 gunicorn worker）改寫檔案後，下一次取用就會重新載入。
+
+class CatalogCache:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return {}
+
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = self._entries.get(path)
+        if cached is not None and cached[0] == stamp:
+            self.hits += 1
+            return cached[1]
+
+        with self._lock:
+            cached = self._entries.get(path)
+            if cached is not None and cached[0] == stamp:
+                self.hits += 1
+                return cached[1]
+
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+
+            self._entries[path] = (stamp, data)
+            self.misses += 1
+            return data
+
+    def version(self, path):
+        # 目前快取內容的版本標記，尚未載入時回傳 None
+        cached = self._entries.get(path)
+        return cached[0] if cached else None
+
+    def invalidate(self, path=None):
+        with self._lock:
+            if path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(path, None)
+
+    def reload(self, *paths):
+        # 更新 mtime，讓所有 worker 在下一次取用時都重新載入
+        for path in paths:
+            if os.path.exists(path):
+                os.utime(path)
+        self.invalidate()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "files": {
+                os.path.basename(p): {"mtime_ns": s[0], "size": s[1]}
+                for p, (s, _) in self._entries.items()
+            },
+        }
+
+
+catalogs = CatalogCache()
+
+
+# =========================
+# 目錄靜態文件
+# =========================
+#
+# 首頁不再內嵌整份目錄，改為引用 /catalog/<name>.<hash>.json。
+# 網址帶內容雜湊，可設一年的 immutable 快取；目錄變動時雜湊改變、網址跟著換。
+# 每個版本只在建立時壓縮一次（gzip，另有 brotli 套件時也產生 br）。
+
+class CatalogDocument:
+
+    def __init__(self, name, data):
+        self.raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode()
+        self.digest = hashlib.sha256(self.raw).hexdigest()[:16]
+        self.filename = f"{name}.{self.digest}.json"
+
+        self.encoded = {"gzip": gzip.compress(self.raw, 9)}
+        if brotli is not None:
+            self.encoded["br"] = brotli.compress(self.raw, quality=11)
+
+    def body(self, accept_encoding):
+        # 優先 br，其次 gzip，都不接受時回傳原文
+        for encoding in ("br", "gzip"):
+            if encoding in self.encoded and encoding in accept_encoding:
+                return self.encoded[encoding], encoding
+        return self.raw, None
+
+
+class CatalogAssets:
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._docs = (None, {})
+
+    def documents(self):
+        version = self.store.catalog_version()
+
+        cached = self._docs
+        if cached[0] == version:
+            return cached[1]
+
+        with self._lock:
+            if self._docs[0] != version:
+                self._docs = (version, {
+                    "foods": CatalogDocument("foods", self.store.foods()),
+                    "customs": CatalogDocument("customs", self.store.customs()),
+                })
+            return self._docs[1]
+
+    def urls(self):
+        return {
+            name: f"/catalog/{doc.filename}"
+            for name, doc in self.documents().items()
+        }
+
+    def find(self, filename):
+        for doc in self.documents().values():
+            if doc.filename == filename:
+                return doc
+        return None
+
+
+# =========================
+# 食物 id 與營養陣列
+# =========================
+#
+# 每個食物名稱對應一個穩定的整數 id（data/food_ids.json），id 只增不回收。
+# 紀錄以 {"fid": id, "grams": g} 引用食物；改名只要同時改 foods.json 的鍵與
+# food_ids.json（tools/rename_food.py），歷史紀錄不受影響。
+# 從 foods.json 移除的食物仍保留名稱，只是營養值視為 0，與以往找不到食物時相同。
+#
+# FoodTable 把營養值放在以 id 為索引的連續 array('d')，計算總量只需陣列索引。
+
+NUTRIENTS = ("kcal", "protein", "carbs", "fat")
+
+
+def assign_ids(id_map, names):
+    # 回傳新增了 id 的名稱；id_map 會就地更新
+    next_id = max(id_map.values(), default=-1) + 1
+    added = []
+    for name in names:
+        if name not in id_map:
+            id_map[name] = next_id
+            next_id += 1
+            added.append(name)
+    return added
+
+
+class FoodTable:
+
+    def __init__(self, foods, id_map):
+        size = max(id_map.values(), default=-1) + 1
+
+        self.ids = dict(id_map)
+        self.names = [None] * size
+        for name, fid in id_map.items():
+            self.names[fid] = name
+
+        self.valid = bytearray(size)
+        self.columns = {k: array("d", bytes(8 * size)) for k in NUTRIENTS}
+        self.kcal = self.columns["kcal"]
+        self.protein = self.columns["protein"]
+        self.carbs = self.columns["carbs"]
+        self.fat = self.columns["fat"]
+
+        for name, nutr in foods.items():
+            fid = id_map.get(name)
+            if fid is None:
+                continue
+            self.valid[fid] = 1
+            for k in NUTRIENTS:
+                self.columns[k][fid] = nutr[k]
+
+    def __len__(self):
+        return len(self.names)
+
+    def _find(self, name):
+        # 名稱 -> id，包含已從 foods.json 移除的名稱
+        return self.ids.get(name)
+
+    def lookup(self, name):
+        fid = self._find(name)
+        if fid is None or not self.valid[fid]:
+            return None
+        return fid
+
+    def name(self, fid):
+        if 0 <= fid < len(self.names):
+            return self.names[fid]
+        return None
+
+    def nutrition(self, fid, grams=100):
+        if not (0 <= fid < len(self.valid)) or not self.valid[fid]:
+            return None
+        f = grams / 100
+        return (self.kcal[fid] * f, self.protein[fid] * f,
+                self.carbs[fid] * f, self.fat[fid] * f)
+
+    def entry_fid(self, entry):
+        # 舊格式以名稱記錄的紀錄也能解析
+        if "fid" in entry:
+            return entry["fid"]
+        return self._find(entry.get("food"))
+
+    def display(self, entry):
+        # 給頁面 / API 顯示用：補上食物名稱
+        if "fid" not in entry:
+            return entry
+        out = dict(entry)
+        out["food"] = self.name(entry["fid"]) or f"#{entry['fid']}"
+        return out
@@ -0,0 +1,309 @@
+import mmap, os, struct, tempfile, threading, zlib
+
+from catalog import NUTRIENTS, FoodTable
+
+
+# =========================
+# 二進位目錄檔（mmap 共用）
+# =========================
+#
+# tools/build_catalog.py 把 foods.json / custom_meals.json / food_ids.json 編成一個檔案，
+# 每個 worker 以唯讀 mmap 開啟：查詢直接讀檔案頁面，不解析、不複製，
+# 各 worker 共用作業系統的同一份 page cache，記憶體不隨 worker 數增加。
+#
+# 檔案布局（little-endian，每段對齊 8 bytes）：
+#   header        魔數 + 各段長度
+#   食物營養      4 欄 float64，各 n 筆，以食物 id 為索引
+#   valid         uint8 × n，0 表示已從 foods.json 移除的 id
+#   名稱位移      uint32 × (n + 1)，指向字串池
+#   食物雜湊表    uint32 × cap，存 id + 1（0 = 空），crc32 + 線性探測
+#   食物順序      uint32 × k，foods.json 原本的排列（下拉選單用）
+#   自訂餐點營養  4 欄 float64，各 m 筆
+#   品牌 / 餐點名稱位移  uint32 × (m + 1) 各一
+#   自訂餐點雜湊表 uint32 × ccap，鍵為 "品牌\0餐點"
+#   字串池        UTF-8
+#
+# 新版本寫到暫存檔後 os.replace 換上；已開啟的 mmap 仍指向舊 inode，
+# 進行中的請求不受影響，下一次取用時 stat 發現 inode 改變就重新 mmap，
+# worker 不需重啟。
+
+MAGIC = b"FITCAT\x01\x00"
+HEADER = struct.Struct("<8s6I")
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+def _capacity(n):
+    cap = 8
+    while cap < n * 2:
+        cap *= 2
+    return cap
+
+
+def _hash(key):
+    return zlib.crc32(key)
+
+
+def _layout(n, cap, k, m, ccap, pool):
+    # 各段 (名稱, 起點, 長度)，寫入與讀取共用同一份計算
+    sections = [
+        ("food_nutr", 8 * 4 * n),
+        ("valid", n),
+        ("name_off", 4 * (n + 1)),
+        ("food_hash", 4 * cap),
+        ("order", 4 * k),
+        ("custom_nutr", 8 * 4 * m),
+        ("brand_off", 4 * (m + 1)),
+        ("meal_off", 4 * (m + 1)),
+        ("custom_hash", 4 * ccap),
+        ("pool", pool),
+    ]
+    out = {}
+    pos = _align(HEADER.size)
+    for name, size in sections:
+        out[name] = (pos, size)
+        pos = _align(pos + size)
+    return out, pos
+
+
+def _hash_table(keys, cap):
+    slots = [0] * cap
+    mask = cap - 1
+    for i, key in enumerate(keys):
+        if key is None:
+            continue
+        h = _hash(key) & mask
+        while slots[h]:
+            h = (h + 1) & mask
+        slots[h] = i + 1
+    return slots
+
+
+# =========================
+# 建立
+# =========================
+
+def write_catalog(path, foods, customs, id_map):
+    n = max(id_map.values(), default=-1) + 1
+
+    pool = bytearray()
+
+    def intern(text):
+        pool.extend(text.encode())
+        return len(pool)
+
+    names = [None] * n
+    for name, fid in id_map.items():
+        names[fid] = name
+
+    name_off = [0]
+    for name in names:
+        name_off.append(intern(name or ""))
+
+    food_nutr = [[0.0] * n for _ in NUTRIENTS]
+    valid = bytearray(n)
+    order = []
+    for name, nutr in foods.items():
+        fid = id_map[name]
+        valid[fid] = 1
+        order.append(fid)
+        for col, k in zip(food_nutr, NUTRIENTS):
+            col[fid] = float(nutr[k])
+
+    pairs = [(b, meal, info) for b, meals in customs.items() for meal, info in meals.items()]
+    m = len(pairs)
+    custom_nutr = [[float(info[k]) for _, _, info in pairs] for k in NUTRIENTS]
+    # 品牌與餐點名稱在池中交錯存放：品牌 i 為 [meal_off[i], brand_off[i+1])，
+    # 餐點 i 為 [brand_off[i+1], meal_off[i+1])
+    brand_off, meal_off = [len(pool)], [len(pool)]
+    for brand, meal, _ in pairs:
+        brand_off.append(intern(brand))
+        meal_off.append(intern(meal))
+
+    cap = _capacity(n)
+    ccap = _capacity(m)
+    food_hash = _hash_table([name.encode() if name else None for name in names], cap)
+    custom_hash = _hash_table(
+        [f"{brand}\0{meal}".encode() for brand, meal, _ in pairs], ccap
+    )
+
+    layout, size = _layout(n, cap, len(order), m, ccap, len(pool))
+    buf = bytearray(size)
+    HEADER.pack_into(buf, 0, MAGIC, n, cap, len(order), m, ccap, len(pool))
+
+    def put(section, fmt, values):
+        pos, length = layout[section]
+        struct.pack_into(f"<{len(values)}{fmt}", buf, pos, *values)
+
+    put("food_nutr", "d", [v for col in food_nutr for v in col])
+    buf[layout["valid"][0]:layout["valid"][0] + n] = valid
+    put("name_off", "I", name_off)
+    put("food_hash", "I", food_hash)
+    put("order", "I", order)
+    put("custom_nutr", "d", [v for col in custom_nutr for v in col])
+    put("brand_off", "I", brand_off)
+    put("meal_off", "I", meal_off)
+    put("custom_hash", "I", custom_hash)
+    pos, _ = layout["pool"]
+    buf[pos:pos + len(pool)] = pool
+
+    dirname = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=dirname, prefix=".tmp-catalog-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(buf)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+# =========================
+# 讀取
+# =========================
+
+class MappedCatalog(FoodTable):
+
+    # 與 FoodTable 相同的介面，欄位都是指向 mmap 的 memoryview
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self.key = (st.st_ino, st.st_mtime_ns, st.st_size)
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        mv = memoryview(self._mmap)
+        magic, n, cap, k, m, ccap, pool = HEADER.unpack_from(mv, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: 不是目錄檔")
+
+        layout, _ = _layout(n, cap, k, m, ccap, pool)
+
+        def view(section, fmt=None):
+            pos, length = layout[section]
+            part = mv[pos:pos + length]
+            return part.cast(fmt) if fmt else part
+
+        self.size = n
+        food_nutr = view("food_nutr", "d")
+        self.columns = {key: food_nutr[i * n:(i + 1) * n] for i, key in enumerate(NUTRIENTS)}
+        self.kcal = self.columns["kcal"]
+        self.protein = self.columns["protein"]
+        self.carbs = self.columns["carbs"]
+        self.fat = self.columns["fat"]
+        self.valid = view("valid")
+        self._name_off = view("name_off", "I")
+        self._food_hash = view("food_hash", "I")
+        self._order = view("order", "I")
+
+        self.custom_count = m
+        custom_nutr = view("custom_nutr", "d")
+        self._custom_columns = [custom_nutr[i * m:(i + 1) * m] for i in range(len(NUTRIENTS))]
+        self._brand_off = view("brand_off", "I")
+        self._meal_off = view("meal_off", "I")
+        self._custom_hash = view("custom_hash", "I")
+        self._pool = view("pool")
+
+    def __len__(self):
+        return self.size
+
+    # ---------- 字串 ----------
+
+    def _text(self, start, end):
+        return str(self._pool[start:end], "utf-8")
+
+    def name(self, fid):
+        if 0 <= fid < self.size:
+            return self._text(self._name_off[fid], self._name_off[fid + 1]) or None
+        return None
+
+    def _brand(self, i):
+        return self._text(self._meal_off[i], self._brand_off[i + 1])
+
+    def _meal(self, i):
+        return self._text(self._brand_off[i + 1], self._meal_off[i + 1])
+
+    # ---------- 雜湊查詢 ----------
+
+    def _probe(self, slots, key, match):
+        cap = len(slots)
+        h = _hash(key) & (cap - 1)
+        while True:
+            slot = slots[h]
+            if not slot:
+                return None
+            if match(slot - 1):
+                return slot - 1
+            h = (h + 1) & (cap - 1)
+
+    def _find(self, name):
+        if not name:
+            return None
+        key = name.encode()
+        off = self._name_off
+        # 直接比對 mmap 中的位元組，不解碼
+        return self._probe(self._food_hash, key, lambda fid: self._pool[off[fid]:off[fid + 1]] == key)
+
+    def custom(self, brand, meal):
+        b, m = brand.encode(), meal.encode()
+        i = self._probe(
+            self._custom_hash, b + b"\0" + m,
+            lambda i: (self._pool[self._meal_off[i]:self._brand_off[i + 1]] == b
+                       and self._pool[self._brand_off[i + 1]:self._meal_off[i + 1]] == m),
+        )
+        if i is None:
+            return None
+        return {k: self._custom_columns[j][i] for j, k in enumerate(NUTRIENTS)}
+
+    # ---------- 還原成 dict（前端目錄文件、搜尋索引、維護工具用） ----------
+
+    @property
+    def ids(self):
+        return {self.name(fid): fid for fid in range(self.size) if self.name(fid)}
+
+    def foods(self):
+        return {
+            self.name(fid): {k: self.columns[k][fid] for k in NUTRIENTS}
+            for fid in self._order
+        }
+
+    def customs(self):
+        out = {}
+        for i in range(self.custom_count):
+            out.setdefault(self._brand(i), {})[self._meal(i)] = {
+                k: self._custom_columns[j][i] for j, k in enumerate(NUTRIENTS)
+            }
+        return out
+
+
+class BinaryCatalog:
+
+    # 每個行程一份；每次取用 stat 一次，檔案被換掉時重新 mmap
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._current = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def get(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        current = self._current
+        if current is not None and current.key == key:
+            return current
+
+        with self._lock:
+            if self._current is None or self._current.key != key:
+                # 舊的 mmap 交給 GC：仍在使用它的請求不會讀到被釋放的頁面
+                self._current = MappedCatalog(self.path)
+            return self._current
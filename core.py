@@ -0,0 +1,231 @@
+import math
+from datetime import date
+
+from catalog import NUTRIENTS
+from storage import CHANGES_LIMIT, entry_day
+from totals import DailyTotals, calc_total
+
+
+# =========================
+# 營養計算核心
+# =========================
+#
+# Flask（app.py）與 Tk 桌面版（tk_old/nutrition.py）共用的計算與存取邏輯：
+#
+#   foods() / food_names()                目錄（由 store 快取，不會每次重讀 foods.json）
+#   calculate(food, grams)                單一食物的營養值
+#   calculate_many([(food, grams), ...])  批次計算，整批只取一次目錄
+#   total(entries)                        一組紀錄的總營養
+#   day_key(day)                          寫入用的日期，統一為 YYYY-MM-DD，不合法時 ValueError
+#   food_entry / custom_entry / edited_entry  由輸入建立要儲存的紀錄，不合法時 ValueError
+#   day(user, day) / find(user, eid)      讀取紀錄（已補上食物名稱）
+#   add / add_many / delete / delete_id / edit   寫入並同步更新每日總量快取
+#   daily_total(user, day) / daily_totals(user, days)
+#   range(user, days)                     多天的紀錄 + 總量，一次讀取（前端預取用）
+#   changes(user, since, limit)           since 之後的變更（多裝置同步，見 storage「變更紀錄」）
+#
+# 寫入方法回傳 store 的 (寫入前版本, 寫入後版本)，呼叫端可再作廢自己的快取。
+
+# 單筆紀錄的克數上限；超過多半是輸入錯誤，也避免總量溢位成 Infinity
+MAX_GRAMS = 5000
+
+
+def day_key(day):
+    # date.fromisoformat 也接受 20250610、2025-W24-2 等寫法，一律轉回 YYYY-MM-DD；
+    # 其他字串會被存成無法以 id 定位（"xxxx" 開頭）的紀錄
+    try:
+        return date.fromisoformat(day).isoformat()
+    except (TypeError, ValueError):
+        raise ValueError("日期格式應為 YYYY-MM-DD")
+
+
+class Nutrition:
+
+    def __init__(self, store, totals=None):
+        self.store = store
+        self.totals = totals if totals is not None else DailyTotals(store)
+
+    # ---------- 目錄 ----------
+
+    def table(self):
+        return self.store.food_table()
+
+    def foods(self):
+        return self.store.foods()
+
+    def food_names(self):
+        return list(self.store.foods())
+
+    def calculate(self, food, grams):
+        result = self.calculate_many([(food, grams)])[0]
+        if result is None:
+            raise ValueError("找不到這個食物")
+        return result
+
+    def calculate_many(self, items):
+        # 找不到的食物回傳 None，不中斷整批
+        table = self.table()
+        out = []
+        for food, grams in items:
+            fid = food if isinstance(food, int) else table.lookup(str(food or "").strip())
+            nutr = table.nutrition(fid, grams) if fid is not None else None
+            out.append(dict(zip(NUTRIENTS, nutr)) if nutr is not None else None)
+        return out
+
+    def total(self, entries):
+        return calc_total(entries, self.table())
+
+    # ---------- 建立紀錄 ----------
+
+    def food_entry(self, meal, food, grams):
+        # 以食物 id 儲存，改名不影響歷史紀錄
+        if not isinstance(meal, str):
+            raise ValueError("餐別格式錯誤")
+        if not isinstance(food, str):
+            raise ValueError("請選擇有效食物")
+        fid = self.table().lookup(food.strip())
+        if fid is None:
+            raise ValueError("請選擇有效食物")
+
+        # 只收整數克數（"150"、150、150.0）；"abc"、"150.5"、NaN 不再默默改成 100，
+        # 表單的預設值由呼叫端（app.index）自行處理
+        if isinstance(grams, float) and grams.is_integer():
+            grams = int(grams)
+        elif isinstance(grams, str):
+            try:
+                grams = int(grams)
+            except ValueError:
+                raise ValueError("克數必須是整數")
+        if isinstance(grams, bool) or not isinstance(grams, int):
+            raise ValueError("克數必須是整數")
+        if not 0 < grams <= MAX_GRAMS:
+            raise ValueError(f"克數必須介於 1 到 {MAX_GRAMS}")
+
+        return {
+            "meal": meal,
+            "fid": fid,
+            "grams": grams
+        }
+
+    def custom_entry(self, meal_type, brand, meal, ratio):
+        if not isinstance(meal_type, str):
+            raise ValueError("餐別格式錯誤")
+        if not isinstance(brand, str) or not isinstance(meal, str):
+            raise ValueError("找不到這個自訂餐點")
+        info = self.store.custom_meal(brand, meal)
+        if info is None:
+            raise ValueError("找不到這個自訂餐點")
+
+        try:
+            ratio = float(ratio)
+        except (TypeError, ValueError):
+            raise ValueError("份量比例格式錯誤")
+        # NaN / inf 存進去之後，該日總量的 JSON 會無法解析
+        if not math.isfinite(ratio) or ratio <= 0:
+            raise ValueError("份量比例必須是大於 0 的數字")
+
+        return {
+            "meal": meal_type,
+            "brand": brand,
+            "food": meal,
+            "kcal": info["kcal"] * ratio,
+            "protein": info["protein"] * ratio,
+            "carbs": info["carbs"] * ratio,
+            "fat": info["fat"] * ratio
+        }
+
+    def edited_entry(self, old, data):
+        # 依原本的種類套用可修改的欄位；日期包含在 id 中，不能修改
+        meal = data.get("meal", old.get("meal", ""))
+        if not isinstance(meal, str):
+            raise ValueError("餐別格式錯誤")
+
+        if "grams" in old:
+            food = data.get("food")
+            if food is None:
+                table = self.table()
+                fid = table.entry_fid(old)
+                food = table.name(fid) if fid is not None else None
+            return self.food_entry(meal, food, data.get("grams", old["grams"]))
+
+        if "ratio" in data:
+            return self.custom_entry(meal, old.get("brand"), old.get("food"), data["ratio"])
+
+        return dict(old, meal=meal)
+
+    # ---------- 讀取 ----------
+
+    def display(self, entries):
+        table = self.table()
+        return [table.display(e) for e in entries]
+
+    def day(self, user, day):
+        return self.display(self.store.get_day(user, day))
+
+    def find(self, user, eid):
+        day = entry_day(eid)
+        if day is None:
+            return None
+        for entry in self.store.get_day(user, day):
+            if entry.get("id") == eid:
+                return entry
+        return None
+
+    def daily_total(self, user, day):
+        return self.totals.get(user, day)
+
+    def daily_totals(self, user, days):
+        return self.totals.get_many(user, days)
+
+    def range(self, user, days):
+        # 多天的紀錄與總量，只讀一次 store；回傳 (紀錄版本, {day: 紀錄}, {day: 總量})
+        version, logs, totals = self.totals.get_with_logs(user, days)
+        return version, {day: self.display(logs.get(day, [])) for day in days}, totals
+
+    def changes(self, user, since, limit=CHANGES_LIMIT):
+        # 同一頁中同一筆只留最後一次變更；put 的紀錄補上食物名稱
+        result = self.store.changes(user, since, limit)
+        table = self.table()
+
+        latest = {}
+        for change in result["changes"]:
+            latest[change["id"]] = change
+        changes = sorted(latest.values(), key=lambda c: c["seq"])
+
+        result["changes"] = [
+            dict(c, entry=table.display(c["entry"])) if "entry" in c else c for c in changes
+        ]
+        return result
+
+    # ---------- 寫入 ----------
+
+    def add(self, user, day, entry):
+        day = day_key(day)
+        versions = self.store.add(user, day, entry)
+        self.totals.added(user, day, entry, versions)
+        return versions
+
+    def add_many(self, user, items):
+        items = [(day_key(day), entry) for day, entry in items]
+        versions = self.store.add_many(user, items)
+        self.totals.added_many(user, items, versions)
+        return versions
+
+    def delete(self, user, day, index):
+        day = day_key(day)
+        versions = self.store.delete(user, day, index)
+        self.totals.deleted(user, day, index, versions)
+        return versions
+
+    def delete_id(self, user, eid):
+        # 找不到（已刪除）時回傳 None
+        versions = self.store.delete_id(user, eid)
+        if versions is not None:
+            self.totals.deleted_id(user, entry_day(eid), eid, versions)
+        return versions
+
+    def edit(self, user, eid, entry):
+        versions = self.store.edit(user, eid, entry)
+        if versions is not None:
+            self.totals.edited(user, entry_day(eid), eid, dict(entry, id=eid), versions)
+        return versions
@@ -0,0 +1,122 @@
+import sys, threading
+from collections import OrderedDict
+
+
+# =========================
+# 首頁片段快取
+# =========================
+#
+# 首頁右側（當日清單 + 總營養進度條）只跟 (使用者, 日期, 紀錄版本, 目錄版本) 有關，
+# 渲染好的 HTML 依此快取；來回切換日期時不必重新查詢與渲染。
+#
+# - 以 (使用者, 日期) 為單位做 LRU，總大小上限 max_bytes
+# - 每位使用者記下快取內容對應的紀錄版本；版本不符（例如其他 worker 寫入）時整個使用者作廢
+# - 本行程的寫入透過 written() 精確作廢：寫入前版本與快取相符時，
+#   只丟掉被寫的那幾天，其他日期直接沿用新版本
+# - 目錄版本記在每筆片段上，foods.json 改名等變動後該片段重新渲染
+
+MAX_BYTES = 32 * 1024 * 1024
+
+
+class FragmentCache:
+
+    def __init__(self, store, max_bytes=MAX_BYTES):
+        self.store = store
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (user, day) -> (catalog, html, size)
+        self._versions = {}            # user -> 紀錄版本（只記有片段的使用者）
+        self._days = {}                # user -> {day}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, user, day, build, version=None):
+        # version：build 所用資料讀取前的紀錄版本（呼叫端已先讀好資料時傳入）
+        if version is None:
+            version = self.store.version(user)
+        catalog = self.store.catalog_version()
+        key = (user, day)
+
+        with self._lock:
+            if self._versions.get(user, version) != version:
+                self._drop_user(user)
+
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == catalog:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached[1]
+
+        html = build()
+        self.misses += 1
+
+        # 渲染期間若有寫入，內容可能比 version 新，不能放進快取
+        if self.store.version(user) != version:
+            return html
+
+        with self._lock:
+            if self._versions.get(user, version) == version:
+                self._put(key, version, catalog, html)
+        return html
+
+    # ---------- 寫入後作廢 ----------
+
+    def written(self, user, days, versions):
+        prev, version = versions or (None, None)
+
+        with self._lock:
+            if user not in self._versions:
+                return
+            if prev is None or self._versions[user] != prev:
+                # 中間有其他寫入，不知道改了哪一天
+                self._drop_user(user)
+                return
+
+            self._versions[user] = version
+            for day in days:
+                self._remove((user, day))
+
+    # ---------- 內部 ----------
+
+    def _put(self, key, version, catalog, html):
+        self._remove(key)
+        size = sys.getsizeof(html)
+        if size > self.max_bytes:
+            return
+
+        self._versions[key[0]] = version
+        self._entries[key] = (catalog, html, size)
+        self._days.setdefault(key[0], set()).add(key[1])
+        self.bytes += size
+
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        cached = self._entries.pop(key, None)
+        if cached is None:
+            return
+        self.bytes -= cached[2]
+
+        days = self._days.get(key[0])
+        days.discard(key[1])
+        if not days:
+            del self._days[key[0]]
+            self._versions.pop(key[0], None)
+
+    def _drop_user(self, user):
+        for day in list(self._days.get(user, ())):
+            self._remove((user, day))
+        self._versions.pop(user, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,82 @@
+import gc, os, tempfile, time
+
+
+# =========================
+# gunicorn 設定
+# =========================
+#
+#   gunicorn -c gunicorn.conf.py
+#
+# 預設 preload：master 先執行 create_app()（預熱 + gc.freeze），再 fork worker。
+# PRELOAD=0 改為每個 worker 各自載入，WARM_UP=0 關閉預熱（bench/boot.py 比較用）。
+#
+# 啟動與第一個請求的耗時以 "[boot]" 開頭寫進 error log：
+#   [boot] master ready in 812.3 ms
+#   [boot] worker 1234 ready in 3.1 ms
+#   [boot] worker 1234 first request GET / in 4.2 ms
+
+# 設定檔載入的時間：preload 時 app（預熱 + gc.freeze）在 on_starting 之前就載入，
+# 從這裡起算 master 就緒時間才包含預熱
+_boot_started = time.perf_counter()
+
+bind = os.environ.get("BIND", "127.0.0.1:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", 4))
+# 每個 worker 多條執行緒（gthread）：/api/events 的長連線只佔一條執行緒，不會卡住整個 worker
+threads = int(os.environ.get("THREADS", 8))
+# 但每條 SSE 連線會一直佔著那條執行緒：每個 worker 的串流數最多用掉一半執行緒，
+# 其餘留給一般請求，超過的 /api/events 回 503（頁面照常，只是不即時更新）。
+# 明確設定 LIVE_MAX_STREAMS 時也至少保留一條執行緒；大量長連線請改用 asgi.py
+os.environ["LIVE_MAX_STREAMS"] = str(min(
+    int(os.environ.get("LIVE_MAX_STREAMS", threads // 2)), max(threads - 1, 0)
+))
+preload_app = os.environ.get("PRELOAD", "1") != "0"
+wsgi_app = "app:create_app()"
+
+# /metrics 匯總所有 worker（見 metrics.py）；須在載入 app 之前設定
+os.environ.setdefault("METRICS_DIR", os.path.join(
+    tempfile.gettempdir(), "fitness-metrics-" + bind.replace(":", "-").replace("/", "-")
+))
+
+if preload_app:
+    # 依 gc.freeze() 文件的建議：載入期間停用 GC，避免在之後共享的頁面上留下空洞，
+    # fork 前 freeze（create_app 內），子行程再開啟
+    gc.disable()
+
+
+def on_starting(server):
+    import metrics
+    metrics.registry.wipe()
+
+
+def when_ready(server):
+    gc.enable()
+    server.log.info("[boot] master ready in %.1f ms",
+                    (time.perf_counter() - _boot_started) * 1000)
+
+
+def post_fork(server, worker):
+    gc.enable()
+    worker.boot_started = time.perf_counter()
+    worker.first_request = True
+
+
+def post_worker_init(worker):
+    worker.log.info("[boot] worker %d ready in %.1f ms",
+                    worker.pid, (time.perf_counter() - worker.boot_started) * 1000)
+
+
+def pre_request(worker, req):
+    worker.request_started = time.perf_counter()
+
+
+def post_request(worker, req, environ, resp):
+    if worker.first_request:
+        worker.first_request = False
+        worker.log.info("[boot] worker %d first request %s %s in %.1f ms",
+                        worker.pid, req.method, req.path,
+                        (time.perf_counter() - worker.request_started) * 1000)
+
+
+def child_exit(server, worker):
+    import metrics
+    metrics.registry.retire(worker.pid)
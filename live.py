@@ -0,0 +1,285 @@
+import asyncio, json, os, threading, time
+from collections import deque
+
+
+# =========================
+# 即時更新（SSE）
+# =========================
+#
+# GET /api/events 對每個連線建立一個 Subscription，有新變更時推送：
+#   id: <cursor>
+#   event: change
+#   data: {"cursor", "changes": [...], "totals": {day: {...}}}
+#
+# - 行程內以 LiveHub 做 pub/sub：同一使用者的所有連線共用一份序列化後的訊息
+# - 跨 worker：每個行程一條背景執行緒，只替「本行程有連線」的使用者輪詢
+#   store.change_seq(user)（JSON 只讀 changes.jsonl 檔尾、SQLite 一次查詢），
+#   seq 前進才讀變更並重算受影響日期的總量；本行程寫入後呼叫 notify() 立即檢查，
+#   其他 worker 的寫入最遲 POLL_INTERVAL 秒後送達。來源只有這一條，不會重複推送。
+# - 每個連線的緩衝最多 MAX_BUFFER 則；消費太慢時丟掉緩衝並送 resync，
+#   用戶端重新載入當日資料即可，記憶體不會隨慢連線增加
+# - 連線最長 MAX_STREAM_SECONDS，之後由 EventSource 帶 Last-Event-ID 自動重連，
+#   重連時補送該 cursor 之後的變更
+#
+# WSGI 下長連線會佔住一個執行緒：gunicorn 需使用 threads > 1（gthread），
+# 且 gunicorn.conf.py 把 max_streams 壓在執行緒數的一半，其餘留給一般請求
+# （python tools/check_streams.py 檢查串流開滿時一般請求仍有回應）。
+# ASGI（asgi.py）改用 astream()：等待時只是 event loop 上的一個 coroutine，不佔執行緒。
+
+POLL_INTERVAL = 1.0
+MAX_BUFFER = 64
+MAX_STREAMS = 200
+HEARTBEAT = 15.0
+MAX_STREAM_SECONDS = 300
+
+
+def format_event(event, data, cursor=None):
+    lines = []
+    if cursor is not None:
+        lines.append(f"id: {cursor}")
+    lines.append(f"event: {event}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+    return "\n".join(lines) + "\n\n"
+
+
+class Subscription:
+
+    def __init__(self, hub, user, max_buffer):
+        self.hub = hub
+        self.user = user
+        self.max_buffer = max_buffer
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self.overflowed = False
+
+    def put(self, message):
+        with self._cond:
+            if len(self._buffer) >= self.max_buffer:
+                # 跟不上：整個緩衝作廢，改送一則 resync
+                self._buffer.clear()
+                self.overflowed = True
+                self.hub.dropped += 1
+            else:
+                self._buffer.append(message)
+            self._cond.notify()
+
+    def get(self, timeout):
+        # 回傳下一則訊息；逾時回傳 None
+        with self._cond:
+            if not self._buffer and not self.overflowed:
+                self._cond.wait(timeout)
+
+            if self.overflowed:
+                self.overflowed = False
+                return format_event("resync", {})
+            if self._buffer:
+                return self._buffer.popleft()
+            return None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class AsyncSubscription(Subscription):
+    # 背景執行緒 put() 時喚醒 event loop 上等待的 aget()
+
+    def __init__(self, hub, user, max_buffer, loop):
+        super().__init__(hub, user, max_buffer)
+        self.loop = loop
+        self._ready = asyncio.Event()
+
+    def put(self, message):
+        super().put(message)
+        try:
+            self.loop.call_soon_threadsafe(self._ready.set)
+        except RuntimeError:
+            # event loop 已關閉
+            pass
+
+    async def aget(self, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            # 先 clear 再取：取完之後才 put 的訊息仍會喚醒下一次等待
+            self._ready.clear()
+            message = self.get(0)
+            remaining = deadline - time.monotonic()
+            if message is not None or remaining <= 0:
+                return message
+            try:
+                await asyncio.wait_for(self._ready.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+
+class LiveHub:
+
+    def __init__(self, core, interval=POLL_INTERVAL, max_buffer=MAX_BUFFER, max_streams=MAX_STREAMS):
+        self.core = core
+        self.interval = interval
+        self.max_buffer = max_buffer
+        self.max_streams = max_streams
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._subs = {}      # user -> set(Subscription)
+        self._cursors = {}   # user -> 已推送到的 seq
+        self._pid = None
+        self.published = 0
+        self.dropped = 0
+
+    # ---------- 訂閱 ----------
+
+    def full(self):
+        with self._lock:
+            return sum(len(s) for s in self._subs.values()) >= self.max_streams
+
+    def subscribe(self, user, loop=None):
+        # 超過 max_streams 時回傳 None；loop 不為 None 時回傳 AsyncSubscription
+        with self._lock:
+            if self._pid != os.getpid():
+                # fork 後重新啟動背景執行緒
+                self._pid = os.getpid()
+                self._subs, self._cursors = {}, {}
+                threading.Thread(target=self._run, daemon=True).start()
+
+            if sum(len(s) for s in self._subs.values()) >= self.max_streams:
+                return None
+
+            if loop is None:
+                sub = Subscription(self, user, self.max_buffer)
+            else:
+                sub = AsyncSubscription(self, user, self.max_buffer, loop)
+            if user not in self._subs:
+                self._subs[user] = set()
+                self._cursors[user] = self.core.store.change_seq(user)
+            self._subs[user].add(sub)
+            return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            subs = self._subs.get(sub.user)
+            if subs is None:
+                return
+            subs.discard(sub)
+            if not subs:
+                del self._subs[sub.user]
+                del self._cursors[sub.user]
+
+    def notify(self, user):
+        # 本行程寫入後呼叫：立即檢查，不必等下一輪
+        if user in self._subs:
+            self._wake.set()
+
+    # ---------- 背景輪詢 ----------
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+            with self._lock:
+                users = list(self._subs)
+
+            for user in users:
+                try:
+                    self._check(user)
+                except Exception:
+                    # 單一使用者讀取失敗不影響其他人，下一輪再試
+                    pass
+
+    def _check(self, user):
+        cursor = self._cursors.get(user)
+        if cursor is None or self.core.store.change_seq(user) == cursor:
+            return
+
+        while True:
+            result = self.core.changes(user, cursor)
+            cursor = result["cursor"]
+            self._publish(user, cursor, self._message(user, result))
+            if not result["more"]:
+                return
+
+    def _message(self, user, result):
+        # cursor 太舊（或紀錄被整份取代）時只通知重新載入
+        if result["reset"]:
+            return format_event("resync", {}, result["cursor"])
+
+        days = sorted({c["date"] for c in result["changes"]})
+        return format_event("change", {
+            "cursor": result["cursor"],
+            "changes": result["changes"],
+            "totals": self.core.daily_totals(user, days),
+        }, result["cursor"])
+
+    def _publish(self, user, cursor, message):
+        with self._lock:
+            if user not in self._subs:
+                return
+            self._cursors[user] = cursor
+            subs = list(self._subs[user])
+
+        for sub in subs:
+            sub.put(message)
+        self.published += 1
+
+    # ---------- 串流 ----------
+
+    def stream(self, user, last_id=None):
+        # 產生 SSE 文字；last_id 為重連時瀏覽器帶的 Last-Event-ID。
+        # 在 generator 內才訂閱：回應沒開始送就被關閉時不會留下訂閱
+        sub = self.subscribe(user)
+        if sub is None:
+            return
+
+        started = time.monotonic()
+        try:
+            yield "retry: 3000\n\n"
+
+            if last_id is not None:
+                message = self._replay(user, last_id)
+                if message is not None:
+                    yield message
+
+            while time.monotonic() - started < MAX_STREAM_SECONDS:
+                message = sub.get(HEARTBEAT)
+                # 逾時送註解行當心跳，連線斷掉時寫入失敗即結束
+                yield message if message is not None else ": ping\n\n"
+        finally:
+            sub.close()
+
+    async def astream(self, user, last_id=None, executor=None):
+        # stream() 的 asyncio 版本；讀取 store 的部分丟到 executor
+        loop = asyncio.get_running_loop()
+        sub = await loop.run_in_executor(executor, self.subscribe, user, loop)
+        if sub is None:
+            return
+
+        started = time.monotonic()
+        try:
+            yield "retry: 3000\n\n"
+
+            if last_id is not None:
+                message = await loop.run_in_executor(executor, self._replay, user, last_id)
+                if message is not None:
+                    yield message
+
+            while time.monotonic() - started < MAX_STREAM_SECONDS:
+                message = await sub.aget(HEARTBEAT)
+                yield message if message is not None else ": ping\n\n"
+        finally:
+            sub.close()
+
+    def _replay(self, user, last_id):
+        # 重連時補送 last_id 之後的變更；沒有變更時回傳 None
+        result = self.core.changes(user, last_id)
+        if result["reset"] or result["changes"]:
+            return self._message(user, result)
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "users": len(self._subs),
+                "streams": sum(len(s) for s in self._subs.values()),
+                "published": self.published,
+                "dropped": self.dropped,
+            }
@@ -0,0 +1,254 @@
+import atexit, json, os, tempfile, threading, time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+
+# =========================
+# 請求計時與 /metrics
+# =========================
+#
+# 每個 worker 在記憶體中累計直方圖（只有 perf_counter 與幾次加法，閒置時零成本）。
+# 設定 METRICS_DIR 時，每個 worker 最多每 FLUSH_INTERVAL 秒把自己的累計值
+# 寫成 METRICS_DIR/<pid>.json；/metrics 讀取目錄內全部檔案加總，
+# 因此不論請求落在哪個 gunicorn worker，看到的都是整個服務的數字。
+# 未設定 METRICS_DIR 時只回報本行程（gunicorn.conf.py 預設會設定）。
+# master 啟動時 wipe() 清掉上次執行留下的檔案；worker 結束時 retire(pid)
+# 把它的累計值併入 retired.json，總數不會倒退，檔案數也不會隨重啟增加。
+#
+# 指標：
+#   fitness_request_duration_seconds{route, method, status}
+#   fitness_span_duration_seconds{route, span}   storage / aggregation / template
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+FLUSH_INTERVAL = 1.0
+
+HELP = {
+    "fitness_request_duration_seconds": "HTTP request latency by route",
+    "fitness_span_duration_seconds": "Time spent in storage / aggregation / template steps",
+}
+
+
+class Registry:
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._data = {name: {} for name in HELP}
+        self._flushed = 0.0
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            atexit.register(self.flush)
+
+    def observe(self, name, labels, value):
+        key = json.dumps(labels, ensure_ascii=False, sort_keys=True)
+        i = bisect_left(BUCKETS, value)
+
+        with self._lock:
+            row = self._data[name].get(key)
+            if row is None:
+                # 每個 bucket 的個數（非累計）+ 溢出 + sum
+                row = self._data[name][key] = [0] * (len(BUCKETS) + 2)
+            row[i] += 1
+            row[-1] += value
+
+    def clear(self):
+        with self._lock:
+            self._data = {name: {} for name in HELP}
+
+    # ---------- 跨 worker ----------
+
+    def _path(self):
+        return os.path.join(self.directory, f"{os.getpid()}.json")
+
+    def maybe_flush(self):
+        if self.directory and time.monotonic() - self._flushed >= FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if not self.directory:
+            return
+
+        with self._lock:
+            state = json.dumps(self._data)
+            self._flushed = time.monotonic()
+
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "w") as f:
+            f.write(state)
+        os.replace(tmp, self._path())
+
+    def collect(self):
+        if not self.directory:
+            with self._lock:
+                return json.loads(json.dumps(self._data))
+
+        self.flush()
+        merged = {name: {} for name in HELP}
+
+        for fname in os.listdir(self.directory):
+            if not fname.endswith(".json") or fname.startswith("."):
+                continue
+            state = _read_state(os.path.join(self.directory, fname))
+            if state is not None:
+                _merge(merged, state)
+
+        return merged
+
+    def wipe(self):
+        # master 在 fork 前呼叫：上次執行的檔案不再計入
+        if not self.directory:
+            return
+        for fname in os.listdir(self.directory):
+            _remove(os.path.join(self.directory, fname))
+
+    def retire(self, pid):
+        # master 在 worker 結束後呼叫（只有 master 寫 retired.json）
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f"{pid}.json")
+        state = _read_state(path)
+        if state is None:
+            return
+
+        retired_path = os.path.join(self.directory, "retired.json")
+        retired = _read_state(retired_path) or {}
+        _merge(retired, state)
+
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "w") as f:
+            json.dump(retired, f)
+        os.replace(tmp, retired_path)
+        _remove(path)
+
+    # ---------- Prometheus 文字格式 ----------
+
+    def render(self):
+        lines = []
+        for name, rows in self.collect().items():
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+
+            for key in sorted(rows):
+                row = rows[key]
+                labels = _labels(json.loads(key))
+                sep = "," if labels else ""
+
+                cumulative = 0
+                for bound, n in zip(BUCKETS, row):
+                    cumulative += n
+                    lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+                count = cumulative + row[len(BUCKETS)]
+                lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {count}')
+                lines.append(f"{name}_sum{{{labels}}} {row[-1]:.6f}")
+                lines.append(f"{name}_count{{{labels}}} {count}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _read_state(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(merged, state):
+    for name, rows in state.items():
+        target = merged.setdefault(name, {})
+        for key, row in rows.items():
+            acc = target.get(key)
+            if acc is None:
+                target[key] = list(row)
+            else:
+                for i, v in enumerate(row):
+                    acc[i] += v
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    return ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+
+
+registry = Registry(os.environ.get("METRICS_DIR"))
+
+
+# =========================
+# 計時工具
+# =========================
+
+def current_route():
+    if has_request_context():
+        return g.get("route", "-")
+    return "-"
+
+
+@contextmanager
+def span(name):
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(
+            "fitness_span_duration_seconds",
+            {"route": current_route(), "span": name},
+            time.perf_counter() - t,
+        )
+
+
+class Instrumented:
+
+    # 代理物件：呼叫底層物件的任何方法都記一筆 span
+    def __init__(self, target, span_name):
+        self._target = target
+        self._span = span_name
+
+    def __getattr__(self, attr):
+        value = getattr(self._target, attr)
+        if not callable(value):
+            return value
+
+        def timed(*args, **kwargs):
+            with span(self._span):
+                return value(*args, **kwargs)
+
+        return timed
+
+
+def init_app(app):
+
+    @app.before_request
+    def _start_timer():
+        g.route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        g.started = time.perf_counter()
+
+    @app.after_request
+    def _record(resp):
+        started = g.pop("started", None)
+        if started is not None:
+            registry.observe(
+                "fitness_request_duration_seconds",
+                {"route": g.route, "method": request.method, "status": str(resp.status_code)},
+                time.perf_counter() - started,
+            )
+            registry.maybe_flush()
+        return resp
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return app.response_class(
+            registry.render(), mimetype="text/plain; version=0.0.4"
+        )
@@ -0,0 +1,223 @@
+import cProfile, hmac, io, json, os, pstats, random, re, time
+from urllib.parse import urlencode
+
+from flask import g, jsonify, request, send_from_directory, session
+
+
+# =========================
+# 按需效能剖析
+# =========================
+#
+# 只有管理者能開啟，兩種方式：
+#   1. 單次請求：帶 X-Profile: <ADMIN_TOKEN> 標頭，或網址加 ?_profile=<ADMIN_TOKEN>
+#   2. 抽樣：PROFILE_SAMPLE_RATE=0.01 代表 1% 的請求，
+#      只保留耗時超過 PROFILE_MIN_MS 的結果
+#
+# 每筆剖析存成 PROFILE_DIR 下的三個檔案：
+#   <id>.pstats     python -m pstats / snakeviz 可讀
+#   <id>.collapsed  flamegraph.pl / speedscope 可讀的 collapsed stacks
+#   <id>.json       路由、使用者、耗時等摘要
+# 目錄最多保留 PROFILE_KEEP 筆，較舊的自動刪除。
+#
+# GET /admin/profiles            依耗時排序列出最近的剖析
+# GET /admin/profiles/<file>     下載檔案
+
+DEFAULT_KEEP = 50
+DEFAULT_MIN_MS = 200
+
+
+def profiled_path():
+    # 紀錄用的路徑：拿掉 ?_profile=<ADMIN_TOKEN>，管理密鑰不寫進檔案
+    args = [(k, v) for k, v in request.args.items(multi=True) if k != "_profile"]
+    return request.path + ("?" + urlencode(args) if args else "")
+
+
+class Profiler:
+
+    def __init__(self, directory, admin_token=None, sample_rate=0.0,
+                 min_ms=DEFAULT_MIN_MS, keep=DEFAULT_KEEP):
+        self.directory = directory
+        self.admin_token = admin_token
+        self.sample_rate = sample_rate
+        self.min_ms = min_ms
+        self.keep = keep
+
+    # ---------- 開關 ----------
+
+    def _token_ok(self, token):
+        return bool(self.admin_token) and bool(token) and hmac.compare_digest(
+            token.encode(), self.admin_token.encode()
+        )
+
+    def wanted(self):
+        token = request.headers.get("X-Profile") or request.args.get("_profile")
+        if token is not None:
+            return "explicit" if self._token_ok(token) else None
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    # ---------- 儲存 ----------
+
+    def save(self, prof, elapsed_ms, reason, status):
+        os.makedirs(self.directory, exist_ok=True)
+
+        route = g.get("route") or request.path
+        slug = re.sub(r"[^\w]+", "_", route).strip("_") or "root"
+        pid = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(elapsed_ms)}ms-{slug}-{os.getpid()}"
+        base = os.path.join(self.directory, pid)
+
+        prof.dump_stats(base + ".pstats")
+
+        with open(base + ".collapsed", "w", encoding="utf-8") as f:
+            f.write(collapsed_stacks(pstats.Stats(prof)))
+
+        top = io.StringIO()
+        pstats.Stats(prof, stream=top).sort_stats("cumulative").print_stats(15)
+
+        with open(base + ".json", "w", encoding="utf-8") as f:
+            json.dump({
+                "id": pid,
+                "time": time.time(),
+                "route": route,
+                "path": profiled_path(),
+                "method": request.method,
+                "status": status,
+                "user": session.get("user"),
+                "elapsed_ms": round(elapsed_ms, 2),
+                "reason": reason,
+                "top": top.getvalue(),
+            }, f, ensure_ascii=False, indent=2)
+
+        self.rotate()
+
+    def rotate(self):
+        metas = sorted(
+            f for f in os.listdir(self.directory) if f.endswith(".json")
+        )
+        for meta in metas[:-self.keep] if len(metas) > self.keep else []:
+            base = meta[:-len(".json")]
+            for ext in (".json", ".pstats", ".collapsed"):
+                try:
+                    os.remove(os.path.join(self.directory, base + ext))
+                except FileNotFoundError:
+                    pass
+
+    def recent(self):
+        if not os.path.isdir(self.directory):
+            return []
+
+        out = []
+        for f in os.listdir(self.directory):
+            if not f.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, f), encoding="utf-8") as fh:
+                    meta = json.load(fh)
+            except (OSError, ValueError):
+                continue
+            meta.pop("top", None)
+            meta["files"] = {
+                "pstats": f"/admin/profiles/{meta['id']}.pstats",
+                "collapsed": f"/admin/profiles/{meta['id']}.collapsed",
+                "summary": f"/admin/profiles/{meta['id']}.json",
+            }
+            out.append(meta)
+
+        out.sort(key=lambda m: m["elapsed_ms"], reverse=True)
+        return out
+
+    # ---------- Flask ----------
+
+    def init_app(self, app, is_admin):
+
+        @app.before_request
+        def _start_profile():
+            reason = self.wanted()
+            if reason is None:
+                return
+            prof = cProfile.Profile()
+            g.profile = (prof, reason, time.perf_counter())
+            prof.enable()
+
+        @app.after_request
+        def _stop_profile(resp):
+            state = g.pop("profile", None)
+            if state is None:
+                return resp
+
+            prof, reason, started = state
+            prof.disable()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            if reason == "explicit" or elapsed_ms >= self.min_ms:
+                self.save(prof, elapsed_ms, reason, resp.status_code)
+            return resp
+
+        @app.route("/admin/profiles", methods=["GET"])
+        def profiles():
+            if not is_admin():
+                return jsonify({"error": "forbidden"}), 403
+            return jsonify(self.recent())
+
+        @app.route("/admin/profiles/<filename>", methods=["GET"])
+        def profile_file(filename):
+            if not is_admin():
+                return jsonify({"error": "forbidden"}), 403
+            return send_from_directory(self.directory, filename, as_attachment=True)
+
+
+# =========================
+# pstats -> collapsed stacks
+# =========================
+#
+# cProfile 只記錄「呼叫者 → 被呼叫者」的邊，沒有完整堆疊。
+# 從沒有呼叫者的根節點往下展開，子節點的時間依該條邊佔總累計時間的比例分配，
+# 得到近似的火焰圖（單位：微秒）。
+
+MAX_DEPTH = 64
+MIN_SECONDS = 1e-6
+
+
+def _label(func):
+    filename, line, name = func
+    return f"{name} ({os.path.basename(filename)}:{line})"
+
+
+def collapsed_stacks(stats):
+    entries = stats.stats
+    children = {}
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, edge in callers.items():
+            children.setdefault(caller, []).append((func, edge))
+
+    lines = {}
+
+    def walk(func, stack, scale, seen):
+        tt = entries[func][2]
+        key = ";".join(stack)
+        lines[key] = lines.get(key, 0) + tt * scale
+
+        if len(stack) >= MAX_DEPTH:
+            return
+
+        for child, edge in children.get(func, []):
+            if child in seen:
+                continue
+            # 子節點中「由此處呼叫」的比例，再乘上本節點在這條路徑的比例
+            child_ct = entries[child][3]
+            child_scale = scale * edge[3] / child_ct if child_ct else 0
+            if child_ct * child_scale < MIN_SECONDS:
+                # 可忽略的分支不再展開，避免路徑數爆炸
+                continue
+            walk(child, stack + [_label(child)], child_scale, seen | {child})
+
+    for func, (_, _, _, _, callers) in entries.items():
+        if not callers:
+            walk(func, [_label(func)], 1.0, {func})
+
+    return "".join(
+        f"{stack} {int(value * 1e6)}\n"
+        for stack, value in lines.items()
+        if int(value * 1e6) > 0
+    )
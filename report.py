@@ -0,0 +1,167 @@
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+
+
+# =========================
+# 週 / 月營養報表
+# =========================
+#
+# 把使用者全部紀錄轉成欄式陣列（每筆一列）：
+#   day   紀錄日期的 ordinal
+#   nutr  (n, 4) kcal / protein / carbs / fat
+# 克數制的食物 id 直接索引 FoodTable 的營養陣列（零複製轉成 numpy），之後所有報表都是向量運算：
+# 以 np.bincount 依日期加總，再用累加和算 7 / 30 日移動平均。
+# 欄式資料依 (紀錄版本, 目錄版本) 快取，沒有寫入時不會重建。
+
+KEYS = ("kcal", "protein", "carbs", "fat")
+WINDOWS = (7, 30)
+MAX_DAYS = 3660
+MAX_USERS = 64
+
+
+def build_columns(logs, table):
+    matrix = np.stack(
+        [np.frombuffer(table.columns[k], dtype=np.float64) for k in KEYS], axis=1
+    ) if len(table) else np.zeros((0, 4))
+
+    days, ids, grams, fixed = [], [], [], []
+
+    for day, entries in logs.items():
+        try:
+            ordinal = date.fromisoformat(day).toordinal()
+        except ValueError:
+            continue
+
+        for e in entries:
+            if "grams" in e:
+                i = table.entry_fid(e)
+                if i is None or not table.valid[i]:
+                    continue
+                days.append(ordinal)
+                ids.append(i)
+                grams.append(e["grams"])
+                fixed.append((0, 0, 0, 0))
+            else:
+                days.append(ordinal)
+                ids.append(-1)
+                grams.append(0)
+                fixed.append(tuple(e.get(k, 0) for k in KEYS))
+
+    days = np.array(days, dtype=np.int64)
+    ids = np.array(ids, dtype=np.int64)
+    grams = np.array(grams, dtype=np.float64)
+    nutr = np.array(fixed, dtype=np.float64).reshape(-1, 4)
+
+    gram_rows = ids >= 0
+    if gram_rows.any():
+        nutr[gram_rows] = matrix[ids[gram_rows]] * (grams[gram_rows] / 100)[:, None]
+
+    order = np.argsort(days, kind="stable")
+    return days[order], nutr[order]
+
+
+def _daily(days, nutr, start, end):
+    # [start, end] 區間（ordinal，含頭尾）每日總量，形狀 (天數, 4)
+    n = end - start + 1
+    lo, hi = np.searchsorted(days, [start, end + 1])
+    idx = days[lo:hi] - start
+
+    out = np.empty((n, 4), dtype=np.float64)
+    for k in range(4):
+        out[:, k] = np.bincount(idx, weights=nutr[lo:hi, k], minlength=n)
+    return out
+
+
+def _rolling(daily, window):
+    csum = np.cumsum(daily, axis=0)
+    out = csum.copy()
+    out[window:] -= csum[:-window]
+    return out / window
+
+
+def _columns(arr):
+    return {k: arr[..., i].round(2).tolist() for i, k in enumerate(KEYS)}
+
+
+def build_report(days, nutr, start, end, targets):
+    pad = max(WINDOWS) - 1
+    start_o, end_o = start.toordinal(), end.toordinal()
+
+    padded = _daily(days, nutr, start_o - pad, end_o)
+    daily = padded[pad:]
+    n = len(daily)
+
+    target = np.array([targets[k] for k in KEYS], dtype=np.float64)
+    pct = daily / target * 100
+    logged = daily.any(axis=1)
+    n_logged = int(logged.sum())
+
+    total = daily.sum(axis=0)
+    report = {
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "dates": [(start + timedelta(days=i)).isoformat() for i in range(n)],
+        "logged_days": n_logged,
+        "daily": _columns(daily),
+        "total": dict(zip(KEYS, total.round(2).tolist())),
+        "average": dict(zip(KEYS, (total / n).round(2).tolist())),
+        "average_logged": dict(zip(
+            KEYS, (total / n_logged if n_logged else total * 0).round(2).tolist()
+        )),
+        "targets": dict(zip(KEYS, target.tolist())),
+        "adherence": {
+            "daily_pct": _columns(pct),
+            "average_pct": dict(zip(
+                KEYS,
+                (pct[logged].mean(axis=0) if n_logged else np.zeros(4)).round(1).tolist(),
+            )),
+            # 紀錄日中落在目標 ±10% 的比例
+            "on_target_pct": dict(zip(
+                KEYS,
+                ((np.abs(pct[logged] - 100) <= 10).mean(axis=0) * 100
+                 if n_logged else np.zeros(4)).round(1).tolist(),
+            )),
+        },
+    }
+
+    for w in WINDOWS:
+        report[f"rolling_{w}"] = _columns(_rolling(padded, w)[pad:])
+
+    return report
+
+
+class ReportCache:
+
+    def __init__(self, store, max_users=MAX_USERS):
+        self.store = store
+        self.max_users = max_users
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def columns(self, user):
+        table = self.store.food_table()
+        key = (self.store.version(user), self.store.catalog_version())
+
+        with self._lock:
+            cached = self._users.get(user)
+            if cached is not None and cached[0] == key:
+                self._users.move_to_end(user)
+                return cached[1]
+
+        cols = build_columns(self.store.load(user), table)
+        if self.store.version(user) != key[0]:
+            return cols
+
+        with self._lock:
+            self._users[user] = (key, cols)
+            self._users.move_to_end(user)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return cols
+
+    def report(self, user, start, end, targets):
+        days, nutr = self.columns(user)
+        return build_report(days, nutr, start, end, targets)
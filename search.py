@@ -0,0 +1,127 @@
+import heapq, threading, unicodedata
+from bisect import bisect_left
+
+
+# =========================
+# 食物搜尋索引
+# =========================
+#
+# 名稱先經 NFKC 正規化（全形括號、全形英數轉半形）、轉小寫並去除空白，
+# 因此「（100g)」與「（100g）」、「(100g)」都視為相同。
+#
+# - 前綴查詢：對正規化後的名稱排序，bisect 找出範圍
+# - 子字串查詢：字元 bigram 倒排索引（單一字元查詢用 unigram），
+#   中文不需斷詞；取最短的 posting list 逐筆驗證
+#
+# 排序：完全相符 > 前綴 > 子字串；同級依名稱長度。
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKC", text).lower()
+    return "".join(text.split())
+
+
+def _grams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class FoodIndex:
+
+    def __init__(self, foods, customs):
+        self.items = [{"type": "food", "name": name} for name in foods]
+        self.items += [
+            {"type": "custom", "brand": brand, "meal": meal}
+            for brand, meals in customs.items()
+            for meal in meals
+        ]
+
+        self.keys = [
+            normalize(item["name"] if item["type"] == "food"
+                      else f"{item['brand']} {item['meal']}")
+            for item in self.items
+        ]
+
+        # 前綴：完整名稱，以及自訂餐點單獨的餐點名稱
+        self.prefixes = sorted(
+            [(k, i) for i, k in enumerate(self.keys)]
+            + [
+                (normalize(item["meal"]), i)
+                for i, item in enumerate(self.items)
+                if item["type"] == "custom"
+            ]
+        )
+
+        # 倒排索引的每個 posting list 依 (名稱長度, id) 排序，
+        # 查詢時從最短的 list 依序驗證，湊滿 limit 筆即可停止
+        order = sorted(range(len(self.keys)), key=lambda i: (len(self.keys[i]), i))
+        self.postings = {}
+        for i in order:
+            key = self.keys[i]
+            for g in _grams(key, 1) | _grams(key, 2):
+                self.postings.setdefault(g, []).append(i)
+
+    def _shortest_posting(self, q):
+        if len(q) == 1:
+            return self.postings.get(q, [])
+
+        best = None
+        for g in _grams(q, 2):
+            ids = self.postings.get(g)
+            if not ids:
+                return []
+            if best is None or len(ids) < len(best):
+                best = ids
+        return best
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        q = normalize(query)
+        if not q:
+            return []
+
+        ranked = {}
+
+        lo = bisect_left(self.prefixes, (q,))
+        for key, i in self.prefixes[lo:lo + limit * 4]:
+            if not key.startswith(q):
+                break
+            rank = (0 if key == q else 1, len(key), i)
+            if i not in ranked or rank < ranked[i]:
+                ranked[i] = rank
+
+        found = 0
+        for i in self._shortest_posting(q):
+            if found >= limit:
+                break
+            if i in ranked or q not in self.keys[i]:
+                continue
+            ranked[i] = (2, len(self.keys[i]), i)
+            found += 1
+
+        best = heapq.nsmallest(limit, ranked.values())
+        return [self.items[r[2]] for r in best]
+
+
+class SearchIndex:
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._index = (None, None)
+
+    def get(self):
+        version = self.store.catalog_version()
+
+        cached = self._index
+        if cached[0] == version:
+            return cached[1]
+
+        with self._lock:
+            if self._index[0] != version:
+                self._index = (version, FoodIndex(self.store.foods(), self.store.customs()))
+            return self._index[1]
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        return self.get().search(query, max(1, min(limit, MAX_LIMIT)))
@@ -0,0 +1,605 @@
+import json, os, queue, sqlite3, threading
+from contextlib import contextmanager
+
+from catalog import FoodTable, assign_ids
+from catalog_bin import BinaryCatalog, write_catalog
+from storage import CHANGES_KEEP, CHANGES_LIMIT, change_record, ensure_id, entry_day, snapshot_changes
+
+
+# =========================
+# SQLite 後端
+# =========================
+#
+# 與 storage.JsonStore 相同的介面。
+# - WAL 模式：讀不擋寫，多個 gunicorn worker 可同時寫入
+# - logs 以 (user, date, id) 建索引，單日查詢不需讀整份歷史
+# - 紀錄 id 另存 eid 欄並以 (user, eid) 建索引，依 id 刪除 / 修改只碰該列
+# - 同步用的變更紀錄存在 changes，與寫入同一個交易；change_seqs 記各使用者目前的 seq 與保留下限
+# - 每個行程維護一組連線池，fork 後自動重建
+# - 目錄表另記 catalog_version，版本不變時直接回傳記憶體中的結果
+# - log_versions 記錄每位使用者的紀錄版本，每次寫入在同一交易內遞增
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    name TEXT PRIMARY KEY,
+    password TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user TEXT NOT NULL,
+    date TEXT NOT NULL,
+    entry TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS logs_user_date ON logs (user, date, id);
+
+CREATE TABLE IF NOT EXISTS changes (
+    user TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    eid TEXT,
+    date TEXT NOT NULL,
+    op TEXT NOT NULL,
+    entry TEXT,
+    PRIMARY KEY (user, seq)
+);
+
+CREATE INDEX IF NOT EXISTS changes_user_eid ON changes (user, eid);
+
+CREATE TABLE IF NOT EXISTS change_seqs (
+    user TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    floor INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS log_versions (
+    user TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS foods (
+    name TEXT PRIMARY KEY,
+    kcal REAL NOT NULL,
+    protein REAL NOT NULL,
+    carbs REAL NOT NULL,
+    fat REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS food_ids (
+    name TEXT PRIMARY KEY,
+    id INTEGER NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS custom_meals (
+    brand TEXT NOT NULL,
+    meal TEXT NOT NULL,
+    kcal REAL NOT NULL,
+    protein REAL NOT NULL,
+    carbs REAL NOT NULL,
+    fat REAL NOT NULL,
+    PRIMARY KEY (brand, meal)
+);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+
+INSERT OR IGNORE INTO meta (key, value) VALUES ('catalog_version', 0);
+"""
+
+POOL_SIZE = 8
+
+
+def _dumps(entry):
+    return json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+
+
+class SqliteStore:
+
+    def __init__(self, path, pool_size=POOL_SIZE):
+        self.path = path
+        self.pool_size = pool_size
+        self._pid = None
+        self._pool = None
+        self._lock = threading.Lock()
+        self._catalog = (None, {}, {}, None)
+        self.catalog_bin = BinaryCatalog(os.path.splitext(path)[0] + ".catalog.bin")
+        self.hits = 0
+        self.misses = 0
+
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+        with self.connect() as conn:
+            conn.executescript(SCHEMA)
+        self._upgrade()
+
+    def _upgrade(self):
+        # 舊資料庫補上 eid 欄，並替既有紀錄產生 id；已有紀錄卻沒有 seq 的使用者
+        # 從 seq 1 起算（floor 1），新裝置以 since=0 同步時會拿到整份紀錄
+        with self.transaction() as conn:
+            columns = [r[1] for r in conn.execute("PRAGMA table_info(logs)")]
+            if "eid" not in columns:
+                conn.execute("ALTER TABLE logs ADD COLUMN eid TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS logs_user_eid ON logs (user, eid)")
+
+            rows = conn.execute(
+                "SELECT id, date, entry FROM logs WHERE eid IS NULL"
+            ).fetchall()
+            updates = []
+            for rowid, day, entry in rows:
+                entry = ensure_id(day, json.loads(entry))
+                updates.append((entry["id"], _dumps(entry), rowid))
+            conn.executemany("UPDATE logs SET eid = ?, entry = ? WHERE id = ?", updates)
+            if rows:
+                conn.execute("UPDATE log_versions SET version = version + 1")
+
+            conn.execute(
+                "INSERT INTO change_seqs (user, seq, floor) "
+                "SELECT DISTINCT user, 1, 1 FROM logs "
+                "WHERE user NOT IN (SELECT user FROM change_seqs)"
+            )
+
+    # ---------- 連線池 ----------
+
+    def _new_connection(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False,
+                               isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=30000")
+        return conn
+
+    @contextmanager
+    def connect(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # fork 後不可沿用父行程的連線
+                    self._pool = queue.LifoQueue(self.pool_size)
+                    self._pid = os.getpid()
+
+        pool = self._pool
+        try:
+            conn = pool.get_nowait()
+        except queue.Empty:
+            conn = self._new_connection()
+
+        try:
+            yield conn
+        finally:
+            try:
+                pool.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    @contextmanager
+    def transaction(self):
+        with self.connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    # ---------- 帳號 ----------
+
+    def get_user(self, name):
+        with self.connect() as conn:
+            row = conn.execute(
+                "SELECT password FROM users WHERE name = ?", (name,)
+            ).fetchone()
+        return {"password": row[0]} if row else None
+
+    def add_user(self, name, password):
+        with self.transaction() as conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO users (name, password) VALUES (?, ?)",
+                (name, password),
+            )
+        return cur.rowcount == 1
+
+    def users(self):
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT name FROM users UNION SELECT DISTINCT user FROM logs ORDER BY 1"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    # ---------- 目錄 ----------
+
+    def _catalogs(self):
+        with self.connect() as conn:
+            version = conn.execute(
+                "SELECT value FROM meta WHERE key = 'catalog_version'"
+            ).fetchone()[0]
+
+            cached = self._catalog
+            if cached[0] == version:
+                self.hits += 1
+                return cached
+
+            foods = {
+                name: {"kcal": k, "protein": p, "carbs": c, "fat": f}
+                for name, k, p, c, f in conn.execute(
+                    "SELECT name, kcal, protein, carbs, fat FROM foods ORDER BY rowid"
+                )
+            }
+
+            customs = {}
+            for brand, meal, k, p, c, f in conn.execute(
+                "SELECT brand, meal, kcal, protein, carbs, fat "
+                "FROM custom_meals ORDER BY rowid"
+            ):
+                customs.setdefault(brand, {})[meal] = {
+                    "kcal": k, "protein": p, "carbs": c, "fat": f
+                }
+
+            id_map = dict(conn.execute("SELECT name, id FROM food_ids"))
+
+        if any(name not in id_map for name in foods):
+            self._assign_ids(foods)
+            return self._catalogs()
+
+        self._catalog = (version, foods, customs, FoodTable(foods, id_map))
+        self.misses += 1
+        return self._catalog
+
+    # <db>.catalog.bin 存在時以它為準，見 catalog_bin.py
+
+    def foods(self):
+        mapped = self.catalog_bin.get()
+        if mapped is not None:
+            return mapped.foods()
+        return self._catalogs()[1]
+
+    def customs(self):
+        mapped = self.catalog_bin.get()
+        if mapped is not None:
+            return mapped.customs()
+        return self._catalogs()[2]
+
+    def custom_meal(self, brand, meal):
+        mapped = self.catalog_bin.get()
+        if mapped is not None:
+            return mapped.custom(brand, meal)
+        return self._catalogs()[2].get(brand, {}).get(meal)
+
+    def food_table(self):
+        mapped = self.catalog_bin.get()
+        if mapped is not None:
+            return mapped
+        return self._catalogs()[3]
+
+    def build_catalog(self):
+        _, foods, customs, table = self._catalogs()
+        write_catalog(self.catalog_bin.path, foods, customs, table.ids)
+        return self.catalog_bin.get()
+
+    def _rebuild_catalog(self):
+        if self.catalog_bin.exists():
+            self.build_catalog()
+
+    def assign_food_ids(self, names):
+        self._assign_ids(names)
+        self._rebuild_catalog()
+        return self.food_table()
+
+    def _assign_ids(self, names):
+        with self.transaction() as conn:
+            id_map = dict(conn.execute("SELECT name, id FROM food_ids"))
+            added = assign_ids(id_map, names)
+            if not added:
+                return
+            conn.executemany(
+                "INSERT INTO food_ids (name, id) VALUES (?, ?)",
+                [(name, id_map[name]) for name in added],
+            )
+            conn.execute(
+                "UPDATE meta SET value = value + 1 WHERE key = 'catalog_version'"
+            )
+
+    def import_food_ids(self, id_map):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM food_ids")
+            conn.executemany(
+                "INSERT INTO food_ids (name, id) VALUES (?, ?)", id_map.items()
+            )
+            conn.execute(
+                "UPDATE meta SET value = value + 1 WHERE key = 'catalog_version'"
+            )
+        self._rebuild_catalog()
+
+    def rename_food(self, old, new):
+        self._assign_ids([old])
+
+        with self.transaction() as conn:
+            exists = conn.execute(
+                "SELECT 1 FROM foods WHERE name = ?", (old,)
+            ).fetchone()
+            taken = conn.execute(
+                "SELECT 1 FROM foods WHERE name = ? UNION SELECT 1 FROM food_ids WHERE name = ?",
+                (new, new),
+            ).fetchone()
+            if not exists or taken:
+                return False
+
+            conn.execute("UPDATE foods SET name = ? WHERE name = ?", (new, old))
+            conn.execute("UPDATE food_ids SET name = ? WHERE name = ?", (new, old))
+            conn.execute(
+                "UPDATE meta SET value = value + 1 WHERE key = 'catalog_version'"
+            )
+        self._rebuild_catalog()
+        return True
+
+    def catalog_version(self):
+        mapped = self.catalog_bin.get()
+        if mapped is not None:
+            return ("bin",) + mapped.key
+        return self._catalogs()[0]
+
+    def catalog_stats(self):
+        mapped = self.catalog_bin.get()
+        if mapped is not None:
+            return {"binary": self.catalog_bin.path, "size": mapped.key[2], "foods": len(mapped)}
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "version": self._catalog[0],
+        }
+
+    def reload_catalogs(self):
+        with self.transaction() as conn:
+            conn.execute(
+                "UPDATE meta SET value = value + 1 WHERE key = 'catalog_version'"
+            )
+        self._rebuild_catalog()
+
+    def import_catalogs(self, foods, customs):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM foods")
+            conn.executemany(
+                "INSERT INTO foods (name, kcal, protein, carbs, fat) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (name, n["kcal"], n["protein"], n["carbs"], n["fat"])
+                    for name, n in foods.items()
+                ],
+            )
+
+            conn.execute("DELETE FROM custom_meals")
+            conn.executemany(
+                "INSERT INTO custom_meals (brand, meal, kcal, protein, carbs, fat) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (brand, meal, n["kcal"], n["protein"], n["carbs"], n["fat"])
+                    for brand, meals in customs.items()
+                    for meal, n in meals.items()
+                ],
+            )
+
+            conn.execute(
+                "UPDATE meta SET value = value + 1 WHERE key = 'catalog_version'"
+            )
+        self._rebuild_catalog()
+
+    # ---------- 紀錄 ----------
+
+    def load(self, user):
+        with self.connect() as conn:
+            return self._load(conn, user)
+
+    def _load(self, conn, user):
+        logs = {}
+        for day, entry in conn.execute(
+            "SELECT date, entry FROM logs WHERE user = ? ORDER BY date, id",
+            (user,),
+        ):
+            logs.setdefault(day, []).append(json.loads(entry))
+        return logs
+
+    def get_day(self, user, day):
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT entry FROM logs WHERE user = ? AND date = ? ORDER BY id",
+                (user, day),
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def get_days(self, user, days):
+        days = list(days)
+        out = {day: [] for day in days}
+        with self.connect() as conn:
+            for day, entry in conn.execute(
+                "SELECT date, entry FROM logs WHERE user = ? AND date IN "
+                f"({','.join('?' * len(days))}) ORDER BY id",
+                (user, *days),
+            ):
+                out[day].append(json.loads(entry))
+        return out
+
+    def version(self, user):
+        with self.connect() as conn:
+            return self._version(conn, user)
+
+    def _version(self, conn, user):
+        row = conn.execute(
+            "SELECT version FROM log_versions WHERE user = ?", (user,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _bump(self, conn, user):
+        prev = self._version(conn, user)
+        conn.execute(
+            "INSERT INTO log_versions (user, version) VALUES (?, 1) "
+            "ON CONFLICT (user) DO UPDATE SET version = version + 1",
+            (user,),
+        )
+        return prev, prev + 1
+
+    def create(self, user):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM logs WHERE user = ?", (user,))
+            self._reset_changes(conn, user)
+            self._bump(conn, user)
+
+    def add(self, user, day, entry):
+        return self.add_many(user, [(day, entry)])
+
+    def add_many(self, user, items):
+        with self.transaction() as conn:
+            rows = self._insert(conn, user, items)
+            self._record(conn, user, [("put", eid, day, entry) for day, eid, entry in rows])
+            return self._bump(conn, user)
+
+    def _insert(self, conn, user, items):
+        rows = []
+        for day, entry in items:
+            entry = ensure_id(day, entry)
+            rows.append((day, entry["id"], entry))
+        conn.executemany(
+            "INSERT INTO logs (user, date, eid, entry) VALUES (?, ?, ?, ?)",
+            [(user, day, eid, _dumps(entry)) for day, eid, entry in rows],
+        )
+        return rows
+
+    def import_logs(self, user, logs):
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM logs WHERE user = ?", (user,))
+            self._insert(conn, user, [
+                (day, entry) for day, entries in logs.items() for entry in entries
+            ])
+            self._reset_changes(conn, user)
+            self._bump(conn, user)
+
+    def delete(self, user, day, index):
+        with self.transaction() as conn:
+            row = conn.execute(
+                "SELECT id, eid FROM logs WHERE user = ? AND date = ? "
+                "ORDER BY id LIMIT 1 OFFSET ?",
+                (user, day, index),
+            ).fetchone() if index >= 0 else None
+
+            if row is not None:
+                conn.execute("DELETE FROM logs WHERE id = ?", (row[0],))
+                self._record(conn, user, [("del", row[1], day, None)])
+            return self._bump(conn, user)
+
+    def delete_id(self, user, eid):
+        # 與 JsonStore 相同：只在 id 開頭的日期內尋找，格式不合的 id 視為不存在
+        day = entry_day(eid)
+        if day is None:
+            return None
+        with self.transaction() as conn:
+            cur = conn.execute(
+                "DELETE FROM logs WHERE user = ? AND eid = ? AND date = ?", (user, eid, day)
+            )
+            if cur.rowcount == 0:
+                return None
+            self._record(conn, user, [("del", eid, day, None)])
+            return self._bump(conn, user)
+
+    def edit(self, user, eid, entry):
+        entry = dict(entry, id=eid)
+        day = entry_day(eid)
+        if day is None:
+            return None
+        with self.transaction() as conn:
+            cur = conn.execute(
+                "UPDATE logs SET entry = ? WHERE user = ? AND eid = ? AND date = ?",
+                (_dumps(entry), user, eid, day),
+            )
+            if cur.rowcount == 0:
+                return None
+            self._record(conn, user, [("put", eid, day, entry)])
+            return self._bump(conn, user)
+
+    # ---------- 紀錄：變更（同步用） ----------
+
+    def changes(self, user, since, limit=CHANGES_LIMIT):
+        with self.connect() as conn:
+            # 同一個讀取交易內，seq 與內容一致
+            conn.execute("BEGIN")
+            try:
+                last, floor = self._seq(conn, user)
+                if not since or since < floor or since > last:
+                    return snapshot_changes(self._load(conn, user), last)
+                if since == last:
+                    return {"cursor": last, "reset": False, "more": False, "changes": []}
+
+                rows = conn.execute(
+                    "SELECT seq, op, eid, date, entry FROM changes "
+                    "WHERE user = ? AND seq > ? ORDER BY seq LIMIT ?",
+                    (user, since, limit + 1),
+                ).fetchall()
+            finally:
+                conn.execute("COMMIT")
+
+        page = [
+            change_record(seq, op, eid, day, json.loads(entry) if entry else None)
+            for seq, op, eid, day, entry in rows[:limit]
+        ]
+        return {
+            "cursor": page[-1]["seq"] if page else since,
+            "reset": False,
+            "more": len(rows) > limit,
+            "changes": page,
+        }
+
+    def change_seq(self, user):
+        with self.connect() as conn:
+            return self._seq(conn, user)[0]
+
+    def tombstones(self, user, ids):
+        ids = list(set(ids))
+        if not ids:
+            return set()
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT DISTINCT eid FROM changes WHERE user = ? AND op = 'del' AND eid IN "
+                f"({','.join('?' * len(ids))})",
+                (user, *ids),
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def _seq(self, conn, user):
+        row = conn.execute(
+            "SELECT seq, floor FROM change_seqs WHERE user = ?", (user,)
+        ).fetchone()
+        return row or (0, 0)
+
+    def _set_seq(self, conn, user, seq, floor):
+        conn.execute(
+            "INSERT INTO change_seqs (user, seq, floor) VALUES (?, ?, ?) "
+            "ON CONFLICT (user) DO UPDATE SET seq = excluded.seq, floor = excluded.floor",
+            (user, seq, floor),
+        )
+
+    def _record(self, conn, user, changes):
+        seq, floor = self._seq(conn, user)
+        rows = []
+        for op, eid, day, entry in changes:
+            seq += 1
+            rows.append((user, seq, eid, day, op, _dumps(entry) if entry is not None else None))
+        conn.executemany(
+            "INSERT INTO changes (user, seq, eid, date, op, entry) VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+
+        if seq - floor > 2 * CHANGES_KEEP:
+            # 只保留最近 CHANGES_KEEP 筆，更早的 cursor 改為 reset
+            floor = seq - CHANGES_KEEP
+            conn.execute("DELETE FROM changes WHERE user = ? AND seq <= ?", (user, floor))
+        self._set_seq(conn, user, seq, floor)
+
+    def _reset_changes(self, conn, user):
+        # 整份取代：之前的 cursor 全部作廢
+        seq = self._seq(conn, user)[0] + 1
+        conn.execute("DELETE FROM changes WHERE user = ?", (user,))
+        self._set_seq(conn, user, seq, seq)
@@ -1,22 +0,0 @@
-const CACHE_NAME = "fitness-v1";
-
-const urlsToCache = [
-  "/",
-  "/login",
-  "/register",
-  "/static/manifest.json"
-];
-
-self.addEventListener("install", e => {
-  e.waitUntil(
-    caches.open(CACHE_NAME).then(cache => {
-      return cache.addAll(urlsToCache);
-    })
-  );
-});
-
-self.addEventListener("fetch", e => {
-  e.respondWith(
-    fetch(e.request).catch(() => caches.match(e.request))
-  );
-});
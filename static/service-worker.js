@@ -0,0 +1,300 @@
+// =========================
+// Service worker
+// =========================
+//
+// 由 app.py 的 /service-worker.js 提供，VERSION 為本檔內容雜湊；
+// 快取名稱帶版本，新版 activate 時刪除其他 fitness-* 快取。
+//
+// - 頁面：network-first，離線時回傳快取
+// - /catalog/*：stale-while-revalidate，先回快取再背景更新
+// - /api/range：network-first，離線時仍可切換已看過的日期
+// - 新增 / 刪除：離線（或佇列尚未清空）時存入 IndexedDB 佇列，
+//   恢復連線後以一個 POST /api/batch 整批送出；新增帶用戶端產生的 id，重送不會重複
+
+const VERSION = "__SW_VERSION__";
+const PAGE_CACHE = `fitness-pages-${VERSION}`;
+const CATALOG_CACHE = `fitness-catalog-${VERSION}`;
+const DATA_CACHE = `fitness-data-${VERSION}`;
+const CACHES = [PAGE_CACHE, CATALOG_CACHE, DATA_CACHE];
+
+const SYNC_TAG = "fitness-sync";
+const BATCH_MAX = 1000;
+
+const urlsToCache = [
+  "/",
+  "/login",
+  "/register",
+  "/static/manifest.json"
+];
+
+self.addEventListener("install", e => {
+  e.waitUntil(
+    caches.open(PAGE_CACHE)
+      .then(cache => cache.addAll(urlsToCache))
+      .then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener("activate", e => {
+  e.waitUntil(
+    caches.keys()
+      .then(keys => Promise.all(
+        keys.filter(k => k.startsWith("fitness-") && !CACHES.includes(k))
+            .map(k => caches.delete(k))
+      ))
+      .then(() => self.clients.claim())
+  );
+});
+
+
+// =========================
+// 讀取
+// =========================
+
+self.addEventListener("fetch", e => {
+  const url = new URL(e.request.url);
+  if (url.origin !== location.origin) return;
+
+  if (e.request.method === "POST") {
+    const toOp = MUTATIONS[url.pathname];
+    if (toOp) e.respondWith(mutate(e.request, toOp));
+    return;
+  }
+  if (e.request.method !== "GET") return;
+
+  if (url.pathname.startsWith("/catalog/")) {
+    e.respondWith(staleWhileRevalidate(e, CATALOG_CACHE));
+  } else if (url.pathname === "/api/range") {
+    e.respondWith(networkFirst(e.request, DATA_CACHE));
+  } else if (!url.pathname.startsWith("/api/") && !url.pathname.startsWith("/admin/")) {
+    e.respondWith(networkFirst(e.request, PAGE_CACHE));
+  }
+});
+
+function staleWhileRevalidate(e, name) {
+  return caches.open(name).then(cache =>
+    cache.match(e.request).then(cached => {
+      const update = fetch(e.request).then(resp => {
+        if (resp.ok) cache.put(e.request, resp.clone());
+        return resp;
+      });
+      if (cached) {
+        e.waitUntil(update.catch(() => {}));
+        return cached;
+      }
+      return update;
+    })
+  );
+}
+
+function networkFirst(request, name) {
+  return fetch(request)
+    .then(resp => {
+      if (resp.ok && !resp.redirected) {
+        const copy = resp.clone();
+        caches.open(name).then(cache => cache.put(request, copy));
+      }
+      flush().catch(() => {});
+      return resp;
+    })
+    .catch(() =>
+      caches.match(request).then(cached =>
+        // 沒看過的日期至少回首頁
+        cached || caches.match(request, { ignoreSearch: true })
+      ).then(cached => cached || Response.error())
+    );
+}
+
+
+// =========================
+// IndexedDB 佇列
+// =========================
+
+function openDB() {
+  return new Promise((resolve, reject) => {
+    const req = indexedDB.open("fitness-queue", 1);
+    req.onupgradeneeded = () => req.result.createObjectStore("ops", { autoIncrement: true });
+    req.onsuccess = () => resolve(req.result);
+    req.onerror = () => reject(req.error);
+  });
+}
+
+function tx(mode, fn) {
+  return openDB().then(db => new Promise((resolve, reject) => {
+    const t = db.transaction("ops", mode);
+    const result = fn(t.objectStore("ops"));
+    t.oncomplete = () => resolve(result && "result" in result ? result.result : result);
+    t.onerror = () => reject(t.error);
+  }));
+}
+
+function allOps() {
+  return openDB().then(db => new Promise((resolve, reject) => {
+    const out = [];
+    const req = db.transaction("ops").objectStore("ops").openCursor();
+    req.onsuccess = () => {
+      const cursor = req.result;
+      if (!cursor) return resolve(out);
+      out.push({ key: cursor.key, op: cursor.value });
+      cursor.continue();
+    };
+    req.onerror = () => reject(req.error);
+  }));
+}
+
+function removeOps(keys) {
+  return tx("readwrite", store => keys.forEach(k => store.delete(k)));
+}
+
+function enqueue(op) {
+  return allOps().then(queued => {
+    // 刪除尚未送出的新增：兩筆一起從佇列移除即可
+    if (op.op === "delete") {
+      const added = queued.find(q => q.op.op !== "delete" && q.op.id === op.id);
+      if (added) return removeOps([added.key]);
+    }
+    return tx("readwrite", store => store.add(op));
+  }).then(() => {
+    notify();
+    if (self.registration.sync) self.registration.sync.register(SYNC_TAG).catch(() => {});
+  });
+}
+
+
+// =========================
+// 寫入：轉成佇列操作
+// =========================
+
+// 與 storage.new_entry_id 相同：日期 ordinal 的 36 進位（4 字元）+ 8 位 hex
+function newEntryId(day) {
+  const d = new Date(0);
+  d.setUTCFullYear(+day.slice(0, 4), +day.slice(5, 7) - 1, +day.slice(8, 10));
+  const ordinal = d.getTime() / 86400000 + 719163;
+  const rand = crypto.getRandomValues(new Uint8Array(4));
+  return ordinal.toString(36).padStart(4, "0") +
+    Array.from(rand, b => b.toString(16).padStart(2, "0")).join("");
+}
+
+function today() {
+  return new Date().toISOString().slice(0, 10);
+}
+
+const MUTATIONS = {
+  "/": req => req.formData().then(form => {
+    if (!form.has("food")) return null;
+    const day = form.get("date") || today();
+    // 與 app.index 相同：表單的克數不是整數時以 100 計
+    const grams = /^\d+$/.test(form.get("grams") || "") ? form.get("grams") : "100";
+    return {
+      op: { date: day, meal: form.get("meal") || "", food: form.get("food"),
+            grams, id: newEntryId(day) },
+      response: () => Response.redirect(`/?date=${day}`, 303)
+    };
+  }),
+  "/add_custom": req => req.json().then(data => ({
+    op: { date: data.date, meal: data.meal_type, brand: data.brand, food: data.meal,
+          ratio: data.ratio, id: newEntryId(data.date) },
+  })),
+  "/api/add_food": req => req.json().then(data => {
+    const day = data.date || today();
+    const item = data.item || {};
+    return {
+      op: { date: day, meal: item.meal || "", food: item.food, grams: item.grams,
+            id: newEntryId(day) },
+    };
+  }),
+  "/delete": deleteOp,
+  "/api/delete": deleteOp
+};
+
+function deleteOp(req) {
+  // 只有以 id 刪除能延後送出；舊的 index 刪除必須連線
+  return req.json().then(data => data.id ? { op: { op: "delete", id: data.id } } : null);
+}
+
+function queued(result) {
+  if (result.response) return result.response();
+  return new Response(JSON.stringify({ ok: true, queued: true, id: result.op.id }), {
+    status: 202, headers: { "Content-Type": "application/json" }
+  });
+}
+
+function mutate(request, toOp) {
+  const copy = request.clone();
+
+  return pendingCount().then(pending => {
+    // 佇列已有資料時新的寫入也排進去，保持先後順序，之後一起送出
+    if (pending) {
+      return toOp(copy).then(result => {
+        if (!result) return fetch(request);
+        return enqueue(result.op).then(() => flush().catch(() => {})).then(() => queued(result));
+      });
+    }
+
+    return fetch(request).catch(() =>
+      toOp(copy).then(result => {
+        if (!result) {
+          return new Response(JSON.stringify({ ok: false, error: "offline" }), {
+            status: 503, headers: { "Content-Type": "application/json" }
+          });
+        }
+        return enqueue(result.op).then(() => queued(result));
+      })
+    );
+  });
+}
+
+
+// =========================
+// 同步
+// =========================
+
+let flushing = null;
+
+function pendingCount() {
+  return tx("readonly", store => store.count());
+}
+
+function flush() {
+  // 同一時間只跑一次；每批最多 BATCH_MAX 筆，成功才從佇列移除
+  if (flushing) return flushing;
+
+  flushing = allOps().then(function send(ops) {
+    if (!ops.length) return;
+    const batch = ops.slice(0, BATCH_MAX);
+
+    return fetch("/api/batch", {
+      method: "POST",
+      credentials: "same-origin",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ entries: batch.map(o => o.op) })
+    }).then(resp => {
+      if (!resp.ok) throw new Error(`sync failed: ${resp.status}`);
+      return resp.json();
+    }).then(result => {
+      // 驗證錯誤的項目重送也不會成功，一併移除並通知頁面
+      return removeOps(batch.map(o => o.key)).then(() => {
+        notify({ synced: batch.length, errors: result.errors || [] });
+        return send(ops.slice(BATCH_MAX));
+      });
+    });
+  }).finally(() => { flushing = null; });
+
+  return flushing;
+}
+
+function notify(extra) {
+  return pendingCount().then(pending =>
+    self.clients.matchAll().then(clients =>
+      clients.forEach(c => c.postMessage(Object.assign({ type: "queue", pending }, extra)))
+    )
+  );
+}
+
+self.addEventListener("sync", e => {
+  if (e.tag === SYNC_TAG) e.waitUntil(flush());
+});
+
+self.addEventListener("message", e => {
+  if (e.data === "flush") e.waitUntil(flush().catch(() => {}).then(() => notify()));
+});
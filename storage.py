@@ -0,0 +1,940 @@
+import json, os, re, secrets, tempfile, threading, time
+from datetime import date
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows：只剩單一行程內的互斥
+    fcntl = None
+
+from catalog import FoodTable, assign_ids, catalogs
+from catalog_bin import BinaryCatalog, write_catalog
+
+
+# =========================
+# 儲存後端
+# =========================
+#
+# app.py 只透過下列介面存取資料，後端可替換：
+#
+#   get_user(name) / add_user(name, password) / users()
+#   foods() / customs() / catalog_stats() / reload_catalogs()
+#   custom_meal(brand, meal) / build_catalog()
+#   food_table() / assign_food_ids(names) / rename_food(old, new)
+#   load(user) / get_day(user, day) / get_days(user, days) / create(user)
+#   add(user, day, entry) / add_many(user, [(day, entry), ...])
+#   delete(user, day, index) / delete_id(user, eid) / edit(user, eid, entry)
+#   import_logs(user, logs)
+#   version(user) / catalog_version()
+#   changes(user, since, limit) / change_seq(user) / tombstones(user, ids)
+#
+# version(user) 是便宜的版本標記，該使用者的紀錄任何變動都會改變它。
+# add / add_many / delete 回傳 (寫入前版本, 寫入後版本)，供快取做增量更新；
+# 若同一次寫入還夾帶其他人的變動，寫入前版本為 None。
+# add / add_many 會替沒有 id 的紀錄就地補上 id（見 new_entry_id）。
+# delete_id / edit 找不到該 id 時不寫入並回傳 None，重送也安全。
+# 每次紀錄變動另記一筆帶 seq 的變更，供多裝置同步（見「變更紀錄」）。
+#
+# 預設為 JsonStore（data/ 目錄下的 JSON 檔）；
+# 設定 STORAGE=sqlite 或 STORAGE=sqlite:///path/to/db 改用 SqliteStore。
+# JsonStore 可用 GROUP_COMMIT=1 開啟批次寫入。
+
+COMPACT_BYTES = 256 * 1024
+VERSION_RESET_BYTES = 4096
+LOG_FORMAT = 3
+DAY_RE = re.compile(r"\d{4}-\d{2}-\d{2}")
+GROUP_COMMIT_DELAY = 0.002
+
+
+def open_store(spec, data_dir, group_commit=False):
+    spec = spec or "json"
+
+    if spec == "json":
+        return JsonStore(data_dir, group_commit=group_commit)
+
+    if spec.startswith("sqlite"):
+        from sqlite_store import SqliteStore
+
+        path = spec[len("sqlite:///"):] if spec.startswith("sqlite:///") else ""
+        return SqliteStore(path or os.path.join(data_dir, "fitness.db"))
+
+    raise ValueError(f"unknown storage backend: {spec}")
+
+
+# =========================
+# 工具
+# =========================
+
+def load_json(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def atomic_write_json(path, data):
+    # 寫入暫存檔 → fsync → os.replace，中途當機也不會留下半個 JSON
+    dirname = os.path.dirname(path)
+    os.makedirs(dirname, exist_ok=True)
+
+    fd, tmp = tempfile.mkstemp(dir=dirname, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+    _fsync_dir(dirname)
+
+
+def _fsync_dir(dirname):
+    if fcntl is None:
+        return
+    fd = os.open(dirname, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    # 跨行程用 fcntl.flock；沒有 fcntl 時退回行程內的 threading.Lock
+    if fcntl is None:
+        with _thread_locks_guard:
+            lock = _thread_locks.setdefault(path, threading.RLock())
+        with lock:
+            yield
+        return
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _read_events(path):
+    if not os.path.exists(path):
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                # 寫入中斷留下的半行，忽略
+                break
+            yield json.loads(line)
+
+
+def append_lines(path, text):
+    # 呼叫端需持有該使用者的鎖。先截掉寫入中斷留下的半行：否則新內容會接在半行後面，
+    # 合成一行無法解析的資料，之後每次讀取都會失敗。回傳寫入後的檔案大小
+    with open(path, "a+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        end = _after_last_newline(f, size)
+        if end != size:
+            f.truncate(end)
+        f.write(text.encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+def _after_last_newline(f, size):
+    # 最後一個換行之後的位置；沒有換行時為 0
+    pos = size
+    while pos > 0:
+        start = max(0, pos - 4096)
+        f.seek(start)
+        i = f.read(pos - start).rfind(b"\n")
+        if i >= 0:
+            return start + i + 1
+        pos = start
+    return 0
+
+
+def partition_of(day):
+    # 紀錄所屬的月份分割；日期格式不正確時一律放進 other，也避免路徑跳脫
+    if isinstance(day, str) and DAY_RE.fullmatch(day):
+        return day[:7]
+    return "other"
+
+
+def _dump_line(event):
+    return json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n"
+
+
+def _find_id(entries, eid):
+    for i, e in enumerate(entries):
+        if e.get("id") == eid:
+            return i
+    return None
+
+
+def apply_event(logs, event):
+    # 可重複套用：合併寫入快照後、清空日誌前當機，重播時已在快照中的新增會略過
+    day = event["date"]
+
+    if event["op"] == "add":
+        entries = logs.setdefault(day, [])
+        eid = event["entry"].get("id")
+        if eid is None or _find_id(entries, eid) is None:
+            entries.append(event["entry"])
+
+    elif event["op"] == "del":
+        entries = logs.get(day, [])
+        if "id" in event:
+            i = _find_id(entries, event["id"])
+            if i is not None:
+                entries.pop(i)
+        elif 0 <= event["index"] < len(entries):
+            entries.pop(event["index"])
+
+    elif event["op"] == "edit":
+        entries = logs.get(day, [])
+        i = _find_id(entries, event["id"])
+        if i is not None:
+            entries[i] = event["entry"]
+
+
+# =========================
+# 紀錄 id
+# =========================
+#
+# 每筆紀錄有一個 12 字元的 id：日期 ordinal 的 36 進位（4 字元）+ 8 位隨機 hex。
+# id 本身就帶有位置（日期 → 月份分割），刪除 / 修改不必先查索引或讀整份歷史；
+# 日期格式不正確的紀錄沒有可解析的位置，id 以 "xxxx" 開頭。
+# 修改紀錄不能換日期（換日期 = 刪除 + 新增）。
+
+_B36 = "0123456789abcdefghijklmnopqrstuvwxyz"
+ENTRY_ID_RE = re.compile(r"[0-9a-z]{4}[0-9a-f]{8}")
+
+
+def new_entry_id(day):
+    try:
+        n = date.fromisoformat(day).toordinal()
+    except (TypeError, ValueError):
+        return "xxxx" + secrets.token_hex(4)
+
+    prefix = ""
+    for _ in range(4):
+        n, r = divmod(n, 36)
+        prefix = _B36[r] + prefix
+    return prefix + secrets.token_hex(4)
+
+
+def entry_day(eid):
+    # id -> 日期；格式不符（含用戶端送來的任意字串）或無法解析時回傳 None
+    if not isinstance(eid, str) or not ENTRY_ID_RE.fullmatch(eid) or eid.startswith("xxxx"):
+        return None
+    try:
+        return date.fromordinal(int(eid[:4], 36)).isoformat()
+    except ValueError:
+        return None
+
+
+def ensure_id(day, entry):
+    # 沒有 id 的紀錄就地補上，回傳同一個 dict
+    if "id" not in entry:
+        entry["id"] = new_entry_id(day)
+    return entry
+
+
+# =========================
+# 變更紀錄（同步用）
+# =========================
+#
+# 每位使用者的紀錄變動依序編號（seq，只增不減），與寫入在同一個鎖 / 交易內記下：
+#   {"seq": 12, "op": "put", "id", "date", "entry"}   新增或修改
+#   {"seq": 13, "op": "del", "id", "date"}            刪除
+# change_seq(user) 為目前最新的 seq（便宜，live.py 輪詢用）。
+# changes(user, since, limit) 回傳 {"cursor", "reset", "more", "changes"}：
+# - since 之後的變更依 seq 排列，最多 limit 筆；more 表示還有下一頁，cursor 為已讀到的 seq
+# - 只保留最近約 CHANGES_KEEP 筆；since 為 0、早於保留範圍或來自別的資料，
+#   改回傳整份紀錄（reset: true，全部以 put 表示）
+# - import_logs / create 整份取代紀錄，之後的舊 cursor 一律 reset
+#
+# 衝突依伺服器的 seq 順序決定，所有裝置依序套用後結果相同：
+# 同一筆的修改以較晚的為準；刪除是最終狀態，已刪除的 id 不能再修改，
+# 也不會被重送的新增復活（tombstones(user, ids) 回傳其中已刪除的 id）。
+
+CHANGES_KEEP = 5000
+CHANGES_BYTES = 2 * 1024 * 1024
+CHANGES_LIMIT = 1000
+
+
+def change_record(seq, op, eid, day, entry=None):
+    record = {"seq": seq, "op": op, "id": eid, "date": day}
+    if entry is not None:
+        record["entry"] = entry
+    return record
+
+
+def resolve_index_deletes(events, load_month):
+    # 依 index 的刪除在寫入前改成依 id（日誌重播時 index 可能已經不同）；
+    # 超出範圍的刪除直接略過。只有這種事件時才需要讀出該月目前內容
+    if not any(e["op"] == "del" and "id" not in e for e in events):
+        return events
+
+    states = {}
+    out = []
+    for e in events:
+        day = e["date"]
+        month = partition_of(day)
+        if month not in states:
+            states[month] = load_month(month)
+
+        if e["op"] == "del" and "id" not in e:
+            entries = states[month].get(day, [])
+            if not 0 <= e["index"] < len(entries):
+                continue
+            eid = entries[e["index"]].get("id")
+            if eid is not None:
+                e = {"op": "del", "date": day, "id": eid}
+
+        apply_event(states[month], e)
+        out.append(e)
+    return out
+
+
+def event_changes(events):
+    # 事件（已經過 resolve_index_deletes）-> [(op, id, date, entry)]
+    out = []
+    for e in events:
+        if e["op"] in ("add", "edit"):
+            out.append(("put", e["entry"]["id"], e["date"], e["entry"]))
+        elif "id" in e:
+            out.append(("del", e["id"], e["date"], None))
+    return out
+
+
+def snapshot_changes(logs, cursor):
+    return {
+        "cursor": cursor,
+        "reset": True,
+        "more": False,
+        "changes": [
+            change_record(cursor, "put", e.get("id"), day, e)
+            for day in sorted(logs)
+            for e in logs[day]
+        ],
+    }
+
+
+# =========================
+# 批次寫入（group commit）
+# =========================
+#
+# 同一行程內多個執行緒對同一使用者的寫入會先排隊，
+# 由背景執行緒稍等 GROUP_COMMIT_DELAY 後合併成一次加鎖、一次 write、一次 fsync。
+# submit() 會等到該批寫入落盤才返回。
+
+class _Batch:
+
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.error = None
+        self.result = None
+
+
+class GroupCommit:
+
+    def __init__(self, flush, delay=GROUP_COMMIT_DELAY):
+        self._flush = flush
+        self._delay = delay
+        self._cond = threading.Condition()
+        self._pending = {}
+        self._pid = None
+
+    def submit(self, key, event):
+        with self._cond:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._pending = {}
+                threading.Thread(target=self._run, daemon=True).start()
+
+            batch = self._pending.get(key)
+            if batch is None:
+                batch = self._pending[key] = _Batch()
+            batch.events.append(event)
+            self._cond.notify_all()
+
+            while not batch.done:
+                self._cond.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.result
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+
+            time.sleep(self._delay)
+
+            with self._cond:
+                work, self._pending = self._pending, {}
+
+            for key, batch in work.items():
+                try:
+                    batch.result = self._flush(key, batch.events)
+                except Exception as e:
+                    batch.error = e
+
+            with self._cond:
+                for batch in work.values():
+                    batch.done = True
+                self._cond.notify_all()
+
+
+# =========================
+# JSON 後端
+# =========================
+#
+# 飲食紀錄依月份分割，每位使用者一個目錄：
+#   logs/<user>/manifest.json    {"format": 3, "months": ["2026-01", ...]}
+#   logs/<user>/<YYYY-MM>.json   該月快照 {date: [entries]}
+#   logs/<user>/<YYYY-MM>.jsonl  該月事件日誌，每行一筆 add / del（append-only）
+#   logs/<user>/version          版本標記，每次寫入都會改變
+#   logs/<user>/changes.jsonl    變更紀錄（同步用），第一行可為 {"floor": seq}
+#
+# 讀取一天或幾天只開相關月份；寫入只在該月 .jsonl 尾端追加一行，
+# 該月日誌超過 COMPACT_BYTES 後才合併回該月快照。
+# 舊格式 logs/<user>.json（+ .jsonl）在第一次存取時自動轉換，原檔改名為 *.v1 保留；
+# format 2（沒有紀錄 id）的目錄同樣在第一次存取時補上 id。
+#
+# 同一使用者的讀寫都以 logs/<user>.lock 加鎖（讀取為共享鎖），
+# 追加與合併互斥，多個 gunicorn worker 同時寫入也不會遺失。
+
+class JsonStore:
+
+    def __init__(self, data_dir, compact_bytes=COMPACT_BYTES, group_commit=False):
+        self.data_dir = data_dir
+        self.log_dir = os.path.join(data_dir, "logs")
+        self.user_file = os.path.join(data_dir, "users.json")
+        self.food_file = os.path.join(data_dir, "foods.json")
+        self.custom_file = os.path.join(data_dir, "custom_meals.json")
+        self.food_id_file = os.path.join(data_dir, "food_ids.json")
+        self.catalog_bin = BinaryCatalog(os.path.join(data_dir, "catalog.bin"))
+        self.compact_bytes = compact_bytes
+        self._group = GroupCommit(self._flush_group) if group_commit else None
+        self._table = (None, None)
+        self._partitioned = set()
+
+    # ---------- 帳號 ----------
+
+    def get_user(self, name):
+        return load_json(self.user_file).get(name)
+
+    def add_user(self, name, password):
+        with file_lock(self.user_file + ".lock"):
+            users = load_json(self.user_file)
+            if name in users:
+                return False
+
+            users[name] = {"password": password}
+            atomic_write_json(self.user_file, users)
+        return True
+
+    def users(self):
+        # 帳號與有紀錄的使用者（維護工具使用），包含尚未轉換的舊格式
+        names = set(load_json(self.user_file))
+        if os.path.isdir(self.log_dir):
+            for f in os.listdir(self.log_dir):
+                if f.endswith(".json"):
+                    names.add(f[:-len(".json")])
+                elif os.path.exists(os.path.join(self.log_dir, f, "manifest.json")):
+                    names.add(f)
+        return sorted(names)
+
+    # ---------- 目錄 ----------
+    #
+    # data/catalog.bin 存在時以它為準（mmap，見 catalog_bin.py），
+    # 否則直接讀 JSON。改 JSON 後要重新 build（tools/build_catalog.py
+    # 或 POST /admin/catalogs/reload）才會生效。
+
+    def foods(self):
+        mapped = self.catalog_bin.get()
+        if mapped is not None:
+            return mapped.foods()
+        return catalogs.get(self.food_file)
+
+    def customs(self):
+        mapped = self.catalog_bin.get()
+        if mapped is not None:
+            return mapped.customs()
+        return catalogs.get(self.custom_file)
+
+    def custom_meal(self, brand, meal):
+        mapped = self.catalog_bin.get()
+        if mapped is not None:
+            return mapped.custom(brand, meal)
+        return catalogs.get(self.custom_file).get(brand, {}).get(meal)
+
+    def catalog_stats(self):
+        mapped = self.catalog_bin.get()
+        if mapped is not None:
+            return {"binary": self.catalog_bin.path, "size": mapped.key[2], "foods": len(mapped)}
+        return catalogs.stats()
+
+    def catalog_version(self):
+        mapped = self.catalog_bin.get()
+        if mapped is not None:
+            return ("bin",) + mapped.key
+
+        # 順便讓快取重新驗證，版本才會反映檔案目前的內容
+        catalogs.get(self.food_file)
+        catalogs.get(self.custom_file)
+        return (
+            catalogs.version(self.food_file),
+            catalogs.version(self.custom_file),
+            _stat_key(self.food_id_file),
+        )
+
+    def reload_catalogs(self):
+        catalogs.reload(self.food_file, self.custom_file)
+        if self.catalog_bin.exists():
+            self.build_catalog()
+
+    def build_catalog(self):
+        foods = catalogs.get(self.food_file)
+        customs = catalogs.get(self.custom_file)
+
+        with file_lock(self.food_id_file + ".lock"):
+            id_map = load_json(self.food_id_file)
+            if assign_ids(id_map, foods):
+                atomic_write_json(self.food_id_file, id_map)
+            write_catalog(self.catalog_bin.path, foods, customs, id_map)
+
+        return self.catalog_bin.get()
+
+    def food_table(self):
+        mapped = self.catalog_bin.get()
+        if mapped is not None:
+            return mapped
+
+        foods = catalogs.get(self.food_file)
+        key = (catalogs.version(self.food_file), _stat_key(self.food_id_file))
+
+        cached = self._table
+        if cached[0] == key:
+            return cached[1]
+
+        id_map = load_json(self.food_id_file)
+        if any(name not in id_map for name in foods):
+            return self.assign_food_ids(foods)
+
+        table = FoodTable(foods, id_map)
+        self._table = (key, table)
+        return table
+
+    def assign_food_ids(self, names):
+        foods = catalogs.get(self.food_file)
+
+        with file_lock(self.food_id_file + ".lock"):
+            id_map = load_json(self.food_id_file)
+            if assign_ids(id_map, names):
+                atomic_write_json(self.food_id_file, id_map)
+
+        if self.catalog_bin.exists():
+            # 新 id 也要寫進二進位檔
+            return self.build_catalog()
+
+        table = FoodTable(foods, id_map)
+        self._table = ((catalogs.version(self.food_file), _stat_key(self.food_id_file)), table)
+        return table
+
+    def rename_food(self, old, new):
+        with file_lock(self.food_file + ".lock"), file_lock(self.food_id_file + ".lock"):
+            foods = load_json(self.food_file)
+            id_map = load_json(self.food_id_file)
+            if old not in foods or new in foods or new in id_map:
+                return False
+
+            # 保留原本的排列順序
+            foods = {new if k == old else k: v for k, v in foods.items()}
+            assign_ids(id_map, [old])
+            id_map[new] = id_map.pop(old)
+
+            atomic_write_json(self.food_file, foods)
+            atomic_write_json(self.food_id_file, id_map)
+
+        if self.catalog_bin.exists():
+            self.build_catalog()
+        return True
+
+    # ---------- 紀錄：路徑 ----------
+
+    def user_dir(self, user):
+        return os.path.join(self.log_dir, user)
+
+    def manifest_path(self, user):
+        return os.path.join(self.user_dir(user), "manifest.json")
+
+    def snapshot_path(self, user, month):
+        return os.path.join(self.user_dir(user), f"{month}.json")
+
+    def journal_path(self, user, month):
+        return os.path.join(self.user_dir(user), f"{month}.jsonl")
+
+    def version_path(self, user):
+        return os.path.join(self.user_dir(user), "version")
+
+    def changes_path(self, user):
+        return os.path.join(self.user_dir(user), "changes.jsonl")
+
+    def legacy_path(self, user):
+        return os.path.join(self.log_dir, f"{user}.json")
+
+    def lock_path(self, user):
+        return os.path.join(self.log_dir, f"{user}.lock")
+
+    # ---------- 紀錄：舊格式轉換 ----------
+
+    def _ensure_partitioned(self, user):
+        if user in self._partitioned:
+            return
+        if self._format(user) < LOG_FORMAT:
+            with file_lock(self.lock_path(user)):
+                if self._format(user) < LOG_FORMAT:
+                    self._migrate(user)
+        elif not os.path.exists(self.changes_path(user)):
+            # 變更紀錄出現之前的資料：從 seq 1 起算，since=0 時回傳整份紀錄
+            with file_lock(self.lock_path(user)):
+                if not os.path.exists(self.changes_path(user)):
+                    self._write_changes(user, 1, [])
+        self._partitioned.add(user)
+
+    def _format(self, user):
+        return load_json(self.manifest_path(user)).get("format", 0)
+
+    def _migrate(self, user):
+        if os.path.exists(self.manifest_path(user)):
+            # format 2：已分割，只缺紀錄 id
+            logs = {}
+            for month in self._months(user):
+                logs.update(self._load_month(user, month))
+            self._write_partitions(user, logs)
+            return
+
+        legacy = self.legacy_path(user)
+        legacy_journal = legacy + "l"
+
+        logs = load_json(legacy)
+        for event in _read_events(legacy_journal):
+            apply_event(logs, event)
+
+        # manifest 寫入後才算轉換完成；中途當機下次會重做
+        self._write_partitions(user, logs)
+
+        for path in (legacy, legacy_journal):
+            if os.path.exists(path):
+                os.replace(path, path + ".v1")
+
+    def _write_partitions(self, user, logs):
+        months = {}
+        for day, entries in logs.items():
+            months.setdefault(partition_of(day), {})[day] = [ensure_id(day, e) for e in entries]
+
+        os.makedirs(self.user_dir(user), exist_ok=True)
+        for month in self._months(user):
+            if month not in months:
+                _remove(self.snapshot_path(user, month))
+            _remove(self.journal_path(user, month))
+
+        for month, part in months.items():
+            atomic_write_json(self.snapshot_path(user, month), part)
+        atomic_write_json(self.manifest_path(user), {"format": LOG_FORMAT, "months": sorted(months)})
+
+        # 整份取代：之前的 cursor 全部作廢
+        self._write_changes(user, self._last_seq(user) + 1, [])
+        self._touch(user)
+
+    # ---------- 紀錄：讀取 ----------
+
+    def _months(self, user):
+        return load_json(self.manifest_path(user)).get("months", [])
+
+    def load(self, user):
+        self._ensure_partitioned(user)
+        with file_lock(self.lock_path(user), shared=True):
+            logs = {}
+            for month in self._months(user):
+                logs.update(self._load_month(user, month))
+            return logs
+
+    def get_day(self, user, day):
+        return self.get_days(user, [day])[day]
+
+    def get_days(self, user, days):
+        # 只開這幾天所在的月份
+        self._ensure_partitioned(user)
+        with file_lock(self.lock_path(user), shared=True):
+            parts = {}
+            for day in days:
+                month = partition_of(day)
+                if month not in parts:
+                    parts[month] = self._load_month(user, month)
+            return {day: parts[partition_of(day)].get(day, []) for day in days}
+
+    def _load_month(self, user, month):
+        logs = load_json(self.snapshot_path(user, month))
+        for event in _read_events(self.journal_path(user, month)):
+            apply_event(logs, event)
+        return logs
+
+    def version(self, user):
+        self._ensure_partitioned(user)
+        return _stat_key(self.version_path(user))
+
+    def _touch(self, user):
+        # 版本標記：每次寫入追加 1 byte，(inode, mtime, size) 隨之改變；
+        # 變大後換成新的空檔（新 inode），版本同樣會改變
+        path = self.version_path(user)
+        with open(path, "ab") as f:
+            f.write(b".")
+            size = f.tell()
+
+        if size >= VERSION_RESET_BYTES:
+            fd, tmp = tempfile.mkstemp(dir=self.user_dir(user), prefix=".tmp-")
+            os.close(fd)
+            os.replace(tmp, path)
+
+    # ---------- 紀錄：寫入 ----------
+
+    def create(self, user):
+        with file_lock(self.lock_path(user)):
+            self._write_partitions(user, {})
+            for path in (self.legacy_path(user), self.legacy_path(user) + "l"):
+                _remove(path)
+        self._partitioned.add(user)
+
+    def add(self, user, day, entry):
+        return self._append(user, {"op": "add", "date": day, "entry": ensure_id(day, entry)})
+
+    def import_logs(self, user, logs):
+        # 整份取代（遷移工具使用）
+        self._ensure_partitioned(user)
+        with file_lock(self.lock_path(user)):
+            self._write_partitions(user, logs)
+
+    def add_many(self, user, items):
+        # 整批一次加鎖、一次 fsync；不經過 group commit
+        events = [
+            {"op": "add", "date": day, "entry": ensure_id(day, entry)} for day, entry in items
+        ]
+        return self._write_events(user, events)
+
+    def delete(self, user, day, index):
+        return self._append(user, {"op": "del", "date": day, "index": index})
+
+    def delete_id(self, user, eid):
+        return self._write_by_id(user, eid, {"op": "del"})
+
+    def edit(self, user, eid, entry):
+        entry = dict(entry, id=eid)
+        return self._write_by_id(user, eid, {"op": "edit", "entry": entry})
+
+    def _write_by_id(self, user, eid, event):
+        # 只讀該日所在的月份確認 id 存在，再追加一行事件；不經過 group commit
+        day = entry_day(eid)
+        if day is None:
+            return None
+
+        def exists():
+            entries = self._load_month(user, partition_of(day)).get(day, [])
+            return _find_id(entries, eid) is not None
+
+        return self._write_events(user, [dict(event, date=day, id=eid)], check=exists)
+
+    def _append(self, user, event):
+        if self._group is not None:
+            return self._group.submit(user, event)
+        return self._write_events(user, [event])
+
+    def _flush_group(self, user, events):
+        # 合併了多筆寫入時，單筆呼叫端無法得知寫入前版本
+        return self._write_events(user, events, exclusive=len(events) == 1)
+
+    def _write_events(self, user, events, exclusive=True, check=None):
+        self._ensure_partitioned(user)
+
+        with file_lock(self.lock_path(user)):
+            if check is not None and not check():
+                return None
+
+            prev = self.version(user) if exclusive else None
+            events = resolve_index_deletes(events, lambda month: self._load_month(user, month))
+            changes = event_changes(events)
+
+            by_month = {}
+            for e in events:
+                by_month.setdefault(partition_of(e["date"]), []).append(e)
+
+            # 新月份先登記到 manifest 再寫日誌：當機時最多多一個空月份
+            months = self._months(user)
+            if not set(by_month) <= set(months):
+                atomic_write_json(self.manifest_path(user), {
+                    "format": LOG_FORMAT, "months": sorted(set(months) | set(by_month)),
+                })
+
+            for month, month_events in by_month.items():
+                size = append_lines(
+                    self.journal_path(user, month), "".join(_dump_line(e) for e in month_events)
+                )
+
+                if size >= self.compact_bytes:
+                    self._compact(user, month)
+
+            self._append_changes(user, changes)
+            self._touch(user)
+            return prev, self.version(user)
+
+    # ---------- 紀錄：變更（同步用） ----------
+
+    def changes(self, user, since, limit=CHANGES_LIMIT):
+        self._ensure_partitioned(user)
+        with file_lock(self.lock_path(user), shared=True):
+            last = self._last_seq(user)
+            if since and since == last:
+                # 沒有新變更：只讀檔尾
+                return {"cursor": last, "reset": False, "more": False, "changes": []}
+
+            floor, records = self._read_changes(user)
+            if not since or since < floor or since > last:
+                logs = {}
+                for month in self._months(user):
+                    logs.update(self._load_month(user, month))
+                return snapshot_changes(logs, last)
+
+        records = [r for r in records if r["seq"] > since]
+        page = records[:limit]
+        return {
+            "cursor": page[-1]["seq"] if page else since,
+            "reset": False,
+            "more": len(records) > limit,
+            "changes": page,
+        }
+
+    def change_seq(self, user):
+        self._ensure_partitioned(user)
+        with file_lock(self.lock_path(user), shared=True):
+            return self._last_seq(user)
+
+    def tombstones(self, user, ids):
+        ids = set(ids)
+        if not ids:
+            return set()
+        self._ensure_partitioned(user)
+        with file_lock(self.lock_path(user), shared=True):
+            _, records = self._read_changes(user)
+        return {r["id"] for r in records if r["op"] == "del" and r["id"] in ids}
+
+    def _read_changes(self, user):
+        floor, records = 0, []
+        for r in _read_events(self.changes_path(user)):
+            if "floor" in r:
+                floor = r["floor"]
+            else:
+                records.append(r)
+        return floor, records
+
+    def _last_seq(self, user):
+        # 只讀檔尾：往前讀到至少有一行完整的紀錄為止
+        try:
+            f = open(self.changes_path(user), "rb")
+        except FileNotFoundError:
+            return 0
+
+        with f:
+            size = f.seek(0, os.SEEK_END)
+            chunk = 4096
+            while True:
+                start = max(0, size - chunk)
+                f.seek(start)
+                lines = f.read().split(b"\n")
+                # 最後一段是換行之後（或寫入中斷的半行）；不是從頭讀時第一段可能不完整
+                complete = lines[1:-1] if start else lines[:-1]
+                if complete or not start:
+                    break
+                chunk *= 2
+
+        for line in reversed(complete):
+            if line.strip():
+                r = json.loads(line)
+                return r.get("seq", r.get("floor", 0))
+        return 0
+
+    def _append_changes(self, user, changes):
+        if not changes:
+            return
+
+        seq = self._last_seq(user)
+        lines = []
+        for op, eid, day, entry in changes:
+            seq += 1
+            lines.append(_dump_line(change_record(seq, op, eid, day, entry)))
+
+        size = append_lines(self.changes_path(user), "".join(lines))
+
+        if size >= CHANGES_BYTES:
+            # 只保留最近 CHANGES_KEEP 筆，更早的 cursor 改為 reset
+            _, records = self._read_changes(user)
+            keep = records[-CHANGES_KEEP:]
+            self._write_changes(user, keep[0]["seq"] - 1, keep)
+
+    def _write_changes(self, user, floor, records):
+        path = self.changes_path(user)
+        fd, tmp = tempfile.mkstemp(dir=self.user_dir(user), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(_dump_line({"floor": floor}))
+                f.write("".join(_dump_line(r) for r in records))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException:
+            _remove(tmp)
+            raise
+
+    # ---------- 紀錄：合併 ----------
+
+    def compact(self, user):
+        self._ensure_partitioned(user)
+        with file_lock(self.lock_path(user)):
+            for month in self._months(user):
+                self._compact(user, month)
+            self._touch(user)
+
+    def _compact(self, user, month):
+        atomic_write_json(self.snapshot_path(user, month), self._load_month(user, month))
+        open(self.journal_path(user, month), "w").close()
@@ -0,0 +1,170 @@
+import math, os, shutil, sys, tempfile, unittest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from core import MAX_GRAMS, Nutrition, day_key
+from storage import JsonStore, entry_day, load_json
+from totals import DailyTotals
+
+
+# =========================
+# core.Nutrition
+# =========================
+#
+#   python -m pytest tests
+#   python -m unittest discover tests
+#
+# 使用 data/ 的目錄（不含任何人的紀錄），每個測試一份暫存資料夾。
+# 寫入後的每日總量快取要與重新計算的結果一致，JSON 與 SQLite 都要檢查。
+
+USER = "tester"
+DAY = "2026-03-01"
+FOOD = "雞胸肉（熟 100g）"
+BRAND, MEAL = "7-11", "增肌蛋白餐"
+CATALOG_FILES = ("foods.json", "custom_meals.json", "food_ids.json")
+
+
+def json_store(data_dir):
+    for name in CATALOG_FILES:
+        shutil.copy(os.path.join(BASE_DIR, "data", name), data_dir)
+    store = JsonStore(data_dir)
+    store.create(USER)
+    return store
+
+
+def sqlite_store(data_dir):
+    from sqlite_store import SqliteStore
+
+    src = json_store(data_dir)
+    store = SqliteStore(os.path.join(data_dir, "fitness.db"))
+    store.import_catalogs(load_json(src.food_file), load_json(src.custom_file))
+    src.food_table()
+    store.import_food_ids(load_json(src.food_id_file))
+    return store
+
+
+class NutritionTest(unittest.TestCase):
+
+    open_store = staticmethod(json_store)
+
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp(prefix="fitness-test-")
+        self.addCleanup(shutil.rmtree, self.data_dir, True)
+        self.store = self.open_store(self.data_dir)
+        self.core = Nutrition(self.store)
+
+    def assertTotalsConsistent(self, day=DAY):
+        # 快取的總量 == 以新的 DailyTotals 從 store 整天重算
+        cached = self.core.daily_total(USER, day)
+        fresh = DailyTotals(self.store).get(USER, day)
+        direct = self.core.total(self.store.get_day(USER, day))
+        for key in fresh:
+            self.assertAlmostEqual(cached[key], fresh[key], places=6, msg=key)
+            self.assertAlmostEqual(fresh[key], direct[key], places=6, msg=key)
+
+    # ---------- 計算 ----------
+
+    def test_calculate_many(self):
+        one, two, missing = self.core.calculate_many([(FOOD, 100), (FOOD, 200), ("不存在", 100)])
+        self.assertIsNone(missing)
+        for key, value in one.items():
+            self.assertAlmostEqual(two[key], value * 2, places=6)
+        self.assertEqual(one, self.core.calculate(FOOD, 100))
+
+        fid = self.core.table().lookup(FOOD)
+        self.assertEqual(self.core.calculate_many([(fid, 100)]), [one])
+
+    def test_calculate_unknown_food(self):
+        with self.assertRaises(ValueError):
+            self.core.calculate("不存在", 100)
+
+    # ---------- 建立紀錄 ----------
+
+    def test_food_entry_grams(self):
+        self.assertEqual(self.core.food_entry("早餐", FOOD, "150")["grams"], 150)
+        self.assertEqual(self.core.food_entry("早餐", FOOD, 150.0)["grams"], 150)
+        self.assertEqual(self.core.food_entry("早餐", FOOD, MAX_GRAMS)["grams"], MAX_GRAMS)
+
+        for grams in ("abc", "150.5", 150.5, math.nan, math.inf, 1e308, True, None, 0, -5,
+                      MAX_GRAMS + 1):
+            with self.subTest(grams=grams), self.assertRaises(ValueError):
+                self.core.food_entry("早餐", FOOD, grams)
+
+    def test_food_entry_fields(self):
+        for meal, food in ((["早餐"], FOOD), ("早餐", [FOOD]), ("早餐", None), ("早餐", "不存在")):
+            with self.subTest(meal=meal, food=food), self.assertRaises(ValueError):
+                self.core.food_entry(meal, food, 100)
+
+    def test_custom_entry(self):
+        entry = self.core.custom_entry("午餐", BRAND, MEAL, "0.5")
+        info = self.store.custom_meal(BRAND, MEAL)
+        self.assertAlmostEqual(entry["kcal"], info["kcal"] / 2)
+
+        for brand, meal, ratio in ((["x"], MEAL, 1), (BRAND, {"a": 1}, 1), (BRAND, "不存在", 1),
+                                   (BRAND, MEAL, "abc"), (BRAND, MEAL, math.nan), (BRAND, MEAL, 0)):
+            with self.subTest(brand=brand, meal=meal, ratio=ratio), self.assertRaises(ValueError):
+                self.core.custom_entry("午餐", brand, meal, ratio)
+
+    def test_day_key(self):
+        self.assertEqual(day_key("20260301"), DAY)
+        self.assertEqual(day_key(DAY), DAY)
+        for day in ("2026-13-01", "yesterday", "", None, 20260301):
+            with self.subTest(day=day), self.assertRaises(ValueError):
+                day_key(day)
+
+    # ---------- 寫入與每日總量 ----------
+
+    def test_add_uses_canonical_day(self):
+        self.core.add(USER, "20260301", self.core.food_entry("早餐", FOOD, 100))
+        entries = self.store.get_day(USER, DAY)
+        self.assertEqual(len(entries), 1)
+        self.assertEqual(entry_day(entries[0]["id"]), DAY)
+        with self.assertRaises(ValueError):
+            self.core.add(USER, "not-a-day", self.core.food_entry("早餐", FOOD, 100))
+
+    def test_totals_follow_writes(self):
+        self.assertTotalsConsistent()
+
+        self.core.add(USER, DAY, self.core.food_entry("早餐", FOOD, 150))
+        self.assertTotalsConsistent()
+
+        self.core.add_many(USER, [
+            (DAY, self.core.food_entry("午餐", FOOD, 80)),
+            (DAY, self.core.custom_entry("晚餐", BRAND, MEAL, 1)),
+            ("2026-03-02", self.core.food_entry("早餐", FOOD, 100)),
+        ])
+        self.assertTotalsConsistent()
+        self.assertTotalsConsistent("2026-03-02")
+
+        entries = self.store.get_day(USER, DAY)
+        food_id, custom_id = entries[1]["id"], entries[2]["id"]
+
+        self.core.edit(USER, food_id, self.core.edited_entry(self.core.find(USER, food_id), {"grams": 300}))
+        self.assertTotalsConsistent()
+        self.core.edit(USER, custom_id, self.core.edited_entry(self.core.find(USER, custom_id), {"ratio": 2}))
+        self.assertTotalsConsistent()
+
+        self.assertIsNotNone(self.core.delete_id(USER, food_id))
+        self.assertIsNone(self.core.delete_id(USER, food_id))
+        self.assertTotalsConsistent()
+
+        self.core.delete(USER, DAY, 0)
+        self.assertTotalsConsistent()
+        self.assertEqual([e["id"] for e in self.store.get_day(USER, DAY)], [custom_id])
+
+    def test_unknown_ids(self):
+        for eid in ("xxxx12345678", "not-an-id", None):
+            with self.subTest(eid=eid):
+                self.assertIsNone(self.core.delete_id(USER, eid))
+                self.assertIsNone(self.core.edit(USER, eid, {"meal": "早餐"}))
+                self.assertIsNone(self.core.find(USER, eid))
+
+
+class SqliteNutritionTest(NutritionTest):
+
+    open_store = staticmethod(sqlite_store)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,87 +1,29 @@
 import tkinter as tk
 from tkinter import messagebox, ttk
-import json
-from datetime import date
+
+import nutrition
 
 # ===== 資料設定 =====
-FOOD_FILE = "data/foods.json"  # 中文鍵值的食物 JSON
 DAILY_KCAL_TARGET = 2650
 DAILY_PROTEIN_TARGET = 130
 DAILY_CARBS_TARGET = 350
 
 # ===== 載入食物清單 =====
-def load_food_names():
-    try:
-        with open(FOOD_FILE, "r", encoding="utf-8") as f:
-            foods = json.load(f)
-        return list(foods.keys())
-    except FileNotFoundError:
-        return []
-
-foods = load_food_names()
+# 目錄與紀錄都透過 nutrition（共用 core.Nutrition），不再每次重讀 JSON
+foods = nutrition.food_names()
 meals = ["早餐", "午餐", "晚餐", "點心"]
+log_ids = []  # 與清單每一列對應的紀錄 id
 
 # ===== 保存/刪除紀錄 =====
 def save_log(food, grams, meal):
-    today = str(date.today())
-    try:
-        with open("data/logs.json", "r", encoding="utf-8") as f:
-            logs = json.load(f)
-    except FileNotFoundError:
-        logs = {}
-
-    if today not in logs:
-        logs[today] = []
-
-    logs[today].append({
-        "meal": meal,
-        "food": food,
-        "grams": grams
-    })
-
-    with open("data/logs.json", "w", encoding="utf-8") as f:
-        json.dump(logs, f, ensure_ascii=False, indent=2)
-
-def delete_log(today, index):
-    try:
-        with open("data/logs.json", "r", encoding="utf-8") as f:
-            logs = json.load(f)
-    except FileNotFoundError:
-        return
+    nutrition.save_log(food, grams, meal)
 
-    if today in logs and 0 <= index < len(logs[today]):
-        logs[today].pop(index)
-        with open("data/logs.json", "w", encoding="utf-8") as f:
-            json.dump(logs, f, ensure_ascii=False, indent=2)
+def delete_log(eid):
+    return nutrition.delete_log_id(eid)
 
 # ===== 計算今日總營養 =====
 def get_daily_total():
-    today = str(date.today())
-    try:
-        with open("data/logs.json", "r", encoding="utf-8") as f:
-            logs = json.load(f)
-    except FileNotFoundError:
-        return None
-
-    if today not in logs or len(logs[today]) == 0:
-        return None
-
-    total = {"kcal":0, "protein":0, "carbs":0, "fat":0}
-    with open(FOOD_FILE, "r", encoding="utf-8") as f:
-        food_data = json.load(f)
-
-    for item in logs[today]:
-        food_name = item["food"]
-        grams = item["grams"]
-        if food_name in food_data:
-            nutr = food_data[food_name]
-            factor = grams / 100
-            total["kcal"] += nutr["kcal"] * factor
-            total["protein"] += nutr["protein"] * factor
-            total["carbs"] += nutr["carbs"] * factor
-            total["fat"] += nutr["fat"] * factor
-
-    return total
+    return nutrition.get_daily_total()
 
 # ===== GUI 功能 =====
 def add_food():
@@ -97,7 +39,11 @@ def add_food():
         messagebox.showerror("錯誤", "請輸入正確的克數")
         return
 
-    save_log(food, int(grams), meal)
+    try:
+        save_log(food, int(grams), meal)
+    except ValueError as e:
+        messagebox.showerror("錯誤", str(e))
+        return
     refresh_list()
     update_total()
     entry_grams.delete(0, tk.END)
@@ -108,26 +54,22 @@ def delete_selected():
         messagebox.showwarning("提醒", "請先選取一筆紀錄")
         return
 
-    index = selection[0]
-    today = str(date.today())
-    delete_log(today, index)
+    # 依 id 刪除：共用帳號時其他裝置的寫入會讓清單位置改變
+    if not delete_log(log_ids[selection[0]]):
+        messagebox.showwarning("提醒", "這筆紀錄已被刪除")
     refresh_list()
     update_total()
 
 def refresh_list():
     listbox_logs.delete(0, tk.END)
-    try:
-        with open("data/logs.json", "r", encoding="utf-8") as f:
-            logs = json.load(f)
-    except FileNotFoundError:
-        return
-
-    today = str(date.today())
-    if today not in logs:
-        return
-
-    for item in logs[today]:
-        text = f"{item['meal']} - {item['food']} {item['grams']}g"
+    log_ids.clear()
+
+    for item in nutrition.get_logs():
+        log_ids.append(item.get("id"))
+        if "grams" in item:
+            text = f"{item['meal']} - {item['food']} {item['grams']}g"
+        else:
+            text = f"{item['meal']} - {item['food']} {item['kcal']:.0f}kcal"
         listbox_logs.insert(tk.END, text)
 
 def update_total():
@@ -1,100 +1,102 @@
-import json
+import json, os, sys
 from datetime import date
 
-FOOD_FILE = "data/foods.json"
-LOG_FILE = "data/logs.json"
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
 
+from core import Nutrition
+from storage import open_store
 
-def load_foods():
-    with open(FOOD_FILE, "r", encoding="utf-8") as f:
-        return json.load(f)
+# =========================
+# 桌面版資料存取
+# =========================
+#
+# 與網頁版共用 core.Nutrition：目錄只載入一次並快取，紀錄存在同一個 store，
+# 以 TK_USER（預設 local）這個帳號記錄。
+# 舊版的 data/logs.json 第一次使用時匯入該帳號，原檔改名為 logs.json.v1。
 
+DATA_DIR = os.environ.get("DATA_DIR") or os.path.join(BASE_DIR, "data")
+LOG_FILE = os.path.join(DATA_DIR, "logs.json")
+TK_USER = os.environ.get("TK_USER", "local")
 
-def calculate_nutrition(food_name, grams):
-    foods = load_foods()
+_core = None
 
-    if food_name not in foods:
-        raise ValueError("找不到這個食物")
 
-    food = foods[food_name]
-    factor = grams / 100
+def core():
+    global _core
+    if _core is None:
+        store = open_store(os.environ.get("STORAGE"), DATA_DIR)
+        _core = Nutrition(store)
+        _migrate_legacy(store)
+    return _core
 
-    return {
-        "kcal": food["kcal"] * factor,
-        "protein": food["protein"] * factor,
-        "carbs": food["carbs"] * factor,
-        "fat": food["fat"] * factor
-    }
 
+def _migrate_legacy(store):
+    if not os.path.exists(LOG_FILE):
+        return
 
-def save_log(food_name, grams,meal):
-    today = str(date.today())
-    nutrition = calculate_nutrition(food_name, grams)
+    with open(LOG_FILE, "r", encoding="utf-8") as f:
+        logs = json.load(f)
 
-    try:
-        with open(LOG_FILE, "r", encoding="utf-8") as f:
-            logs = json.load(f)
-    except FileNotFoundError:
-        logs = {}
+    items = [(day, _legacy_entry(item)) for day, entries in logs.items() for item in entries]
+    if items:
+        store.add_many(TK_USER, items)
+    os.replace(LOG_FILE, LOG_FILE + ".v1")
 
-    if today not in logs:
-        logs[today] = []
 
-    logs[today].append({
-        "meal": meal,
-        "food": food_name,
-        "grams": grams,
-        **nutrition
-    })
+def _legacy_entry(item):
+    # 克數制的舊紀錄以食物名稱保存，計算時仍可依名稱解析；營養值不再另存
+    if "grams" in item:
+        return {"meal": item.get("meal", ""), "food": item["food"], "grams": item["grams"]}
+    return item
 
-    with open(LOG_FILE, "w", encoding="utf-8") as f:
-        json.dump(logs, f, indent=2, ensure_ascii=False)
 
+def load_foods():
+    return core().foods()
 
-def get_daily_total(target_date=None):
+
+def food_names():
+    return core().food_names()
+
+
+def calculate_nutrition(food_name, grams):
+    return core().calculate(food_name, grams)
+
+
+def calculate_many(items):
+    return core().calculate_many(items)
+
+
+def save_log(food_name, grams, meal, target_date=None):
     if target_date is None:
         target_date = str(date.today())
 
-    try:
-        with open(LOG_FILE, "r", encoding="utf-8") as f:
-            logs = json.load(f)
-    except FileNotFoundError:
-        return None
+    c = core()
+    c.add(TK_USER, target_date, c.food_entry(meal, food_name, grams))
 
-    if target_date not in logs:
-        return None
 
-    total = {
-        "kcal": 0,
-        "protein": 0,
-        "carbs": 0,
-        "fat": 0
-    }
+def get_logs(target_date=None):
+    if target_date is None:
+        target_date = str(date.today())
 
-    for item in logs[target_date]:
-        for key in total:
-            total[key] += item[key]
+    return core().day(TK_USER, target_date)
 
-    return total
 
-def delete_log(target_date, index):
-    try:
-        with open(LOG_FILE, "r", encoding="utf-8") as f:
-            logs = json.load(f)
-    except FileNotFoundError:
-        return
+def get_daily_total(target_date=None):
+    if target_date is None:
+        target_date = str(date.today())
 
-    if target_date not in logs:
-        return
+    c = core()
+    if not c.store.get_day(TK_USER, target_date):
+        return None
 
-    if index < 0 or index >= len(logs[target_date]):
-        return
+    return c.daily_total(TK_USER, target_date)
 
-    logs[target_date].pop(index)
 
-    if not logs[target_date]:
-        del logs[target_date]
+def delete_log(target_date, index):
+    core().delete(TK_USER, target_date, index)
 
-    with open(LOG_FILE, "w", encoding="utf-8") as f:
-        json.dump(logs, f, indent=2, ensure_ascii=False)
 
+def delete_log_id(eid):
+    # 依 id 刪除：其他裝置同時寫入時，清單位置可能已經不同；已被刪除時回傳 False
+    return core().delete_id(TK_USER, eid) is not None
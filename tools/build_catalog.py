@@ -0,0 +1,32 @@
+import argparse, os, sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from storage import open_store
+
+
+# =========================
+# 編譯二進位目錄檔
+# =========================
+#
+#   python tools/build_catalog.py                 # data/*.json -> data/catalog.bin
+#   STORAGE=sqlite python tools/build_catalog.py  # 資料庫 -> data/fitness.catalog.bin
+#
+# 檔案以 os.replace 原子換上，執行中的 worker 下一次請求就改用新版本，不需重啟。
+# 第一次建立後，之後修改 foods.json / custom_meals.json 都要重新執行
+# （或 POST /admin/catalogs/reload）。刪除 .bin 檔即回到直接讀 JSON。
+
+def main():
+    parser = argparse.ArgumentParser(description="編譯二進位目錄檔")
+    parser.add_argument("--data", default=os.path.join(BASE_DIR, "data"))
+    args = parser.parse_args()
+
+    store = open_store(os.environ.get("STORAGE"), args.data)
+    table = store.build_catalog()
+    print(f"{len(table)} 個食物 id，{table.custom_count} 個自訂餐點 -> "
+          f"{store.catalog_bin.path}（{table.key[2]} bytes）")
+
+
+if __name__ == "__main__":
+    main()
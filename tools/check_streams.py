@@ -0,0 +1,116 @@
+import argparse, http.client, json, os, secrets, shutil, signal, socket, subprocess, sys
+import tempfile, time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from bench.asgi import wait_ready
+from bench.boot import free_port, session_cookie
+
+
+# =========================
+# SSE 開滿時一般請求仍有回應
+# =========================
+#
+#   python tools/check_streams.py
+#   python tools/check_streams.py --workers 1 --threads 8 --streams 32
+#
+# 以 gunicorn.conf.py 的預設（不設 LIVE_MAX_STREAMS）啟動 gunicorn，
+# 開 --streams 條 /api/events（遠多於執行緒數），連線保持開啟時送 --requests 次 GET /login：
+# 每一次都要在 --timeout 秒內回 200，多出來的串流要收到 503 而不是卡住。
+# 任一檢查失敗時以非零狀態結束。
+
+
+def open_streams(port, cookie, count, timeout):
+    # 回傳 (sockets, {狀態碼: 數量})；沒有回應的記為 None
+    request = (
+        "GET /api/events HTTP/1.1\r\nHost: 127.0.0.1\r\n"
+        f"Cookie: session={cookie}\r\nAccept: text/event-stream\r\n\r\n"
+    ).encode()
+    socks, status = [], {}
+
+    for _ in range(count):
+        s = socket.create_connection(("127.0.0.1", port))
+        s.sendall(request)
+        socks.append(s)
+
+    deadline = time.time() + timeout
+    for s in socks:
+        s.settimeout(max(deadline - time.time(), 0.01))
+        try:
+            code = int(s.recv(64).split(b" ", 2)[1])
+        except (OSError, IndexError, ValueError):
+            code = None
+        status[code] = status.get(code, 0) + 1
+    return socks, status
+
+
+def get(port, path, timeout):
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+        conn.request("GET", path)
+        resp = conn.getresponse()
+        resp.read()
+        conn.close()
+        return resp.status
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSE 長連線開滿時一般請求仍有回應")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=8, help="> 1（gthread worker）")
+    parser.add_argument("--streams", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=5)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="fitness-streams-")
+    shutil.copytree(os.path.join(BASE_DIR, "data"), data_dir, dirs_exist_ok=True)
+    with open(os.path.join(data_dir, "users.json"), "r", encoding="utf-8") as f:
+        user = sorted(json.load(f))[0]
+
+    port = free_port()
+    secret = secrets.token_hex(16)
+    env = dict(os.environ, DATA_DIR=data_dir, SECRET_KEY=secret, BIND=f"127.0.0.1:{port}",
+               WEB_CONCURRENCY=str(args.workers), THREADS=str(args.threads))
+    env.pop("LIVE_MAX_STREAMS", None)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--graceful-timeout", "2"],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+    errors = []
+    try:
+        wait_ready(port, proc)
+        socks, status = open_streams(port, session_cookie(secret, user), args.streams, args.timeout)
+        try:
+            if status.get(None):
+                errors.append(f"{status[None]} 條 /api/events 在 {args.timeout} 秒內沒有回應")
+            codes = [get(port, "/login", args.timeout) for _ in range(args.requests)]
+            failed = sum(1 for c in codes if c != 200)
+            if failed:
+                errors.append(f"串流開啟時 GET /login 失敗 {failed} / {args.requests} 次")
+        finally:
+            for s in socks:
+                s.close()
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    for e in errors:
+        print("FAIL:", e)
+    if errors:
+        sys.exit(1)
+
+    print(f"OK: /api/events 200 × {status.get(200, 0)}、503 × {status.get(503, 0)}，"
+          f"GET /login {args.requests} 次全部成功")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import argparse, os, sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from storage import open_store
+
+
+# =========================
+# 舊紀錄改以食物 id 引用
+# =========================
+#
+#   python tools/migrate_food_ids.py                 # data/（或 STORAGE 指定的後端）
+#   python tools/migrate_food_ids.py --data X
+#
+# 把 {"food": 名稱, "grams": g} 改寫成 {"fid": id, "grams": g}。
+# 已從 foods.json 移除的名稱也會配一個 id，紀錄上的名稱因此不會遺失。
+# 可重複執行：已轉換的紀錄不會再動，沒有變動的使用者不會改寫。
+
+def convert(logs, id_map):
+    changed = 0
+    for entries in logs.values():
+        for i, e in enumerate(entries):
+            if "grams" in e and "fid" not in e and "food" in e:
+                e = dict(e)
+                e["fid"] = id_map[e.pop("food")]
+                entries[i] = e
+                changed += 1
+    return changed
+
+
+def migrate(store):
+    store.food_table()
+
+    users = store.users()
+    names = {
+        e["food"]
+        for user in users
+        for entries in store.load(user).values()
+        for e in entries
+        if "grams" in e and "fid" not in e and "food" in e
+    }
+    id_map = store.assign_food_ids(sorted(names)).ids
+
+    converted = 0
+    for user in users:
+        logs = store.load(user)
+        changed = convert(logs, id_map)
+        if changed:
+            store.import_logs(user, logs)
+            converted += changed
+
+    return len(users), converted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="舊紀錄改以食物 id 引用")
+    parser.add_argument("--data", default=os.path.join(BASE_DIR, "data"))
+    args = parser.parse_args()
+
+    users, converted = migrate(open_store(os.environ.get("STORAGE"), args.data))
+    print(f"完成：{users} 位使用者，轉換 {converted} 筆紀錄")
+
+
+if __name__ == "__main__":
+    main()
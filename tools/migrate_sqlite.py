@@ -0,0 +1,53 @@
+import argparse, os, sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from storage import JsonStore, load_json
+from sqlite_store import SqliteStore
+
+
+# =========================
+# 將 data/ 目錄一次匯入 SQLite
+# =========================
+#
+#   python tools/migrate_sqlite.py                  # data/ -> data/fitness.db
+#   python tools/migrate_sqlite.py --data X --db Y
+#
+# 可重複執行：每位使用者的紀錄與目錄表會整份覆蓋。
+
+def migrate(data_dir, db_path):
+    src = JsonStore(data_dir)
+    dst = SqliteStore(db_path)
+
+    dst.import_catalogs(load_json(src.food_file), load_json(src.custom_file))
+    # 紀錄以食物 id 引用，id 對照表必須一起搬
+    src.food_table()
+    dst.import_food_ids(load_json(src.food_id_file))
+
+    users = load_json(src.user_file)
+    for name, info in users.items():
+        dst.add_user(name, info["password"])
+
+    entries = 0
+    for name in src.users():
+        logs = src.load(name)
+        dst.import_logs(name, logs)
+        entries += sum(len(v) for v in logs.values())
+
+    return len(users), entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="匯入 data/ 到 SQLite")
+    parser.add_argument("--data", default=os.path.join(BASE_DIR, "data"))
+    parser.add_argument("--db", default=None)
+    args = parser.parse_args()
+
+    db_path = args.db or os.path.join(args.data, "fitness.db")
+    users, entries = migrate(args.data, db_path)
+    print(f"匯入完成：{users} 位使用者，{entries} 筆紀錄 -> {db_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import argparse, os, sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from storage import open_store
+
+
+# =========================
+# 食物改名
+# =========================
+#
+#   python tools/rename_food.py 雞胸肉 舒肥雞胸
+#
+# 同時改 foods.json 的鍵與 food_ids.json，id 不變，歷史紀錄自動顯示新名稱。
+# 新名稱已存在（包含曾經用過的名稱）時拒絕。
+
+def main():
+    parser = argparse.ArgumentParser(description="食物改名，保留歷史紀錄")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--data", default=os.path.join(BASE_DIR, "data"))
+    args = parser.parse_args()
+
+    store = open_store(os.environ.get("STORAGE"), args.data)
+    if not store.rename_food(args.old, args.new):
+        sys.exit(f"無法改名：找不到「{args.old}」或「{args.new}」已被使用")
+    print(f"{args.old} -> {args.new}（id {store.food_table().lookup(args.new)}）")
+
+
+if __name__ == "__main__":
+    main()
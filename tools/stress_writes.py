@@ -0,0 +1,139 @@
+import argparse, multiprocessing, os, shutil, sys, tempfile, threading
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from storage import JsonStore
+
+
+# =========================
+# 多行程併發寫入壓力測試
+# =========================
+#
+#   python tools/stress_writes.py
+#   python tools/stress_writes.py --procs 8 --threads 4 --writes 200 --group-commit
+#
+# 多個行程、多個執行緒同時對同一位使用者新增紀錄（並夾雜刪除與註冊），
+# 合併門檻刻意設小讓 compaction 一併參與，最後檢查沒有任何一筆寫入遺失。
+# 另外模擬寫入中斷：日誌與 changes.jsonl 尾端留下半行後再寫入，讀取與同步仍須正常。
+# 任一檢查失敗時以非零狀態結束。
+
+USER = "stress"
+DAY = "2026-01-01"
+
+
+def worker(data_dir, proc, threads, writes, group_commit, compact_bytes):
+    store = JsonStore(data_dir, compact_bytes=compact_bytes, group_commit=group_commit)
+
+    def run(thread):
+        for i in range(writes):
+            store.add(USER, DAY, {"meal": "早餐", "food": f"{proc}-{thread}-{i}", "grams": 100})
+
+            # 另一天新增後立刻刪除，刪除必須落在自己新增的那筆上
+            other = f"2026-02-{proc % 28 + 1:02d}-{thread}"
+            store.add(USER, other, {"meal": "點心", "food": "tmp", "grams": 1})
+            store.delete(USER, other, 0)
+
+        store.add_user(f"user-{proc}-{thread}", "x")
+
+    ts = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+
+
+def check(data_dir, procs, threads, writes):
+    store = JsonStore(data_dir)
+    logs = store.load(USER)
+    errors = []
+
+    got = [e["food"] for e in logs.get(DAY, [])]
+    expected = {f"{p}-{t}-{i}" for p in range(procs) for t in range(threads) for i in range(writes)}
+
+    if len(got) != len(expected) or set(got) != expected:
+        errors.append(f"{DAY}: 預期 {len(expected)} 筆，實際 {len(got)} 筆，"
+                      f"遺失 {len(expected - set(got))} 筆")
+
+    leftovers = sum(len(v) for k, v in logs.items() if k != DAY)
+    if leftovers:
+        errors.append(f"新增後刪除的紀錄殘留 {leftovers} 筆")
+
+    for p in range(procs):
+        for t in range(threads):
+            if store.get_user(f"user-{p}-{t}") is None:
+                errors.append(f"帳號 user-{p}-{t} 遺失")
+
+    return len(got), errors
+
+
+def check_torn_tail(data_dir):
+    # 當機時追加到一半的半行：下一次寫入前要被截掉，不能和新的一行黏在一起
+    store = JsonStore(os.path.join(data_dir, "torn"))
+    store.create(USER)
+    store.add(USER, DAY, {"meal": "早餐", "food": "before", "grams": 100})
+    cursor = store.change_seq(USER)
+
+    for path in (store.journal_path(USER, DAY[:7]), store.changes_path(USER)):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write('{"op":"add","date":"')
+
+    errors = []
+    try:
+        store.add(USER, DAY, {"meal": "早餐", "food": "after", "grams": 100})
+        got = [e["food"] for e in JsonStore(store.data_dir).get_day(USER, DAY)]
+        if got != ["before", "after"]:
+            errors.append(f"半行之後的寫入：預期 before, after，實際 {got}")
+        if len(store.changes(USER, cursor)["changes"]) != 1:
+            errors.append("半行之後的變更紀錄遺失")
+    except ValueError as e:
+        errors.append(f"半行之後的寫入無法讀取：{e}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JsonStore 併發寫入壓力測試")
+    parser.add_argument("--procs", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--writes", type=int, default=100)
+    parser.add_argument("--compact-bytes", type=int, default=16 * 1024)
+    parser.add_argument("--group-commit", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="保留暫存資料夾")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="fitness-stress-")
+    try:
+        ps = [
+            multiprocessing.Process(
+                target=worker,
+                args=(data_dir, p, args.threads, args.writes,
+                      args.group_commit, args.compact_bytes),
+            )
+            for p in range(args.procs)
+        ]
+        for p in ps:
+            p.start()
+        for p in ps:
+            p.join()
+
+        if any(p.exitcode != 0 for p in ps):
+            print("FAIL: worker 異常結束")
+            sys.exit(1)
+
+        count, errors = check(data_dir, args.procs, args.threads, args.writes)
+        errors += check_torn_tail(data_dir)
+        for e in errors:
+            print("FAIL:", e)
+        if errors:
+            sys.exit(1)
+
+        print(f"OK: {count} 筆紀錄、{args.procs * args.threads} 個帳號全部寫入")
+    finally:
+        if args.keep:
+            print(data_dir)
+        else:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+import threading
+from collections import OrderedDict
+
+
+# =========================
+# 計算營養
+# =========================
+
+def calc_total(logs, table):
+    total = {"kcal": 0, "protein": 0, "carbs": 0, "fat": 0}
+
+    for item in logs:
+        if "grams" in item:
+            fid = table.entry_fid(item)
+            if fid is None or not table.valid[fid]:
+                continue
+
+            f = item["grams"] / 100
+            total["kcal"] += table.kcal[fid] * f
+            total["protein"] += table.protein[fid] * f
+            total["carbs"] += table.carbs[fid] * f
+            total["fat"] += table.fat[fid] * f
+        else:
+            total["kcal"] += item.get("kcal", 0)
+            total["protein"] += item.get("protein", 0)
+            total["carbs"] += item.get("carbs", 0)
+            total["fat"] += item.get("fat", 0)
+
+    return total
+
+
+# =========================
+# 每日總量（物化快取）
+# =========================
+#
+# 每位使用者保存各日總量，並記下計算時的紀錄版本與目錄版本：
+# - 兩個版本都沒變時直接回傳，O(1)
+# - 快取以使用者為單位做 LRU，最多 MAX_USERS 位
+# - 新增 / 刪除時若寫入前版本與快取相符，只加減該筆，不重掃整天
+# - foods.json 變動（目錄版本改變）時，以快取的 (食物 id, 克數) 重算，不需重讀紀錄
+# - 其他 worker 寫入造成版本不符時，重新讀該日紀錄
+#
+# 每筆紀錄保存為 (fid, grams, 固定營養, 紀錄 id)：克數制的 fixed 為 None。
+
+KEYS = ("kcal", "protein", "carbs", "fat")
+MAX_USERS = 1000
+
+
+def _item(entry, table):
+    if "grams" in entry:
+        return (table.entry_fid(entry), entry["grams"], None, entry.get("id"))
+    return (None, None, tuple(entry.get(k, 0) for k in KEYS), entry.get("id"))
+
+
+def _contrib(item, table):
+    fid, grams, fixed, _ = item
+    if fixed is not None:
+        return fixed
+    if fid is None:
+        return (0, 0, 0, 0)
+    return table.nutrition(fid, grams) or (0, 0, 0, 0)
+
+
+def _sum(items, table):
+    total = [0, 0, 0, 0]
+    for item in items:
+        for i, v in enumerate(_contrib(item, table)):
+            total[i] += v
+    return total
+
+
+class _Day:
+
+    __slots__ = ("catalog", "items", "total")
+
+    def __init__(self, catalog, items, total):
+        self.catalog = catalog
+        self.items = items
+        self.total = total
+
+
+class _UserDays:
+
+    __slots__ = ("version", "days")
+
+    def __init__(self, version):
+        self.version = version
+        self.days = {}
+
+
+class DailyTotals:
+
+    def __init__(self, store, max_users=MAX_USERS):
+        self.store = store
+        self.max_users = max_users
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user, day):
+        return self.get_many(user, [day])[day]
+
+    def get_many(self, user, days):
+        return self._get(user, days, False)[2]
+
+    def get_with_logs(self, user, days):
+        # 一次讀出這幾天的紀錄，同時補上快取沒有的總量；
+        # 回傳 (讀取前的紀錄版本, {day: 紀錄}, {day: 總量})
+        return self._get(user, days, True)
+
+    def _get(self, user, days, with_logs):
+        table = self.store.food_table()
+        catalog = self.store.catalog_version()
+        version = self.store.version(user)
+
+        result = {}
+        missing = []
+
+        with self._lock:
+            cached = self._users.get(user)
+            if cached is None or cached.version != version:
+                cached = self._put(user, _UserDays(version))
+            self._users.move_to_end(user)
+
+            for day in days:
+                d = cached.days.get(day)
+                if d is None:
+                    missing.append(day)
+                    continue
+
+                if d.catalog != catalog:
+                    d.total = _sum(d.items, table)
+                    d.catalog = catalog
+
+                result[day] = d.total
+                self.hits += 1
+
+        logs = {}
+        if with_logs:
+            logs = self.store.get_days(user, days)
+        elif missing:
+            logs = self.store.get_days(user, missing)
+
+        if missing:
+            # 讀取期間若有寫入，讀到的內容可能比 version 新，不能放進快取
+            fresh = self.store.version(user) == version
+
+            with self._lock:
+                for day in missing:
+                    items = [_item(e, table) for e in logs.get(day, [])]
+                    total = _sum(items, table)
+                    if fresh and cached.version == version:
+                        cached.days[day] = _Day(catalog, items, total)
+                    result[day] = total
+                    self.misses += 1
+
+        return version, logs, {day: dict(zip(KEYS, result[day])) for day in days}
+
+    # ---------- 寫入後的增量更新 ----------
+
+    def added(self, user, day, entry, versions):
+        self.added_many(user, [(day, entry)], versions)
+
+    def added_many(self, user, items, versions):
+        def apply(d, entry, table):
+            item = _item(entry, table)
+            d.items.append(item)
+            for i, v in enumerate(_contrib(item, table)):
+                d.total[i] += v
+
+        self._update(user, items, versions, apply)
+
+    def deleted(self, user, day, index, versions):
+        def apply(d, index, table):
+            if 0 <= index < len(d.items):
+                item = d.items.pop(index)
+                for i, v in enumerate(_contrib(item, table)):
+                    d.total[i] -= v
+
+        self._update(user, [(day, index)], versions, apply)
+
+    def deleted_id(self, user, day, eid, versions):
+        self.edited(user, day, eid, None, versions)
+
+    def edited(self, user, day, eid, entry, versions):
+        # entry 為 None 表示刪除
+        def apply(d, entry, table):
+            for n, item in enumerate(d.items):
+                if item[3] == eid:
+                    break
+            else:
+                return
+
+            for i, v in enumerate(_contrib(item, table)):
+                d.total[i] -= v
+            if entry is None:
+                del d.items[n]
+                return
+
+            item = d.items[n] = _item(entry, table)
+            for i, v in enumerate(_contrib(item, table)):
+                d.total[i] += v
+
+        self._update(user, [(day, entry)], versions, apply)
+
+    def _update(self, user, changes, versions, apply):
+        prev, version = versions or (None, None)
+        table = self.store.food_table()
+        catalog = self.store.catalog_version()
+
+        with self._lock:
+            cached = self._users.get(user)
+            if cached is None:
+                return
+            if prev is None or cached.version != prev:
+                # 中間有其他寫入，不知道改了哪一天，整個使用者作廢
+                del self._users[user]
+                return
+
+            cached.version = version
+            for day, change in changes:
+                d = cached.days.get(day)
+                if d is None:
+                    continue
+
+                apply(d, change, table)
+                if d.catalog != catalog:
+                    d.total = _sum(d.items, table)
+                    d.catalog = catalog
+
+    def _put(self, user, value):
+        self._users[user] = value
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        return value
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "users": len(self._users),
+            "days": sum(len(u.days) for u in self._users.values()),
+        }